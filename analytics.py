@@ -8,15 +8,91 @@ from collections import Counter
 from typing import Optional, List, Dict, Tuple
 import re
 import os
+import glob
+import hashlib
+import threading
+import zlib
+
+from question_clusters import SIGNATURE_VERSION, QuestionClusterIndex, minhash_signature
 
 DATABASE_PATH = "/workspace/ai/kounhany_analytics.db"
 
-def get_db_connection():
+# Cold tier: old conversations moved out of the hot DB into monthly partition files
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "/workspace/ai/archive")
+
+def get_db_connection(check_same_thread: bool = True):
     """Get database connection with proper settings."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.create_function('decompress_text', 1, decompress_text, deterministic=True)
+    return conn
+
+def decompress_text(blob: Optional[bytes]) -> Optional[str]:
+    """Decompress a zlib-compressed text column (registered as a SQL function)."""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode('utf-8')
+
+# ========== ARCHIVE PARTITIONS ==========
+def partition_path(month: str) -> str:
+    """Path of the archive partition for a month ('YYYY-MM')."""
+    return os.path.join(ARCHIVE_DIR, f"conversations_{month.replace('-', '_')}.db")
+
+def get_partition_connection(path: str, check_same_thread: bool = True):
+    """
+    Open an archive partition. Partitions expose a `conversations` view with the
+    same columns as the hot table, so analytics queries run unchanged on them.
+    """
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    conn.create_function('decompress_text', 1, decompress_text, deterministic=True)
+    # Same read view name as the hot DB (partitions written before the status column report 'completed')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(conversations)')]
+    status = ", 'completed' AS status" if columns and 'status' not in columns else ''
+    conn.execute(f'CREATE TEMP VIEW IF NOT EXISTS conversation_messages AS SELECT *{status} FROM main.conversations')
     return conn
 
+def list_archive_partitions(start: str = None, end: str = None) -> List[Tuple[str, str]]:
+    """
+    List archive partitions as (month, path), most recent first.
+    `start` / `end` are dates ('YYYY-MM-DD' or 'YYYY-MM') used to skip months outside the range.
+    """
+    partitions = []
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, 'conversations_*.db')):
+        match = re.search(r'conversations_(\d{4})_(\d{2})\.db$', path)
+        if not match:
+            continue
+        month = f"{match.group(1)}-{match.group(2)}"
+        if start and month < start[:7]:
+            continue
+        if end and month > end[:7]:
+            continue
+        partitions.append((month, path))
+    return sorted(partitions, reverse=True)
+
+def get_conversation_tiers(start: str = None, end: str = None, oldest_first: bool = False,
+                           check_same_thread: bool = True):
+    """
+    Yield one connection per storage tier holding conversations: the hot DB first,
+    then the archive partitions overlapping the date range (most recent first).
+    With `oldest_first` the order is reversed (oldest partition first, hot DB last).
+    Each connection is closed when the caller moves on to the next tier.
+    """
+    partitions = list_archive_partitions(start, end)
+    tiers = [None] + [path for _, path in partitions]
+    if oldest_first:
+        tiers.reverse()
+
+    for path in tiers:
+        if path is None:
+            conn = get_db_connection(check_same_thread)
+        else:
+            conn = get_partition_connection(path, check_same_thread)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
 def init_database():
     """Initialize the analytics database with all required tables."""
     conn = get_db_connection()
@@ -39,6 +115,35 @@ def init_database():
         )
     ''')
 
+    # Table for response bodies, stored once per distinct text (content-addressed, zlib-compressed)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS response_bodies (
+            hash TEXT PRIMARY KEY,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Conversations reference their response body by hash (ai_response is left empty)
+    add_column_if_missing(cursor, 'conversations', 'response_hash', 'TEXT')
+    # 'completed', or 'abandoned_superseded' / 'abandoned_disconnected' for cancelled generations
+    add_column_if_missing(cursor, 'conversations', 'status', "TEXT DEFAULT 'completed'")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_response_hash ON conversations(response_hash)')
+
+    # Read view resolving the response text (rows logged before deduplication keep it inline),
+    # recreated so that databases created before the status column get it too
+    cursor.execute('DROP VIEW IF EXISTS conversation_messages')
+    cursor.execute('''
+        CREATE VIEW conversation_messages AS
+        SELECT c.id, c.user_id, c.timestamp, c.user_message,
+               COALESCE(decompress_text(r.body), c.ai_response) AS ai_response,
+               c.response_time_ms, c.content_type, c.detected_intent, c.obd_code_detected,
+               c.was_helpful, c.feedback, COALESCE(c.status, 'completed') AS status
+        FROM conversations c
+        LEFT JOIN response_bodies r ON r.hash = c.response_hash
+    ''')
+
     # Table for learned Q&A pairs (successful interactions)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS learned_qa (
@@ -65,6 +170,30 @@ def init_database():
         )
     ''')
 
+    # Table for near-duplicate question clusters (MinHash signature of the first question seen)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_clusters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            representative TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Cluster ids on question stats and learned answers (added after the first release)
+    add_column_if_missing(cursor, 'question_analytics', 'cluster_id', 'INTEGER')
+    add_column_if_missing(cursor, 'learned_qa', 'cluster_id', 'INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_question_analytics_cluster ON question_analytics(cluster_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_learned_qa_cluster ON learned_qa(cluster_id)')
+
+    # Signatures of an older clustering scheme: start over, backfill_question_clusters reassigns
+    add_column_if_missing(cursor, 'question_clusters', 'signature_version', 'INTEGER DEFAULT 1')
+    cursor.execute('SELECT 1 FROM question_clusters WHERE signature_version != ? LIMIT 1', (SIGNATURE_VERSION,))
+    if cursor.fetchone():
+        cursor.execute('DELETE FROM question_clusters')
+        cursor.execute('UPDATE question_analytics SET cluster_id = NULL')
+        cursor.execute('UPDATE learned_qa SET cluster_id = NULL')
+
     # Table for user sessions
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS user_sessions (
@@ -105,6 +234,133 @@ def init_database():
     conn.close()
     print("✅ Analytics database initialized successfully")
 
+def add_column_if_missing(cursor, table: str, column: str, declaration: str):
+    """Add a column to an existing table (lightweight schema migration)."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+# ========== QUESTION CLUSTERING ==========
+# LSH index of committed cluster representatives. Every process (uvicorn worker,
+# retention job) catches up on the clusters the others created through its own
+# read connection before each assignment, so cluster ids are the same everywhere
+# and a rolled back insert never reaches the index.
+_cluster_index = QuestionClusterIndex()
+_cluster_index_until = 0  # highest cluster id loaded
+_cluster_reader = None
+_cluster_lock = threading.Lock()
+
+def _sync_cluster_index():
+    """Load the clusters committed since the last sync. Caller holds _cluster_lock."""
+    global _cluster_reader, _cluster_index_until
+    if _cluster_reader is None:
+        _cluster_reader = get_db_connection(check_same_thread=False)
+    rows = _cluster_reader.execute(
+        'SELECT id, signature FROM question_clusters WHERE id > ? ORDER BY id', (_cluster_index_until,)
+    ).fetchall()
+    # End the read transaction so the next sync sees newer commits
+    _cluster_reader.commit()
+    for row in rows:
+        _cluster_index.add(row['id'], json.loads(row['signature']))
+        _cluster_index_until = row['id']
+
+def assign_question_cluster(cursor, question: str) -> Optional[int]:
+    """
+    Assign a question to its near-duplicate cluster, creating a new cluster if needed.
+    A new cluster joins the index once the caller's transaction is committed.
+    """
+    signature = minhash_signature(question)
+    if signature is None:
+        return None
+
+    with _cluster_lock:
+        _sync_cluster_index()
+        cluster_id = _cluster_index.find(signature)
+    if cluster_id is None:
+        cursor.execute('''
+            INSERT INTO question_clusters (representative, signature, signature_version)
+            VALUES (?, ?, ?)
+        ''', (question.strip()[:500], json.dumps(signature), SIGNATURE_VERSION))
+        cluster_id = cursor.lastrowid
+    return cluster_id
+
+def backfill_question_clusters():
+    """Assign clusters to question stats and learned answers recorded before clustering existed."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    for table, column in [('question_analytics', 'question_normalized'), ('learned_qa', 'question_pattern')]:
+        cursor.execute(f'SELECT id, {column} AS question FROM {table} WHERE cluster_id IS NULL')
+        for row in cursor.fetchall():
+            cluster_id = assign_question_cluster(cursor, row['question'])
+            if cluster_id is not None:
+                cursor.execute(f'UPDATE {table} SET cluster_id = ? WHERE id = ?', (cluster_id, row['id']))
+                # Committed one by one: a new cluster is only indexed (and matched by the next rows) once committed
+                conn.commit()
+
+    conn.commit()
+    conn.close()
+
+# ========== RESPONSE DEDUPLICATION ==========
+
+def response_hash(text: str) -> str:
+    """Content address of a response body."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def store_response_body(cursor, text: str) -> str:
+    """
+    Store a response body once and return its hash. Always inserts (a no-op when
+    the body exists) in the caller's transaction, so a prune running in another
+    process cannot delete the body before the referencing row is committed.
+    """
+    digest = response_hash(text)
+    cursor.execute('''
+        INSERT OR IGNORE INTO response_bodies (hash, body, size)
+        VALUES (?, ?, ?)
+    ''', (digest, zlib.compress(text.encode('utf-8')), len(text)))
+    return digest
+
+def migrate_response_bodies(batch_size: int = 1000) -> int:
+    """Move inline response text of older conversations into response_bodies."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    migrated = 0
+
+    while True:
+        cursor.execute('''
+            SELECT id, ai_response FROM conversations
+            WHERE response_hash IS NULL
+            LIMIT ?
+        ''', (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        updates = [(store_response_body(cursor, row['ai_response']), row['id']) for row in rows]
+        cursor.executemany("UPDATE conversations SET response_hash = ?, ai_response = '' WHERE id = ?", updates)
+        conn.commit()
+        migrated += len(rows)
+
+    conn.close()
+    if migrated:
+        print(f"✅ Migrated {migrated} conversation responses to response_bodies")
+    return migrated
+
+def prune_response_bodies() -> int:
+    """Delete response bodies no longer referenced by any conversation (e.g. after archiving)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        DELETE FROM response_bodies
+        WHERE NOT EXISTS (SELECT 1 FROM conversations c WHERE c.response_hash = response_bodies.hash)
+    ''')
+    deleted = cursor.rowcount
+    conn.commit()
+
+    conn.close()
+    return deleted
+
 def log_conversation(
     user_id: str,
     user_message: str,
@@ -112,9 +368,10 @@ def log_conversation(
     response_time_ms: int = 0,
     content_type: str = "text",
     detected_intent: str = None,
-    obd_code: str = None
+    obd_code: str = None,
+    status: str = "completed"
 ):
-    """Log a conversation to the database."""
+    """Log a conversation to the database (`status` records abandoned turns)."""
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -122,21 +379,26 @@ def log_conversation(
     if not detected_intent:
         detected_intent = detect_intent(user_message)
 
+    # Response text is stored once per distinct body (learned answers, OBD answers, refusals repeat a lot)
+    body_hash = store_response_body(cursor, ai_response)
     cursor.execute('''
         INSERT INTO conversations
-        (user_id, user_message, ai_response, response_time_ms, content_type, detected_intent, obd_code_detected)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, user_message, ai_response, response_time_ms, content_type, detected_intent, obd_code))
+        (user_id, user_message, ai_response, response_hash, response_time_ms, content_type, detected_intent,
+         obd_code_detected, status)
+        VALUES (?, ?, '', ?, ?, ?, ?, ?, ?)
+    ''', (user_id, user_message, body_hash, response_time_ms, content_type, detected_intent, obd_code, status))
 
-    # Update question analytics
+    # Update question analytics (with the near-duplicate cluster of the question)
     normalized = normalize_question(user_message)
+    cluster_id = assign_question_cluster(cursor, user_message)
     cursor.execute('''
-        INSERT INTO question_analytics (question_normalized, category, count, last_asked)
-        VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+        INSERT INTO question_analytics (question_normalized, category, count, last_asked, cluster_id)
+        VALUES (?, ?, 1, CURRENT_TIMESTAMP, ?)
         ON CONFLICT(question_normalized) DO UPDATE SET
             count = count + 1,
-            last_asked = CURRENT_TIMESTAMP
-    ''', (normalized, detected_intent))
+            last_asked = CURRENT_TIMESTAMP,
+            cluster_id = COALESCE(cluster_id, excluded.cluster_id)
+    ''', (normalized, detected_intent, cluster_id))
 
     # Update daily stats
     today = datetime.now().strftime('%Y-%m-%d')
@@ -161,6 +423,16 @@ def log_conversation(
     conn.commit()
     conn.close()
 
+CLOSING_TURN_MAX_WORDS = 8
+
+def _opens_or_closes(message_lower: str, phrases: list) -> bool:
+    """Whether a short message starts or ends with one of the phrases."""
+    if len(message_lower.split()) > CLOSING_TURN_MAX_WORDS:
+        return False
+    alternatives = '|'.join(re.escape(phrase) for phrase in phrases)
+    return bool(re.search(r'^\W*(' + alternatives + r')\b', message_lower)
+                or re.search(r'\b(' + alternatives + r')\W*$', message_lower))
+
 def detect_intent(message: str) -> str:
     """Detect the intent of a user message."""
     message_lower = message.lower()
@@ -180,6 +452,17 @@ def detect_intent(message: str) -> str:
     if any(kw in message_lower for kw in technical_keywords):
         return 'technical'
 
+    # Farewells and thanks (before greetings: "merci, bonne journée" closes the conversation).
+    # Only short turns that open or close on them: "quelle vitesse à plus de 100 km/h" is not a farewell
+    farewells = ['au revoir', 'bye', 'goodbye', 'ciao', 'adieu', 'à bientôt', 'a bientot', 'à plus',
+                 'à plus tard', 'a plus tard', 'à demain', 'a demain', 'bonne journée', 'bonne journee', 'bonne soirée', 'bonne soiree', 'bonne nuit']
+    if _opens_or_closes(message_lower, farewells):
+        return 'farewell'
+
+    thanks = ['merci', 'thanks', 'thank you', 'thx', 'je vous remercie', 'je te remercie']
+    if _opens_or_closes(message_lower, thanks):
+        return 'thanks'
+
     # Greetings
     greetings = ['bonjour', 'salut', 'hello', 'bonsoir', 'hey', 'coucou']
     if any(kw in message_lower for kw in greetings):
@@ -205,16 +488,18 @@ def learn_from_conversation(question: str, answer: str, category: str = None, ra
     cursor = conn.cursor()
 
     pattern = normalize_question(question)
+    cluster_id = assign_question_cluster(cursor, question)
 
     cursor.execute('''
-        INSERT INTO learned_qa (question_pattern, best_answer, category, avg_rating)
-        VALUES (?, ?, ?, ?)
+        INSERT INTO learned_qa (question_pattern, best_answer, category, avg_rating, cluster_id)
+        VALUES (?, ?, ?, ?, ?)
         ON CONFLICT(question_pattern) DO UPDATE SET
             best_answer = CASE WHEN ? > avg_rating THEN ? ELSE best_answer END,
             times_used = times_used + 1,
             avg_rating = (avg_rating * times_used + ?) / (times_used + 1),
-            updated_at = CURRENT_TIMESTAMP
-    ''', (pattern, answer, category, rating, rating, answer, rating))
+            updated_at = CURRENT_TIMESTAMP,
+            cluster_id = COALESCE(cluster_id, excluded.cluster_id)
+    ''', (pattern, answer, category, rating, cluster_id, rating, answer, rating))
 
     conn.commit()
     conn.close()
@@ -230,6 +515,24 @@ def find_similar_question(question: str) -> Optional[Dict]:
     if not words:
         return None
 
+    # Prefer the answer learned for the same normalized question (clusters are
+    # for analytics only: "prix vidange clio" and "golf" may share one)
+    cursor.execute('''
+        SELECT question_pattern, best_answer, category, times_used, avg_rating
+        FROM learned_qa
+        WHERE question_pattern = ?
+    ''', (pattern,))
+    row = cursor.fetchone()
+    if row:
+        conn.close()
+        return {
+            'question': row['question_pattern'],
+            'answer': row['best_answer'],
+            'category': row['category'],
+            'times_used': row['times_used'],
+            'rating': row['avg_rating']
+        }
+
     # Search for questions containing similar words
     placeholders = ' OR '.join(['question_pattern LIKE ?' for _ in words])
     like_patterns = [f'%{word}%' for word in words]
@@ -255,17 +558,37 @@ def find_similar_question(question: str) -> Optional[Dict]:
         }
     return None
 
-def get_top_questions(limit: int = 20) -> List[Dict]:
-    """Get the most frequently asked questions."""
+def get_top_questions(limit: int = 20, by_cluster: bool = True) -> List[Dict]:
+    """
+    Get the most frequently asked questions.
+    By default near-duplicates are aggregated per cluster and reported under the
+    cluster's representative question.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT question_normalized, count, category, last_asked
-        FROM question_analytics
-        ORDER BY count DESC
-        LIMIT ?
-    ''', (limit,))
+    if by_cluster:
+        cursor.execute('''
+            SELECT qa.cluster_id,
+                   COALESCE(qc.representative, MAX(qa.question_normalized)) AS question,
+                   MAX(qa.question_normalized) AS question_normalized,
+                   SUM(qa.count) AS count,
+                   COUNT(*) AS variants,
+                   MAX(qa.category) AS category,
+                   MAX(qa.last_asked) AS last_asked
+            FROM question_analytics qa
+            LEFT JOIN question_clusters qc ON qc.id = qa.cluster_id
+            GROUP BY COALESCE(qa.cluster_id, -qa.id)
+            ORDER BY count DESC
+            LIMIT ?
+        ''', (limit,))
+    else:
+        cursor.execute('''
+            SELECT question_normalized, count, category, last_asked, cluster_id
+            FROM question_analytics
+            ORDER BY count DESC
+            LIMIT ?
+        ''', (limit,))
 
     rows = cursor.fetchall()
     conn.close()
@@ -290,19 +613,58 @@ def get_daily_stats(days: int = 7) -> List[Dict]:
     return [dict(row) for row in rows]
 
 def get_analytics_summary() -> Dict:
-    """Get a comprehensive analytics summary."""
+    """Get a comprehensive analytics summary (spans the hot DB and archive partitions)."""
+    total_conversations = 0
+    users = set()
+    intent_distribution = Counter()
+    obd_counts = Counter()
+    abandoned_turns = Counter()
+
+    for conn in get_conversation_tiers():
+        cursor = conn.cursor()
+
+        # Total conversations
+        cursor.execute('SELECT COUNT(*) as total FROM conversations')
+        total_conversations += cursor.fetchone()['total']
+
+        # Unique users
+        cursor.execute('SELECT DISTINCT user_id FROM conversations')
+        users.update(row['user_id'] for row in cursor.fetchall())
+
+        # Intent distribution
+        cursor.execute('''
+            SELECT detected_intent, COUNT(*) as count
+            FROM conversations
+            WHERE detected_intent IS NOT NULL
+            GROUP BY detected_intent
+        ''')
+        for row in cursor.fetchall():
+            intent_distribution[row['detected_intent']] += row['count']
+
+        # OBD codes queried
+        cursor.execute('''
+            SELECT obd_code_detected, COUNT(*) as count
+            FROM conversations
+            WHERE obd_code_detected IS NOT NULL
+            GROUP BY obd_code_detected
+        ''')
+        for row in cursor.fetchall():
+            obd_counts[row['obd_code_detected']] += row['count']
+
+        # Turns whose generation was cancelled
+        cursor.execute('''
+            SELECT status, COUNT(*) as count
+            FROM conversation_messages
+            WHERE status LIKE 'abandoned%'
+            GROUP BY status
+        ''')
+        for row in cursor.fetchall():
+            abandoned_turns[row['status']] += row['count']
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Total conversations
-    cursor.execute('SELECT COUNT(*) as total FROM conversations')
-    total_conversations = cursor.fetchone()['total']
-
-    # Unique users
-    cursor.execute('SELECT COUNT(DISTINCT user_id) as users FROM conversations')
-    unique_users = cursor.fetchone()['users']
-
-    # Conversations today
+    # Conversations today (always in the hot DB)
     cursor.execute('''
         SELECT COUNT(*) as today
         FROM conversations
@@ -310,73 +672,55 @@ def get_analytics_summary() -> Dict:
     ''')
     today_conversations = cursor.fetchone()['today']
 
-    # Intent distribution
-    cursor.execute('''
-        SELECT detected_intent, COUNT(*) as count
-        FROM conversations
-        WHERE detected_intent IS NOT NULL
-        GROUP BY detected_intent
-        ORDER BY count DESC
-    ''')
-    intent_distribution = {row['detected_intent']: row['count'] for row in cursor.fetchall()}
-
-    # Top 10 questions
-    cursor.execute('''
-        SELECT question_normalized, count
-        FROM question_analytics
-        ORDER BY count DESC
-        LIMIT 10
-    ''')
-    top_questions = [(row['question_normalized'], row['count']) for row in cursor.fetchall()]
+    # Top 10 questions (near-duplicates aggregated per cluster)
+    top_questions = [(row['question'], row['count']) for row in get_top_questions(10)]
 
     # Learned Q&A count
     cursor.execute('SELECT COUNT(*) as learned FROM learned_qa')
     learned_qa_count = cursor.fetchone()['learned']
 
-    # OBD codes queried
-    cursor.execute('''
-        SELECT obd_code_detected, COUNT(*) as count
-        FROM conversations
-        WHERE obd_code_detected IS NOT NULL
-        GROUP BY obd_code_detected
-        ORDER BY count DESC
-        LIMIT 10
-    ''')
-    top_obd_codes = [(row['obd_code_detected'], row['count']) for row in cursor.fetchall()]
-
     conn.close()
 
     return {
         'total_conversations': total_conversations,
-        'unique_users': unique_users,
+        'unique_users': len(users),
         'today_conversations': today_conversations,
-        'intent_distribution': intent_distribution,
+        'abandoned_turns': dict(abandoned_turns),
+        'intent_distribution': dict(intent_distribution.most_common()),
         'top_questions': top_questions,
         'learned_qa_count': learned_qa_count,
-        'top_obd_codes': top_obd_codes
+        'top_obd_codes': obd_counts.most_common(10)
     }
 
-def get_unanswered_patterns() -> List[str]:
+def get_unanswered_patterns(limit: int = 20) -> List[str]:
     """Find questions that the AI struggled to answer (potential knowledge gaps)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Find questions with short responses or error patterns
-    cursor.execute('''
-        SELECT DISTINCT user_message
-        FROM conversations
-        WHERE LENGTH(ai_response) < 50
-        OR ai_response LIKE '%je ne sais pas%'
-        OR ai_response LIKE '%je ne peux pas%'
-        OR ai_response LIKE '%désolé%'
-        ORDER BY timestamp DESC
-        LIMIT 20
-    ''')
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    return [row['user_message'] for row in rows]
+    messages = []
+
+    # Most recent first: the hot DB, then older partitions until we have enough
+    for conn in get_conversation_tiers():
+        cursor = conn.cursor()
+
+        # Find answered questions with short responses or error patterns (abandoned turns have no answer)
+        cursor.execute('''
+            SELECT DISTINCT user_message
+            FROM conversation_messages
+            WHERE status = 'completed' AND (
+                LENGTH(ai_response) < 50
+                OR ai_response LIKE '%je ne sais pas%'
+                OR ai_response LIKE '%je ne peux pas%'
+                OR ai_response LIKE '%désolé%'
+            )
+            ORDER BY timestamp DESC
+            LIMIT ?
+        ''', (limit,))
+
+        for row in cursor.fetchall():
+            if row['user_message'] not in messages:
+                messages.append(row['user_message'])
+        if len(messages) >= limit:
+            break
+
+    return messages[:limit]
 
 # Cache functions for internet search
 def cache_search_results(query: str, results: str, expires_hours: int = 24):
@@ -453,3 +797,9 @@ def seed_learned_qa():
 
 # Seed on first run
 seed_learned_qa()
+
+# Cluster questions recorded before clustering existed
+backfill_question_clusters()
+
+# Deduplicate response text of conversations logged before response_bodies existed
+migrate_response_bodies()
@@ -0,0 +1,135 @@
+# annotation.py - Lazy Annotated Image Rendering for Kounhany AI
+# Chat replies only carry the detection boxes and a detection id. The annotated
+# image (boxes colored by severity) is drawn and encoded the first time the
+# client asks for it, then served from an in-memory LRU cache.
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from indicators import get_indicator_info
+from vision import decode_image, resize_for_detector
+
+# Memory budget for the source photos and their rendered versions
+ANNOTATION_CACHE_MB = int(os.environ.get("ANNOTATION_CACHE_MB", "64"))
+
+# format -> (file extension, media type, encoder parameters)
+ANNOTATION_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    "webp": (".webp", "image/webp", [cv2.IMWRITE_WEBP_QUALITY, 80]),
+}
+
+# BGR box colors, matching the chat page caption (🟥 Critique | 🟨 Moyen | 🟦 Faible)
+SEVERITY_COLORS = {
+    "high": (40, 40, 230),
+    "medium": (0, 200, 255),
+    "low": (230, 140, 0),
+}
+UNKNOWN_COLOR = (180, 180, 180)
+
+def draw_detections(image: np.ndarray, detections: List[dict]) -> np.ndarray:
+    """Draw the detection boxes (relative xyxy) and labels on a copy of a BGR image."""
+    annotated = image.copy()
+    height, width = annotated.shape[:2]
+    thickness = max(2, round(max(height, width) / 320))
+    font_scale = max(0.5, max(height, width) / 1200)
+
+    for detection in detections:
+        box = detection.get("box")
+        if not box:
+            continue
+        info = get_indicator_info(detection["class"])
+        color = SEVERITY_COLORS.get(info["severity"], UNKNOWN_COLOR) if info else UNKNOWN_COLOR
+
+        x1, y1, x2, y2 = (int(round(v * size)) for v, size in zip(box, (width, height, width, height)))
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, thickness)
+
+        label = f"{detection['class']} {detection['confidence']:.0%}"
+        (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        top = max(y1 - text_h - baseline - 4, 0)
+        cv2.rectangle(annotated, (x1, top), (x1 + text_w + 4, top + text_h + baseline + 4), color, -1)
+        cv2.putText(annotated, label, (x1 + 2, top + text_h + 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (0, 0, 0), 1, cv2.LINE_AA)
+
+    return annotated
+
+def encode_image(image: np.ndarray, image_format: str = "jpeg") -> bytes:
+    """Encode a BGR image as JPEG or WebP."""
+    extension, _, params = ANNOTATION_FORMATS[image_format]
+    ok, encoded = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return encoded.tobytes()
+
+class AnnotatedImageStore:
+    """
+    Keeps the source photo and detections of recent requests by detection id and
+    renders the annotated image on first request. LRU bounded by total bytes.
+    """
+
+    def __init__(self, max_bytes: int = ANNOTATION_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # detection id -> {"source": bytes, "detections": list, "rendered": {format: bytes}}
+        self.entries: OrderedDict = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {"renders": 0, "hits": 0}
+
+    @staticmethod
+    def _entry_size(entry: Dict) -> int:
+        return len(entry["source"]) + sum(len(data) for data in entry["rendered"].values())
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= self._entry_size(entry)
+
+    def register(self, detection_id: str, image_bytes: bytes, detections: List[dict]):
+        """Remember a photo and its detections. Nothing is drawn yet."""
+        with self.lock:
+            previous = self.entries.pop(detection_id, None)
+            if previous:
+                self.total_bytes -= self._entry_size(previous)
+            entry = {"source": image_bytes, "detections": detections, "rendered": {}}
+            self.entries[detection_id] = entry
+            self.total_bytes += self._entry_size(entry)
+            self._evict()
+
+    def render(self, detection_id: str, image_format: str = "jpeg") -> Optional[bytes]:
+        """Annotated image of a detection (rendered once per format), None if unknown or evicted."""
+        with self.lock:
+            entry = self.entries.get(detection_id)
+            if entry is None:
+                return None
+            self.entries.move_to_end(detection_id)
+            rendered = entry["rendered"].get(image_format)
+            if rendered is not None:
+                self.stats["hits"] += 1
+                return rendered
+            source, detections = entry["source"], entry["detections"]
+
+        # Same decode + downscale as before inference, so the boxes line up
+        image = resize_for_detector(decode_image(source))
+        rendered = encode_image(draw_detections(image, detections), image_format)
+
+        with self.lock:
+            self.stats["renders"] += 1
+            if self.entries.get(detection_id) is entry:
+                entry["rendered"][image_format] = rendered
+                self.total_bytes += len(rendered)
+                self._evict()
+        return rendered
+
+    def get_stats(self) -> Dict:
+        """Entries, memory used and render/hit counts."""
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "memory_mb": round(self.total_bytes / (1024 * 1024), 2),
+                "renders": self.stats["renders"],
+                "hits": self.stats["hits"]
+            }
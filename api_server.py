@@ -1,39 +1,61 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
-from llama_cpp import Llama
+from llama_cpp import Llama, StoppingCriteriaList
 from typing import Optional, Dict, List
 from fastapi.templating import Jinja2Templates
-from fastapi import Request
-import base64
-import io
-from PIL import Image
-import torch
-from ultralytics import YOLO
-import cv2
+from fastapi import Request, Query
+from starlette.concurrency import run_in_threadpool
 import numpy as np
-from collections import defaultdict
 from rapidfuzz import fuzz, process
+import math
 import re
 import time
+import threading
+import asyncio
 
 # Import keywords from external file
 from keywords import GENERAL_CONVERSATION_KEYWORDS, AUTOMOBILE_KEYWORDS
 
 # Import new modules
 from obd_codes import OBD_CODES, get_obd_code_info, format_obd_response, search_obd_codes
+from indicators import build_class_index, get_indicator_info, find_referenced_indicators, format_indicator_line, format_indicator_response
 from analytics import (
     log_conversation, detect_intent, learn_from_conversation,
     find_similar_question, get_analytics_summary, get_top_questions
 )
 from web_search import detect_search_intent, perform_search, search_duckduckgo, format_search_results
+from warmup import mark_live_activity, get_warm_answer, get_warm_cache_stats, start_warming_scheduler
+from retention import start_retention_scheduler
+from export import EXPORT_FORMATS, export_conversations
+from vision import (
+    SUPPORTED_IMAGE_FORMATS, InferenceBatcher, check_image_quality, decode_base64_image, decode_image,
+    resize_for_detector
+)
+from detectors import RawDetections
+from video import SUPPORTED_VIDEO_FORMATS, VIDEO_MAX_UPLOAD_MB, aggregate_timeline, sample_image_sequence, sample_video_bytes
+from vision_pool import VISION_WORKERS, load_vision_executor
+from health import HealthMonitor
+from annotation import ANNOTATION_FORMATS, AnnotatedImageStore
+from sessions import SESSION_SNAPSHOT_PATH, Message, load_session_store
+from summarizer import SUMMARY_MAX_TOKENS, SUMMARY_RECENT_MESSAGES, SessionSummarizer
+from ratelimit import CONCURRENCY_RETRY_AFTER, RateLimiter
+from idempotency import IdempotencyCache, request_key
+from router import SMALL_MODEL_COST_RATIO, ModelRouter, load_small_model
+from smalltalk import template_response
+from scheduler import ActiveGenerations, CancelToken, GenerationCancelled, LLMScheduler, OutputLengthPredictor, QueueFull
+from detection_cache import DetectionCache, DETECTION_PHASH_DISTANCE, content_hash, perceptual_hash
 
 templates = Jinja2Templates(directory="templates")
 app = FastAPI()
 
-# Conversation memory storage
-conversation_memory = defaultdict(list)
+# Conversation memory storage (bounded: idle TTL, LRU eviction under a memory cap).
+# SESSION_BACKEND=sqlite shares it between uvicorn workers.
+session_store = load_session_store()
+
+# Per-user and global token buckets, limit on concurrent LLM generations
+rate_limiter = RateLimiter()
 
 # Load Qwen2.5-32B-Instruct-Q5 (MAXIMIZED for RTX 4090 24GB)
 model = Llama(
@@ -46,8 +68,79 @@ model = Llama(
     verbose=False            # Clean logs
 )
 
-# Load YOLOv8 model
-yolo_model = YOLO("/workspace/ai/best.pt")
+# Optional small model (SMALL_MODEL_PATH) answering simple turns in place of the 32B
+small_model = load_small_model()
+model_router = ModelRouter(enabled=small_model is not None)
+SMALL_MODEL_MAX_TOKENS = 200
+
+# llama.cpp is not thread-safe: live requests and background jobs take turns on the model.
+# The scheduler picks the next generation by lane, then fairly across users, short jobs first.
+llm_scheduler = LLMScheduler()
+output_predictor = OutputLengthPredictor()
+# Live generation of each user: cancelled when the client disconnects or sends a new message
+active_generations = ActiveGenerations()
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Retries of a /chat request share the original computation (or replay its response)
+idempotency_cache = IdempotencyCache()
+
+# LLM queue depth and latency, reported by the readiness probe
+llm_stats = {"waiting": 0, "last_generation_ms": None}
+llm_stats_lock = threading.Lock()
+
+# Load YOLOv8 model (VISION_BACKEND: "torch" = ultralytics, "onnx" = ONNX Runtime on CPU).
+# With VISION_WORKERS > 0 the model lives in worker processes instead (same interface).
+yolo_model = load_vision_executor()
+
+# Knowledge base entry of every detector class, resolved once
+indicator_index = build_class_index(yolo_model.names)
+print(f"Indicator knowledge base: {len(indicator_index)}/{len(yolo_model.names)} detector classes covered")
+
+def run_yolo_batch(images: List[np.ndarray]) -> List[RawDetections]:
+    """One batched YOLOv8 forward pass, one result per image."""
+    return yolo_model.detect_batch(images)
+
+# Concurrent image requests share batched forward passes
+# (one batch in flight per worker process when the pool is enabled)
+vision_batcher = InferenceBatcher(run_yolo_batch, num_threads=max(1, VISION_WORKERS))
+
+# Background self-tests for /health/ready: probes go through the same paths as live
+# traffic (the vision batcher, the loaded LLM) but never from a request handler
+health_monitor = HealthMonitor()
+HEALTH_TEST_IMAGE = np.zeros((64, 64, 3), dtype=np.uint8)
+
+def probe_vision():
+    vision_batcher.submit(HEALTH_TEST_IMAGE).result(timeout=30)
+
+def probe_llm():
+    # Tokenizing checks the model is loaded without taking the generation lock
+    if not model.tokenize(b"Bonjour"):
+        raise RuntimeError("LLM tokenizer returned no tokens")
+
+health_monitor.add_probe("vision", probe_vision)
+health_monitor.add_probe("llm", probe_llm)
+
+# Resent (or near-identical) photos reuse their previous detections
+detection_cache = DetectionCache()
+
+# Annotated images are only drawn when GET /detections/{id}/image is requested
+annotated_images = AnnotatedImageStore()
+
+# Specific answers for photos rejected by the quality pre-filter (no detector pass)
+IMAGE_QUALITY_MESSAGES = {
+    "too_small": "📏 L'image est trop petite pour distinguer les voyants. Envoyez une photo en meilleure résolution du tableau de bord.",
+    "too_dark": "🌑 L'image est trop sombre, aucun voyant n'est visible. Mettez le contact (voyants allumés) ou reprenez la photo avec plus de lumière.",
+    "overexposed": "☀️ L'image est surexposée (reflet ou contre-jour). Reprenez la photo en évitant le soleil direct ou le flash sur le tableau de bord.",
+    "blurry": "📷 L'image est floue. Stabilisez le téléphone, faites la mise au point sur le tableau de bord et reprenez la photo."
+}
+
+def prepare_image(image_bytes: bytes):
+    """Decode, run the quality pre-filter and downscale to the detector input size."""
+    image_cv = decode_image(image_bytes)
+    quality = check_image_quality(image_cv)
+    if quality["issue"]:
+        return None, quality
+    return resize_for_detector(image_cv), quality
 
 def detect_obd_code(text: str) -> Optional[str]:
     """Detect OBD-II code in user message."""
@@ -154,53 +247,81 @@ def is_automobile_related(text: str, user_id: str = None) -> bool:
         return True
 
     # Allow if user has active conversation (context-aware)
-    if user_id and user_id in conversation_memory and len(conversation_memory[user_id]) > 0:
+    if user_id and session_store.has_history(user_id):
         return True
 
     return False
 
-def process_image_with_yolov8(image_data: str) -> dict:
+def parse_yolo_result(result: RawDetections, image_shape: tuple) -> List[dict]:
     """
-    Process base64 image with YOLOv8 model and return simple detection results
+    Turn one YOLOv8 result into unique detections above the confidence threshold.
+    Boxes are kept as relative xyxy coordinates (0-1) of the image.
+    """
+    detections = []
+    detected_classes = set()
+    height, width = image_shape[:2]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+
+    for box, confidence, class_id in zip(result.boxes, result.scores, result.class_ids):
+        class_name = yolo_model.names[class_id]
+
+        # Only add if confidence > 0.3 and not duplicate
+        if confidence > 0.3 and class_name not in detected_classes:
+            detected_classes.add(class_name)
+            detections.append({
+                "class": class_name,
+                "confidence": round(float(confidence), 3),
+                "box": [round(float(v), 4) for v in box / scale]
+            })
+
+    return detections
+
+async def process_image_with_yolov8(image_bytes: bytes) -> dict:
+    """
+    Process an encoded image with YOLOv8 model and return simple detection results
     """
     try:
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to OpenCV format
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Run YOLOv8 inference
-        results = yolo_model(image_cv)
-        
-        # Process results - simplified
-        detections = []
-        detected_classes = set()
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    confidence = float(box.conf[0])
-                    class_id = int(box.cls[0])
-                    class_name = yolo_model.names[class_id]
-                    
-                    # Only add if confidence > 0.3 and not duplicate
-                    if confidence > 0.3 and class_name not in detected_classes:
-                        detected_classes.add(class_name)
-                        detections.append({
-                            "class": class_name,
-                            "confidence": round(confidence, 3)
-                        })
-        
-        return {
+        # Same photo sent again: no decode, no inference
+        cache_key = content_hash(image_bytes)
+        cached = detection_cache.get_exact(cache_key)
+        if cached:
+            cached["cached"] = True
+            return register_detections(cache_key, image_bytes, cached)
+
+        # Decode straight to a BGR array (reduced resolution for large JPEGs), off the event loop,
+        # and answer right away for unusable photos (blurry, dark, tiny) without a detector pass
+        image_cv, quality = await run_in_threadpool(prepare_image, image_bytes)
+        if image_cv is None:
+            return {
+                "detections": [],
+                "total_detections": 0,
+                "detected_classes": [],
+                "success": True,
+                "quality_issue": quality["issue"],
+                "quality": quality
+            }
+
+        # Near-identical shot of the same dashboard
+        phash = perceptual_hash(image_cv) if DETECTION_PHASH_DISTANCE else None
+        cached = detection_cache.get_similar(phash)
+        if cached:
+            cached["cached"] = True
+            return register_detections(cache_key, image_bytes, cached)
+
+        # Run YOLOv8 inference (batched with concurrent requests)
+        inference_start = time.time()
+        result = await vision_batcher.detect(image_cv)
+        detections = parse_yolo_result(result, image_cv.shape)
+
+        detection_results = {
             "detections": detections,
             "total_detections": len(detections),
-            "detected_classes": list(detected_classes),
+            "detected_classes": [d["class"] for d in detections],
             "success": True
         }
-        
+        detection_cache.put(cache_key, phash, detection_results, (time.time() - inference_start) * 1000)
+        return register_detections(cache_key, image_bytes, detection_results)
+
     except Exception as e:
         return {
             "detections": [],
@@ -210,6 +331,42 @@ def process_image_with_yolov8(image_data: str) -> dict:
             "error": str(e)
         }
 
+def register_detections(detection_id: str, image_bytes: bytes, detection_results: dict) -> dict:
+    """Give a result its detection id and keep the photo for lazy annotated rendering."""
+    if detection_results["detections"]:
+        annotated_images.register(detection_id, image_bytes, detection_results["detections"])
+        detection_results["detection_id"] = detection_id
+    return detection_results
+
+def merge_detection_results(results: List[dict]) -> dict:
+    """Combine the detections of several photos (highest confidence per indicator)."""
+    if len(results) == 1:
+        results[0]["detection_ids"] = [results[0]["detection_id"]] if "detection_id" in results[0] else []
+        return results[0]
+
+    best = {}
+    for result in results:
+        for detection in result["detections"]:
+            if detection["class"] not in best or detection["confidence"] > best[detection["class"]]["confidence"]:
+                best[detection["class"]] = detection
+
+    detections = sorted(best.values(), key=lambda d: d["confidence"], reverse=True)
+    merged = {
+        "detections": detections,
+        "total_detections": len(detections),
+        "detected_classes": [d["class"] for d in detections],
+        "success": any(result["success"] for result in results),
+        "detection_ids": [result["detection_id"] for result in results if "detection_id" in result]
+    }
+    errors = [result["error"] for result in results if "error" in result]
+    if errors:
+        merged["error"] = "; ".join(errors)
+    # Only report a quality problem when no photo was usable
+    issues = [result.get("quality_issue") for result in results]
+    if all(issues):
+        merged["quality_issue"] = issues[0]
+    return merged
+
 def generate_image_response(detection_results: dict) -> str:
     """
     Generate simple French response for image detection
@@ -217,6 +374,9 @@ def generate_image_response(detection_results: dict) -> str:
     if not detection_results["success"]:
         return "❌ Désolé, je n'ai pas pu analyser l'image. Veuillez réessayer avec une image plus claire du tableau de bord."
     
+    if detection_results.get("quality_issue"):
+        return IMAGE_QUALITY_MESSAGES[detection_results["quality_issue"]]
+
     detections = detection_results["detections"]
     total = detection_results["total_detections"]
     
@@ -229,12 +389,306 @@ def generate_image_response(detection_results: dict) -> str:
     
     for detection in detections:
         response_parts.append(f"• {detection['class']} ({detection['confidence']:.1%})")
+        info = indicator_index.get(detection["class"])
+        if info:
+            response_parts.append(f"  {format_indicator_line(detection['class'], info)}")
     
     response_parts.append("")
     response_parts.append("💡 *Pour plus d'informations sur un indicateur spécifique, posez-moi une question en texte.*")
     
     return "\n".join(response_parts)
 
+# Optimized prompt for Qwen2.5-32B using native chat format
+SYSTEM_PROMPT = """Tu es un assistant automobile français expert et amical pour KOUNHANY.
+
+=== À PROPOS DE KOUNHANY ===
+KOUNHANY est une application marocaine d'après-vente automobile offrant transparence et sécurité.
+
+🚗 3 SERVICES PRINCIPAUX:
+1. Forfaits Réparation (Particuliers) - Forfaits avec garages audités et pièces certifiées
+2. Vente de Pièces Auto (Garagistes) - Pièces certifiées avec livraison
+3. Dépannage & Assistance Routière 24/7 - Géolocalisation en temps réel
+
+🔑 ATOUTS CLÉS:
+• Forfaits intelligents et pièces certifiées
+• Garages audités et notés par clients
+• Carnet d'entretien numérique
+• Assistance routière géolocalisée 24/7
+• Paiement sécurisé via CMI (aucune donnée bancaire stockée)
+
+📱 FONCTIONNALITÉS:
+• Identification véhicule par VIN ou manuellement (Marque > Modèle > Version)
+• Comparatif garages: tarifs, proximité, audits, avis clients
+• Prise de rendez-vous avec choix date/heure
+• Code promo et acompte flexible (30% ou 100%)
+• Suivi commandes dans onglet "Réservations"
+
+📧 CONTACT KOUNHANY:
+• Email: contactkounhany@gmail.com
+
+RÈGLES IMPORTANTES:
+- Quand on te pose des questions sur Kounhany, utilise ces informations
+- Réponds de manière concise et claire
+- Si l'utilisateur dit "repeat", "répète" ou "je n'ai pas compris", reformule plus simplement
+- Pour les salutations, réponds brièvement: "Bonjour ! Comment puis-je vous aider ?"
+- Ne jamais inventer de prix ou informations non vérifiées
+- Reste concentré sur l'automobile et Kounhany
+- INTERDIT: Ne JAMAIS inventer de numéros de téléphone, adresses ou coordonnées
+- Si on te demande un numéro de téléphone Kounhany, dis: "Pour le numéro de téléphone, veuillez consulter l'application ou envoyer un email à contactkounhany@gmail.com"
+- Termine toujours tes phrases complètement"""
+
+# Patterns that indicate leaked prompts or role markers in the model output
+CLEANUP_PATTERNS = [
+    "Je n'ai pas compris.",
+    "Je n'ai pas compris",
+    "Utilisateur:",
+    "Assistant:",
+    "Question:",
+    "Réponse:",
+    "<|im_start|>",
+    "<|im_end|>",
+    "RÈGLES",
+    "(Note:",
+    "\n\nUtilisateur",
+    "\n\nAssistant"
+]
+
+def build_chat_prompt(user_prompt: str, context_messages: List[Message], summary: str = "") -> str:
+    """Build the Qwen2.5 native chat prompt with the conversation summary and recent history."""
+    system_prompt = SYSTEM_PROMPT
+    if summary:
+        system_prompt += f"\n\nRésumé de la conversation jusqu'ici:\n{summary}"
+    messages_formatted = f"<|im_start|>system\n{system_prompt}<|im_end|>\n"
+
+    # Add conversation history
+    for msg in context_messages:
+        if msg.role == "user":
+            messages_formatted += f"<|im_start|>user\n{msg.content}<|im_end|>\n"
+        else:
+            messages_formatted += f"<|im_start|>assistant\n{msg.content}<|im_end|>\n"
+
+    # Add current question
+    messages_formatted += f"<|im_start|>user\n{user_prompt}<|im_end|>\n<|im_start|>assistant\n"
+    return messages_formatted
+
+def clean_llm_response(response_text: str) -> str:
+    """Remove leaked prompts and make sure the response ends on a full sentence."""
+    # Aggressive cleaning of leaked prompts and patterns
+    for pattern in CLEANUP_PATTERNS:
+        if pattern in response_text:
+            response_text = response_text.split(pattern)[0].strip()
+
+    # Ensure response ends with proper punctuation
+    if response_text and not response_text.endswith(('.', '?', '!', ':')):
+        # Try to find the last complete sentence
+        last_period = max(response_text.rfind('.'), response_text.rfind('!'), response_text.rfind('?'))
+        if last_period > len(response_text) * 0.5:  # If we have at least half the response
+            response_text = response_text[:last_period + 1]
+        else:
+            response_text = response_text + "."
+
+    return response_text
+
+LLM_STOP_SEQUENCES = ["<|im_end|>", "<|im_start|>", "Utilisateur:", "Assistant:", "\n\nUtilisateur", "\n\nQuestion"]
+
+def recording_stops(criteria: List, fired: List) -> List:
+    """Wrap stopping criteria so that `fired` gets an entry when one of them aborts a generation."""
+    def wrap(criterion):
+        def check(input_ids, logits):
+            if criterion(input_ids, logits):
+                fired.append(criterion)
+                return True
+            return False
+        return check
+    return [wrap(criterion) for criterion in criteria]
+
+def scheduled_generation(llm: Llama, prompt: str, max_tokens: int, stopping_criteria: List, expected: float,
+                         lane: str, user_id: str, cancel: CancelToken) -> Dict:
+    """
+    Run one generation on `llm` once the scheduler hands over the model. Both models of the
+    cascade share the card (and the CPU threads), so they take turns in the same scheduler.
+    """
+    with llm_stats_lock:
+        llm_stats["waiting"] += 1
+    try:
+        with llm_scheduler.slot(lane, expected, user_id, cancelled=cancel and (lambda: cancel.cancelled)):
+            with llm_stats_lock:
+                llm_stats["waiting"] -= 1
+            started = time.time()
+            response = llm(
+                prompt,
+                max_tokens=max_tokens,
+                temperature=0.3,
+                top_p=0.9,
+                repeat_penalty=1.15,
+                stop=LLM_STOP_SEQUENCES,
+                stopping_criteria=StoppingCriteriaList(stopping_criteria) if stopping_criteria else None
+            )
+            with llm_stats_lock:
+                llm_stats["last_generation_ms"] = round((time.time() - started) * 1000, 1)
+    except (QueueFull, GenerationCancelled):
+        with llm_stats_lock:
+            llm_stats["waiting"] -= 1
+        raise
+    return response
+
+def run_small_llm(prompt: str, stopping_criteria: List = None, lane: str = "interactive",
+                  intent: str = "general", user_id: str = None, cancel: CancelToken = None):
+    """Run the cascade's small model in its scheduler turn. Returns (raw text, finish reason)."""
+    # A small-model token costs a fraction of a 32B token
+    expected = output_predictor.expected_cost(intent, prompt, SMALL_MODEL_MAX_TOKENS) * SMALL_MODEL_COST_RATIO
+    if cancel is not None:
+        stopping_criteria = [*(stopping_criteria or []), cancel]
+    response = scheduled_generation(small_model, prompt, SMALL_MODEL_MAX_TOKENS, stopping_criteria,
+                                    expected, lane, user_id, cancel)
+    if cancel is not None and cancel.cancelled:
+        # Nobody is waiting for this answer anymore: no escalation
+        raise GenerationCancelled("Cancelled during the small model generation")
+    choice = response["choices"][0]
+    return choice["text"].strip(), choice.get("finish_reason")
+
+def run_llm(prompt: str, max_tokens: int = 400, stopping_criteria: List = None,
+            lane: str = "interactive", intent: str = "general", user_id: str = None,
+            cancel: CancelToken = None) -> str:
+    """
+    Run the Qwen2.5 model on a full prompt and return the raw text.
+    The model is shared by live requests and background jobs: calls wait for their turn
+    in the scheduler `lane`, ordered fairly across users by the output length expected
+    for the `intent`. Raises QueueFull when the user already has too many waiting.
+    `stopping_criteria` callables are checked after every token to abort generation early.
+    A `cancel` token stops the generation at the next token (partial text is returned),
+    or raises GenerationCancelled if it is cancelled while still waiting for the model.
+    """
+    expected = output_predictor.expected_cost(intent, prompt, max_tokens)
+    if cancel is not None:
+        stopping_criteria = [*(stopping_criteria or []), cancel]
+    # llama.cpp reports an aborted generation as "stop" too: remember whether a criterion fired
+    interrupted = []
+    if stopping_criteria:
+        stopping_criteria = recording_stops(stopping_criteria, interrupted)
+    response = scheduled_generation(model, prompt, max_tokens, stopping_criteria, expected, lane, user_id, cancel)
+
+    # Only natural endings teach the predictor: answers cut short (cancelled, warming or a
+    # summary yielding to live traffic) would drag the expected length down
+    natural_end = response["choices"][0]["finish_reason"] in ("stop", "length")
+    if natural_end and not interrupted and not (cancel and cancel.cancelled):
+        output_predictor.observe(intent, response["usage"]["completion_tokens"])
+    return response["choices"][0]["text"].strip()
+
+def generate_llm_response(user_prompt: str, context_messages: List[Message], stopping_criteria: List = None,
+                          summary: str = "", lane: str = "interactive", intent: str = None, user_id: str = None,
+                          cancel: CancelToken = None) -> str:
+    """
+    Answer a user prompt (with the conversation summary and recent messages) and clean the answer.
+    Simple live turns go to the small model when the cascade is enabled, the rest to the 32B.
+    """
+    prompt = build_chat_prompt(user_prompt, context_messages, summary)
+    intent = intent or detect_intent(user_prompt)
+    answer = model_router.generate(
+        user_prompt, intent, len(context_messages),
+        run_small=lambda: run_small_llm(prompt, stopping_criteria, lane, intent, user_id, cancel),
+        # 400 tokens to avoid truncation
+        run_large=lambda: run_llm(prompt, 400, stopping_criteria, lane, intent, user_id, cancel),
+        # Background answers (warming) are cached for a day: always from the 32B
+        allow_small=lane != "background"
+    )
+    return clean_llm_response(answer)
+
+async def watch_disconnect(clients: List[Request], cancel: CancelToken):
+    """Cancel a generation as soon as every client waiting for it (original and retries) went away."""
+    while not cancel.cancelled:
+        if all([await client.is_disconnected() for client in clients]):
+            cancel.cancel("disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+def abandoned_turn_response(user_id: str, user_prompt: str, reason: str, start_time: float) -> dict:
+    """Record a turn whose generation was cancelled (not kept in the conversation memory)."""
+    log_conversation(
+        user_id=user_id,
+        user_message=user_prompt,
+        ai_response="",
+        response_time_ms=int((time.time() - start_time) * 1000),
+        status=f"abandoned_{reason}"
+    )
+    return {
+        "status": "cancelled",
+        "code": 499,
+        "message": f"Generation cancelled ({reason}).",
+        "data": {},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Older turns of long sessions are folded into a running summary in the background,
+# while the model is idle; live requests waiting for the model interrupt it
+session_summarizer = SessionSummarizer(
+    session_store,
+    generate=lambda prompt, stopping_criteria: run_llm(
+        prompt, SUMMARY_MAX_TOKENS, stopping_criteria, lane="background", intent="summary"
+    ),
+    is_idle=llm_scheduler.is_idle,
+    should_yield=lambda: llm_scheduler.live_waiting() > 0
+)
+
+def get_last_detected_indicators(user_id: str):
+    """
+    Indicators detected on the user's most recent photo still in memory, and whether
+    that photo is the latest exchange (so "c'est grave ?" can only be about it).
+    """
+    history = session_store.get_history(user_id)
+    for position, message in enumerate(reversed(history)):
+        if message.indicators:
+            return list(message.indicators), position <= 1
+    return [], False
+
+async def handle_image_message(user_id: str, images: List[bytes]) -> dict:
+    """
+    Run detection on uploaded image(s), remember the detected indicators and build the reply.
+    The caller has charged the "image" cost of every photo; photos answered from the
+    detection cache are refunded.
+    """
+    # Process images with YOLOv8 (all photos of a request go through the shared batcher)
+    results = await asyncio.gather(*(process_image_with_yolov8(image_bytes) for image_bytes in images))
+    cached = sum(1 for result in results if result.get("cached"))
+    if cached:
+        rate_limiter.refund(user_id, "image", count=cached)
+    detection_results = merge_detection_results(results)
+
+    # Generate simple response
+    response_text = generate_image_response(detection_results)
+
+    # Store image detection in conversation memory so user can ask follow-up questions
+    detected_indicators = detection_results.get("detected_classes", [])
+    if detected_indicators:
+        # Create a summary for memory
+        indicators_list = ", ".join(detected_indicators)
+        memory_text = f"[L'utilisateur a envoyé une photo de tableau de bord. Voyants détectés: {indicators_list}]"
+        assistant_text = f"J'ai détecté les voyants suivants sur votre tableau de bord: {indicators_list}. Vous pouvez me demander des explications sur chacun de ces voyants."
+
+        session_store.add_turn(user_id, memory_text, assistant_text, indicators=detected_indicators)
+        session_summarizer.schedule(user_id)
+
+    # Annotated images are rendered on demand, the reply only carries their URLs
+    annotated_urls = [f"/detections/{detection_id}/image" for detection_id in detection_results["detection_ids"]]
+
+    return {
+        "status": "success",
+        "code": 200,
+        "message": "Image processed successfully.",
+        "data": {
+            "response_text": response_text,
+            "annotated_image": annotated_urls[0] if annotated_urls else None,
+            "annotated_images": annotated_urls,
+            "detection_data": {
+                "detections": detection_results["detections"],
+                "total": detection_results["total_detections"],
+                "detection_ids": detection_results["detection_ids"],
+                "quality_issue": detection_results.get("quality_issue")
+            }
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 # --- Models ---
 class Media(BaseModel):
     format: str
@@ -255,8 +709,68 @@ class EnhancedMessage(BaseModel):
 async def root():
     return {"message": "API is running", "status": "healthy"}
 
+@app.on_event("startup")
+async def start_background_jobs():
+    # Off-peak warming of the most frequent questions (context-free generations)
+    start_warming_scheduler(
+        lambda question, stopping_criteria: generate_llm_response(question, [], stopping_criteria, lane="background")
+    )
+    # Daily archiving of old conversations to monthly partition files
+    start_retention_scheduler()
+    # Model self-tests backing /health/ready
+    health_monitor.start()
+    # Rolling conversation summaries
+    session_summarizer.start()
+
+@app.on_event("shutdown")
+async def save_sessions():
+    # In-process sessions survive restarts through a snapshot (no-op for the sqlite backend)
+    if SESSION_SNAPSHOT_PATH:
+        saved = session_store.snapshot()
+        if saved:
+            print(f"✅ Saved {saved} conversation sessions to snapshot")
+
+def rate_limited_response(retry_after: float) -> JSONResponse:
+    """429 reply for a request shed by admission control."""
+    retry_after = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 3600
+    return JSONResponse(status_code=429, headers={"Retry-After": str(retry_after)}, content={
+        "status": "error",
+        "code": 429,
+        "message": "Too many requests, please retry later.",
+        "data": {"retry_after": retry_after},
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
 @app.post("/chat")
-async def chat(message: EnhancedMessage):
+async def chat(message: EnhancedMessage, request: Request):
+    # Live traffic has priority over background warming
+    mark_live_activity()
+
+    # A retry (same Idempotency-Key, or same user, timestamp and content) never runs twice
+    media = message.data.media
+    key = request_key(
+        message.user_id, request.headers.get("Idempotency-Key"), message.timestamp,
+        message.data.text, media.format if media else None, media.data if media else None
+    )
+    entry, original = idempotency_cache.begin(key, request)
+    if original is not None:
+        return await original
+
+    try:
+        response = await process_chat(message, entry.clients)
+    except BaseException as e:
+        idempotency_cache.complete(key, entry, error=e)
+        raise
+    idempotency_cache.complete(key, entry, response)
+    return response
+
+async def process_chat(message: EnhancedMessage, clients: List[Request]):
+    """Answer a /chat message. `clients` are the requests waiting for this answer."""
+    retry_after = rate_limiter.acquire(message.user_id)
+    if retry_after is not None:
+        return rate_limited_response(retry_after)
+    # A new message makes the answer still being generated for the previous one useless
+    active_generations.supersede(message.user_id)
     try:
         data = message.data
         detected_type = None
@@ -265,7 +779,7 @@ async def chat(message: EnhancedMessage):
         # Auto-detect content type
         if data.media and data.media.data:
             media_format = data.media.format.lower()
-            if media_format in ["png", "jpg", "jpeg", "gif", "bmp"]:
+            if media_format in SUPPORTED_IMAGE_FORMATS:
                 detected_type = "image"
             elif media_format in ["mp3", "wav", "ogg", "flac", "m4a"]:
                 detected_type = "audio"
@@ -308,18 +822,7 @@ async def chat(message: EnhancedMessage):
                     response_time = int((time.time() - start_time) * 1000)
 
                     # Store to conversation memory (FIX: was missing!)
-                    conversation_memory[user_id].append({
-                        "role": "user",
-                        "content": user_prompt,
-                        "timestamp": datetime.now()
-                    })
-                    conversation_memory[user_id].append({
-                        "role": "assistant",
-                        "content": response_text,
-                        "timestamp": datetime.now()
-                    })
-                    if len(conversation_memory[user_id]) > 10:
-                        conversation_memory[user_id] = conversation_memory[user_id][-10:]
+                    session_store.add_turn(user_id, user_prompt, response_text)
 
                     # Log to analytics
                     log_conversation(
@@ -347,18 +850,7 @@ async def chat(message: EnhancedMessage):
                     response_text = f"🔧 **Code OBD-II: {obd_code}**\n\nCe code n'est pas dans ma base de données. Je vous recommande de consulter un mécanicien ou d'utiliser KOUNHANY pour trouver un garage audité qui pourra effectuer un diagnostic complet."
 
                     # Store to conversation memory (FIX: was missing!)
-                    conversation_memory[user_id].append({
-                        "role": "user",
-                        "content": user_prompt,
-                        "timestamp": datetime.now()
-                    })
-                    conversation_memory[user_id].append({
-                        "role": "assistant",
-                        "content": response_text,
-                        "timestamp": datetime.now()
-                    })
-                    if len(conversation_memory[user_id]) > 10:
-                        conversation_memory[user_id] = conversation_memory[user_id][-10:]
+                    session_store.add_turn(user_id, user_prompt, response_text)
 
                     log_conversation(
                         user_id=user_id,
@@ -377,6 +869,34 @@ async def chat(message: EnhancedMessage):
                         "timestamp": datetime.utcnow().isoformat()
                     }
 
+            # ========== DETECTED INDICATOR FOLLOW-UPS (knowledge base, no LLM) ==========
+            # Only right after the photo: older detections must not hijack unrelated questions
+            detected_indicators, photo_is_latest = get_last_detected_indicators(user_id)
+            referenced = find_referenced_indicators(user_prompt, detected_indicators) if photo_is_latest else []
+            if referenced:
+                response_text = format_indicator_response(referenced)
+
+                session_store.add_turn(user_id, user_prompt, response_text)
+
+                log_conversation(
+                    user_id=user_id,
+                    user_message=user_prompt,
+                    ai_response=response_text,
+                    response_time_ms=int((time.time() - start_time) * 1000),
+                    detected_intent='indicator'
+                )
+
+                return {
+                    "status": "success",
+                    "code": 200,
+                    "message": "Indicator explained successfully.",
+                    "data": {
+                        "response_text": response_text,
+                        "indicators": referenced
+                    },
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+
             # Check if question is automobile-related or general conversation
             if not is_automobile_related(user_prompt, user_id):
                 return {
@@ -389,6 +909,39 @@ async def chat(message: EnhancedMessage):
                     "timestamp": datetime.utcnow().isoformat()
                 }
 
+            # ========== GREETINGS, THANKS, FAREWELLS (templates, no LLM) ==========
+            detected_intent_type = detect_intent(user_prompt)
+            template_answer = template_response(user_prompt, detected_intent_type)
+            if template_answer:
+                response_text = template_answer
+
+                # Same memory and analytics updates as a generated answer
+                session_store.add_turn(user_id, user_prompt, response_text)
+                session_summarizer.schedule(user_id)
+
+                response_time = int((time.time() - start_time) * 1000)
+                log_conversation(
+                    user_id=user_id,
+                    user_message=user_prompt,
+                    ai_response=response_text,
+                    response_time_ms=response_time,
+                    detected_intent=detected_intent_type
+                )
+                if len(response_text) > 50:
+                    learn_from_conversation(user_prompt, response_text, detected_intent_type)
+
+                return {
+                    "status": "success",
+                    "code": 200,
+                    "message": "Text processed successfully.",
+                    "data": {
+                        "response_text": response_text,
+                        "response_time_ms": response_time,
+                        "web_search_used": False
+                    },
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+
             # ========== NEW FEATURE 2: CHECK LEARNED Q&A ==========
             similar_qa = find_similar_question(user_prompt)
             learned_answer = None
@@ -397,7 +950,7 @@ async def chat(message: EnhancedMessage):
                 learned_answer = similar_qa.get('answer')
 
             # Get conversation history for this user
-            conversation_history = conversation_memory.get(user_id, [])
+            conversation_history = session_store.get_history(user_id)
 
             # Handle "repeat" or "explain again" requests specifically
             repeat_words = ["répète", "repeat", "encore", "redire", "expliquer le", "explique le",
@@ -405,9 +958,9 @@ async def chat(message: EnhancedMessage):
             if any(word in user_prompt.lower() for word in repeat_words):
                 if conversation_history:
                     # Get the last assistant response
-                    last_responses = [msg for msg in conversation_history if msg["role"] == "assistant"]
+                    last_responses = [msg for msg in conversation_history if msg.role == "assistant"]
                     if last_responses:
-                        last_response = last_responses[-1]["content"]
+                        last_response = last_responses[-1].content
                         # If asking to explain, add context
                         if "expliqu" in user_prompt.lower() or "explain" in user_prompt.lower():
                             response_text = f"Voici l'explication de ma dernière réponse:\n\n{last_response}"
@@ -415,16 +968,7 @@ async def chat(message: EnhancedMessage):
                             response_text = last_response
 
                         # Store and return immediately
-                        conversation_memory[user_id].append({
-                            "role": "user",
-                            "content": user_prompt,
-                            "timestamp": datetime.now()
-                        })
-                        conversation_memory[user_id].append({
-                            "role": "assistant",
-                            "content": response_text,
-                            "timestamp": datetime.now()
-                        })
+                        session_store.add_turn(user_id, user_prompt, response_text)
 
                         return {
                             "status": "success",
@@ -438,107 +982,40 @@ async def chat(message: EnhancedMessage):
                 else:
                     response_text = "Je n'ai pas de réponse précédente à répéter."
 
-            # Build context from recent conversation (last 4 exchanges)
-            context_messages = conversation_history[-4:]
-            
-            # Build the prompt with conversation history
-            context_text = ""
-            for msg in context_messages:
-                if msg["role"] == "user":
-                    context_text += f"Utilisateur: {msg['content']}\n"
-                else:
-                    context_text += f"Assistant: {msg['content']}\n"
-
-            # Optimized prompt for Qwen2.5-32B using native chat format
-            system_prompt = """Tu es un assistant automobile français expert et amical pour KOUNHANY.
-
-=== À PROPOS DE KOUNHANY ===
-KOUNHANY est une application marocaine d'après-vente automobile offrant transparence et sécurité.
-
-🚗 3 SERVICES PRINCIPAUX:
-1. Forfaits Réparation (Particuliers) - Forfaits avec garages audités et pièces certifiées
-2. Vente de Pièces Auto (Garagistes) - Pièces certifiées avec livraison
-3. Dépannage & Assistance Routière 24/7 - Géolocalisation en temps réel
-
-🔑 ATOUTS CLÉS:
-• Forfaits intelligents et pièces certifiées
-• Garages audités et notés par clients
-• Carnet d'entretien numérique
-• Assistance routière géolocalisée 24/7
-• Paiement sécurisé via CMI (aucune donnée bancaire stockée)
-
-📱 FONCTIONNALITÉS:
-• Identification véhicule par VIN ou manuellement (Marque > Modèle > Version)
-• Comparatif garages: tarifs, proximité, audits, avis clients
-• Prise de rendez-vous avec choix date/heure
-• Code promo et acompte flexible (30% ou 100%)
-• Suivi commandes dans onglet "Réservations"
+            # Build context from the running summary of older turns and the most recent messages
+            context_messages = conversation_history[-SUMMARY_RECENT_MESSAGES:]
+            summary, _ = session_store.get_summary(user_id)
 
-📧 CONTACT KOUNHANY:
-• Email: contactkounhany@gmail.com
-
-RÈGLES IMPORTANTES:
-- Quand on te pose des questions sur Kounhany, utilise ces informations
-- Réponds de manière concise et claire
-- Si l'utilisateur dit "repeat", "répète" ou "je n'ai pas compris", reformule plus simplement
-- Pour les salutations, réponds brièvement: "Bonjour ! Comment puis-je vous aider ?"
-- Ne jamais inventer de prix ou informations non vérifiées
-- Reste concentré sur l'automobile et Kounhany
-- INTERDIT: Ne JAMAIS inventer de numéros de téléphone, adresses ou coordonnées
-- Si on te demande un numéro de téléphone Kounhany, dis: "Pour le numéro de téléphone, veuillez consulter l'application ou envoyer un email à contactkounhany@gmail.com"
-- Termine toujours tes phrases complètement"""
-
-            # Build Qwen2.5 native chat format
-            messages_formatted = f"<|im_start|>system\n{system_prompt}<|im_end|>\n"
-
-            # Add conversation history
-            for msg in context_messages:
-                if msg["role"] == "user":
-                    messages_formatted += f"<|im_start|>user\n{msg['content']}<|im_end|>\n"
-                else:
-                    messages_formatted += f"<|im_start|>assistant\n{msg['content']}<|im_end|>\n"
-
-            # Add current question
-            messages_formatted += f"<|im_start|>user\n{user_prompt}<|im_end|>\n<|im_start|>assistant\n"
-
-            response = model(
-                messages_formatted,
-                max_tokens=400,  # Increased to avoid truncation
-                temperature=0.3,
-                top_p=0.9,
-                repeat_penalty=1.15,
-                stop=["<|im_end|>", "<|im_start|>", "Utilisateur:", "Assistant:", "\n\nUtilisateur", "\n\nQuestion"]
-            )
-            response_text = response["choices"][0]["text"].strip()
-
-            # Aggressive cleaning of leaked prompts and patterns
-            cleanup_patterns = [
-                "Je n'ai pas compris.",
-                "Je n'ai pas compris",
-                "Utilisateur:",
-                "Assistant:",
-                "Question:",
-                "Réponse:",
-                "<|im_start|>",
-                "<|im_end|>",
-                "RÈGLES",
-                "(Note:",
-                "\n\nUtilisateur",
-                "\n\nAssistant"
-            ]
-
-            for pattern in cleanup_patterns:
-                if pattern in response_text:
-                    response_text = response_text.split(pattern)[0].strip()
-
-            # Ensure response ends with proper punctuation
-            if response_text and not response_text.endswith(('.', '?', '!', ':')):
-                # Try to find the last complete sentence
-                last_period = max(response_text.rfind('.'), response_text.rfind('!'), response_text.rfind('?'))
-                if last_period > len(response_text) * 0.5:  # If we have at least half the response
-                    response_text = response_text[:last_period + 1]
-                else:
-                    response_text = response_text + "."
+            # Serve answers pre-generated off-peak for context-free questions
+            warm_answer = get_warm_answer(user_prompt) if not conversation_history else None
+            if warm_answer:
+                response_text = warm_answer
+            else:
+                # Generations are the expensive part: charged separately, bounded in number per user
+                retry_after = rate_limiter.acquire_generation(user_id)
+                if retry_after is not None:
+                    return rate_limited_response(retry_after)
+                cancel = active_generations.start(user_id)
+                disconnect_watch = asyncio.create_task(watch_disconnect(clients, cancel))
+                try:
+                    # Off the event loop, so that other requests can queue for the scheduler meanwhile
+                    response_text = await run_in_threadpool(
+                        generate_llm_response, user_prompt, context_messages, summary=summary,
+                        lane="follow_up" if conversation_history else "interactive", intent=detected_intent_type,
+                        user_id=user_id, cancel=cancel
+                    )
+                except QueueFull:
+                    # Previous questions of this user are still waiting for the model: nothing was generated
+                    rate_limiter.refund_generation(user_id)
+                    return rate_limited_response(CONCURRENCY_RETRY_AFTER)
+                except GenerationCancelled:
+                    pass
+                finally:
+                    disconnect_watch.cancel()
+                    active_generations.finish(user_id, cancel)
+                    rate_limiter.release_generation(user_id)
+                if cancel.cancelled:
+                    return abandoned_turn_response(user_id, user_prompt, cancel.reason, start_time)
 
             # ========== NEW FEATURE 3: WEB SEARCH (if needed) ==========
             search_intent = detect_search_intent(user_prompt)
@@ -579,25 +1056,12 @@ RÈGLES IMPORTANTES:
                 except Exception as e:
                     print(f"Web search error: {e}")
 
-            # Store conversation in memory
-            conversation_memory[user_id].append({
-                "role": "user",
-                "content": user_prompt,
-                "timestamp": datetime.now()
-            })
-            conversation_memory[user_id].append({
-                "role": "assistant",
-                "content": response_text,
-                "timestamp": datetime.now()
-            })
-
-            # Limit conversation history to last 10 messages per user
-            if len(conversation_memory[user_id]) > 10:
-                conversation_memory[user_id] = conversation_memory[user_id][-10:]
+            # Store conversation in memory (older turns get summarized after the response is sent)
+            session_store.add_turn(user_id, user_prompt, response_text)
+            session_summarizer.schedule(user_id)
 
             # ========== NEW FEATURE 4: LOG TO ANALYTICS ==========
             response_time = int((time.time() - start_time) * 1000)
-            detected_intent_type = detect_intent(user_prompt)
 
             log_conversation(
                 user_id=user_id,
@@ -625,47 +1089,20 @@ RÈGLES IMPORTANTES:
 
         # Handle image - simplified processing
         elif detected_type == "image":
-            # Process image with YOLOv8
-            detection_results = process_image_with_yolov8(data.media.data)
-
-            # Generate simple response
-            response_text = generate_image_response(detection_results)
-
-            # Store image detection in conversation memory so user can ask follow-up questions
-            detected_indicators = detection_results.get("detected_classes", [])
-            if detected_indicators:
-                # Create a summary for memory
-                indicators_list = ", ".join(detected_indicators)
-                memory_text = f"[L'utilisateur a envoyé une photo de tableau de bord. Voyants détectés: {indicators_list}]"
-
-                conversation_memory[user_id].append({
-                    "role": "user",
-                    "content": memory_text,
-                    "timestamp": datetime.now()
-                })
-                conversation_memory[user_id].append({
-                    "role": "assistant",
-                    "content": f"J'ai détecté les voyants suivants sur votre tableau de bord: {indicators_list}. Vous pouvez me demander des explications sur chacun de ces voyants.",
-                    "timestamp": datetime.now()
-                })
-
-                # Limit conversation history
-                if len(conversation_memory[user_id]) > 10:
-                    conversation_memory[user_id] = conversation_memory[user_id][-10:]
-
-            return {
-                "status": "success",
-                "code": 200,
-                "message": "Image processed successfully.",
-                "data": {
-                    "response_text": response_text,
-                    "detection_data": {
-                        "detections": detection_results["detections"],
-                        "total": detection_results["total_detections"]
-                    }
-                },
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            try:
+                image_bytes = decode_base64_image(data.media.data)
+            except ValueError as e:
+                return {
+                    "status": "error",
+                    "code": 400,
+                    "message": str(e),
+                    "data": {},
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            retry_after = rate_limiter.acquire(user_id, "image")
+            if retry_after is not None:
+                return rate_limited_response(retry_after)
+            return await handle_image_message(user_id, [image_bytes])
 
         # Handle audio
         elif detected_type == "audio":
@@ -698,36 +1135,244 @@ RÈGLES IMPORTANTES:
             "timestamp": datetime.utcnow().isoformat()
         }
 
-# Health check endpoint
-@app.get("/health")
-async def health_check():
+@app.post("/chat/image")
+async def chat_image(
+    user_id: str = Form(...),
+    file: List[UploadFile] = File(...)
+):
+    """
+    Multipart image upload: the raw file bytes go straight to the decoder,
+    without the base64/JSON overhead of /chat. Several photos can be sent
+    at once (repeat the `file` field); their detections are merged.
+    """
+    mark_live_activity()
     try:
-        # Test YOLO model
-        test_image = np.random.randint(0, 255, (640, 640, 3), dtype=np.uint8)
-        results = yolo_model(test_image)
-        
+        images = [await upload.read() for upload in file]
+        images = [image_bytes for image_bytes in images if image_bytes]
+        if not images:
+            return {
+                "status": "error",
+                "code": 400,
+                "message": "Empty image upload.",
+                "data": {},
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        retry_after = rate_limiter.acquire(user_id, "image", count=len(images))
+        if retry_after is not None:
+            return rate_limited_response(retry_after)
+        return await handle_image_message(user_id, images)
+    except Exception as e:
         return {
-            "status": "healthy",
-            "yolo_model_loaded": True,
-            "yolo_classes": len(yolo_model.names),
-            "llama_model_loaded": True,
-            "conversation_memory_users": len(conversation_memory),
+            "status": "error",
+            "code": 500,
+            "message": str(e),
+            "data": {},
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+def generate_video_response(indicators: List[dict], stats: dict) -> str:
+    """French summary of a dashboard clip: lights still on at the end vs. lights that went out."""
+    footer = f"🎞️ *{stats['frames_analyzed']} images analysées sur {stats['frames_examined']} examinées ({stats['duration_seconds']:.0f} s de vidéo).*"
+    if not indicators:
+        return "🔍 Aucun indicateur détecté dans la vidéo. Filmez le tableau de bord de près, contact mis.\n\n" + footer
+
+    still_on = [entry for entry in indicators if entry["still_on"]]
+    went_out = [entry for entry in indicators if not entry["still_on"]]
+
+    response_parts = []
+    if still_on:
+        response_parts.append("🚨 **VOYANTS RESTÉS ALLUMÉS:**")
+        for entry in still_on:
+            response_parts.append(f"• {entry['class']} ({entry['max_confidence']:.1%}, allumé {entry['presence']:.0%} du temps)")
+            info = indicator_index.get(entry["class"])
+            if info:
+                response_parts.append(f"  {format_indicator_line(entry['class'], info)}")
+    else:
+        response_parts.append("✅ **Aucun voyant ne reste allumé à la fin de la vidéo.**")
+
+    if went_out:
+        response_parts.append("")
+        response_parts.append("💡 Voyants éteints après l'allumage (auto-test normal au démarrage): " + ", ".join(entry["class"] for entry in went_out))
+
+    response_parts.append("")
+    response_parts.append(footer)
+    return "\n".join(response_parts)
+
+async def handle_video_message(user_id: str, frames: list, stats: dict) -> dict:
+    """Detect on the sampled frames (one batched pass), aggregate over time and build the reply."""
+    results = await asyncio.gather(*(vision_batcher.detect(frame) for _, frame in frames))
+    timeline = [(timestamp, parse_yolo_result(result, frame.shape)) for (timestamp, frame), result in zip(frames, results)]
+    indicators = aggregate_timeline(timeline, stats["duration_seconds"])
+
+    response_text = generate_video_response(indicators, stats)
+
+    # Follow-up questions are about the lights that stayed on
+    still_on = [entry["class"] for entry in indicators if entry["still_on"]]
+    if still_on:
+        indicators_list = ", ".join(still_on)
+        memory_text = f"[L'utilisateur a envoyé une vidéo du tableau de bord. Voyants restés allumés: {indicators_list}]"
+        assistant_text = f"Les voyants suivants restent allumés sur votre tableau de bord: {indicators_list}. Vous pouvez me demander des explications sur chacun de ces voyants."
+        session_store.add_turn(user_id, memory_text, assistant_text, indicators=still_on)
+        session_summarizer.schedule(user_id)
+
+    return {
+        "status": "success",
+        "code": 200,
+        "message": "Video processed successfully.",
+        "data": {
+            "response_text": response_text,
+            "video_data": {
+                "indicators": indicators,
+                **stats
+            }
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.post("/chat/video")
+async def chat_video(
+    user_id: str = Form(...),
+    file: List[UploadFile] = File(...)
+):
+    """
+    Dashboard video (e.g. filmed at ignition) or a burst of photos in order.
+    Near-identical frames are skipped; the detections of the remaining frames
+    are aggregated over time into one answer.
+    """
+    mark_live_activity()
+    try:
+        # Read at most VIDEO_MAX_UPLOAD_MB in total: bigger uploads are refused without buffering them
+        budget = int(VIDEO_MAX_UPLOAD_MB * 1024 * 1024)
+        uploads = []
+        for upload in file:
+            data = await upload.read(budget + 1)
+            budget -= len(data)
+            if budget < 0:
+                raise ValueError(f"Video upload too large (max {VIDEO_MAX_UPLOAD_MB:.0f} MB)")
+            uploads.append((upload.filename or "", data))
+        uploads = [(filename, data) for filename, data in uploads if data]
+        if not uploads:
+            return {
+                "status": "error",
+                "code": 400,
+                "message": "Empty video upload.",
+                "data": {},
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        retry_after = rate_limiter.acquire(user_id, "video")
+        if retry_after is not None:
+            return rate_limited_response(retry_after)
+
+        extension = uploads[0][0].rsplit(".", 1)[-1].lower() if "." in uploads[0][0] else ""
+        if len(uploads) == 1 and extension in SUPPORTED_VIDEO_FORMATS:
+            frames, stats = await run_in_threadpool(sample_video_bytes, uploads[0][1], extension)
+        else:
+            frames, stats = await run_in_threadpool(sample_image_sequence, [data for _, data in uploads])
+
+        return await handle_video_message(user_id, frames, stats)
+    except ValueError as e:
+        return {
+            "status": "error",
+            "code": 400,
+            "message": str(e),
+            "data": {},
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
         return {
-            "status": "unhealthy",
-            "yolo_model_loaded": False,
-            "llama_model_loaded": True,
-            "error": str(e),
+            "status": "error",
+            "code": 500,
+            "message": str(e),
+            "data": {},
             "timestamp": datetime.utcnow().isoformat()
         }
 
+# Health check endpoint
+def get_readiness_report() -> dict:
+    """Cached model self-tests plus queue depths and last inference latencies (no inference here)."""
+    readiness = health_monitor.get_readiness()
+    vision_stats = vision_batcher.get_stats()
+    with llm_stats_lock:
+        llm = dict(llm_stats)
+    readiness["models"] = {
+        "vision": {
+            **readiness["checks"].get("vision", {}),
+            "backend": yolo_model.backend,
+            "classes": len(yolo_model.names),
+            "queue_depth": vision_stats["queue_depth"],
+            "last_batch_ms": vision_stats["last_batch_ms"]
+        },
+        "llm": {
+            **readiness["checks"].get("llm", {}),
+            "busy": llm_scheduler.busy,
+            "queue_depth": llm["waiting"],
+            "last_generation_ms": llm["last_generation_ms"]
+        }
+    }
+    del readiness["checks"]
+    return readiness
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and the event loop responds."""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready to serve traffic: answered from the cached background self-tests, 503 otherwise."""
+    report = get_readiness_report()
+    report["status"] = "ready" if report["ready"] else "not_ready"
+    report["timestamp"] = datetime.utcnow().isoformat()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/health")
+async def health_check():
+    report = get_readiness_report()
+    return {
+        "status": "healthy" if report["ready"] else "unhealthy",
+        "yolo_model_loaded": report["models"]["vision"]["ok"],
+        "yolo_classes": len(yolo_model.names),
+        "vision_backend": yolo_model.backend,
+        "llama_model_loaded": report["models"]["llm"]["ok"],
+        "conversation_memory_users": session_store.get_stats()["sessions"],
+        "models": report["models"],
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/detections/{detection_id}/image")
+async def get_annotated_image(detection_id: str, image_format: str = Query("jpeg", alias="format")):
+    """
+    Annotated image of a detection (boxes colored by severity), rendered on first
+    request and cached. `format`: jpeg or webp.
+    """
+    if image_format not in ANNOTATION_FORMATS:
+        return JSONResponse(status_code=400, content={
+            "status": "error",
+            "code": 400,
+            "message": f"Unsupported image format: {image_format}. Use one of {list(ANNOTATION_FORMATS)}.",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    image = await run_in_threadpool(annotated_images.render, detection_id, image_format)
+    if image is None:
+        return JSONResponse(status_code=404, content={
+            "status": "not_found",
+            "code": 404,
+            "message": "Detection not found or expired. Send the photo again.",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    # The id is the content hash of the photo: the rendering never changes
+    return Response(
+        content=image,
+        media_type=ANNOTATION_FORMATS[image_format][1],
+        headers={"Cache-Control": "private, max-age=86400, immutable"}
+    )
+
 # Clear conversation endpoint
 @app.delete("/conversation/{user_id}")
 async def clear_conversation(user_id: str):
-    if user_id in conversation_memory:
-        del conversation_memory[user_id]
+    session_store.clear(user_id)
     return {"status": "success", "message": f"Conversation cleared for user {user_id}"}
 
 # --- HTML test page ---
@@ -771,6 +1416,67 @@ async def get_top_questions_endpoint(limit: int = 20):
             "timestamp": datetime.utcnow().isoformat()
         }
 
+@app.get("/analytics/export")
+async def export_conversations_endpoint(
+    request: Request,
+    export_format: str = Query("ndjson", alias="format"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    intent: Optional[str] = None,
+    user_id: Optional[str] = None,
+    compression: str = "auto"
+):
+    """
+    Stream conversations (hot DB + archives) as NDJSON or CSV.
+    Compression: "auto" gzips when the client sends Accept-Encoding: gzip, or force "gzip" / "none".
+    """
+    if export_format not in EXPORT_FORMATS:
+        return {
+            "status": "error",
+            "message": f"Unsupported export format: {export_format}. Use one of {EXPORT_FORMATS}",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    if compression == "auto":
+        use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    else:
+        use_gzip = compression == "gzip"
+
+    headers = {"Content-Disposition": f'attachment; filename="conversations.{export_format}"'}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    # Sync generator: Starlette pulls chunks from a threadpool, memory stays constant
+    return StreamingResponse(
+        export_conversations(export_format, use_gzip, start=start, end=end, intent=intent, user_id=user_id),
+        media_type="text/csv" if export_format == "csv" else "application/x-ndjson",
+        headers=headers
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get runtime metrics (caches, background jobs)."""
+    return {
+        "status": "success",
+        "data": {
+            "warm_cache": get_warm_cache_stats(),
+            "vision_batching": vision_batcher.get_stats(),
+            "detection_cache": detection_cache.get_stats(),
+            "annotated_images": annotated_images.get_stats(),
+            "sessions": session_store.get_stats(),
+            "session_summaries": session_summarizer.get_stats(),
+            "rate_limits": rate_limiter.get_stats(),
+            "llm_scheduler": {
+                **llm_scheduler.get_stats(),
+                "expected_output_tokens": output_predictor.get_stats(),
+                "active_generations": len(active_generations)
+            },
+            "idempotency": idempotency_cache.get_stats(),
+            "model_router": model_router.get_stats()
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 @app.get("/obd/{code}")
 async def lookup_obd_code(code: str):
     """Look up an OBD-II code."""
@@ -793,6 +1499,27 @@ async def lookup_obd_code(code: str):
             "timestamp": datetime.utcnow().isoformat()
         }
 
+@app.get("/indicators/{class_name}")
+async def lookup_indicator(class_name: str):
+    """Look up a dashboard indicator by detector class name."""
+    info = get_indicator_info(class_name)
+
+    if info:
+        return {
+            "status": "success",
+            "indicator": class_name,
+            "data": info,
+            "formatted_response": format_indicator_response([class_name]),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    else:
+        return {
+            "status": "not_found",
+            "indicator": class_name,
+            "message": f"Indicator {class_name} not found in knowledge base",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
 @app.get("/obd/search/{query}")
 async def search_obd_codes_endpoint(query: str):
     """Search OBD codes by keyword."""
@@ -0,0 +1,130 @@
+# benchmark_detectors.py - CPU Benchmark of the Indicator Detector Backends
+# Compares ultralytics/torch and ONNX Runtime on CPU: single-image latency,
+# batched throughput and agreement of the detected classes. With --workers,
+# also measures how throughput scales with the detector process pool.
+#
+# Usage:
+#   python detectors.py                       # export best.pt -> best.onnx once
+#   python benchmark_detectors.py --images ./dashboard_photos --batch 8
+#   python benchmark_detectors.py --backend onnx --workers 1 2 4 8
+
+import argparse
+import glob
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import cv2
+import numpy as np
+
+from detectors import (
+    ONNX_MODEL_PATH, YOLO_WEIGHTS_PATH, OnnxDetector, UltralyticsDetector
+)
+from vision import decode_image
+from vision_pool import VisionProcessPool
+
+def load_images(directory: str, count: int) -> List[np.ndarray]:
+    """Load dashboard photos from a directory, or generate synthetic 1280x960 frames."""
+    images = []
+    if directory:
+        for path in sorted(glob.glob(os.path.join(directory, "*")))[:count]:
+            with open(path, "rb") as f:
+                try:
+                    images.append(decode_image(f.read()))
+                except Exception:
+                    continue
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (960, 1280, 3), dtype=np.uint8) for _ in range(count)]
+    return images
+
+def benchmark(detector, images: List[np.ndarray], runs: int, batch_size: int) -> dict:
+    """Latency (batch of 1) and throughput (batches of batch_size) of a detector."""
+    # Warm-up (graph optimization, memory allocation)
+    for _ in range(3):
+        detector.detect_batch(images[:1])
+
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        detector.detect_batch([images[i % len(images)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    processed = 0
+    start = time.perf_counter()
+    for i in range(runs):
+        offset = (i * batch_size) % len(images)
+        batch = (images[offset:] + images[:offset])[:batch_size]
+        detector.detect_batch(batch)
+        processed += len(batch)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "throughput_img_s": round(processed / elapsed, 1)
+    }
+
+def pool_throughput(workers: int, backend: str, images: List[np.ndarray], runs: int, batch_size: int) -> float:
+    """Images/s of a detector process pool kept busy with one batch in flight per worker."""
+    pool = VisionProcessPool(workers, backend)
+    try:
+        batches = [(images * batch_size)[i * batch_size % len(images):][:batch_size] for i in range(runs)]
+        with ThreadPoolExecutor(max_workers=workers) as dispatch:
+            list(dispatch.map(pool.detect_batch, batches[:workers]))  # warm-up
+            start = time.perf_counter()
+            processed = sum(len(results) for results in dispatch.map(pool.detect_batch, batches))
+        return round(processed / (time.perf_counter() - start), 1)
+    finally:
+        pool.shutdown()
+
+def class_agreement(a, b, images: List[np.ndarray], min_conf: float = 0.3) -> float:
+    """Share of images where both backends report the same set of classes above min_conf."""
+    same = 0
+    for ra, rb in zip(a.detect_batch(images), b.detect_batch(images)):
+        classes_a = set(ra.class_ids[ra.scores > min_conf].tolist())
+        classes_b = set(rb.class_ids[rb.scores > min_conf].tolist())
+        same += classes_a == classes_b
+    return round(same / len(images), 3)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark torch vs ONNX Runtime detector backends on CPU")
+    parser.add_argument("--weights", default=YOLO_WEIGHTS_PATH)
+    parser.add_argument("--onnx", default=ONNX_MODEL_PATH)
+    parser.add_argument("--images", help="Directory of dashboard photos (synthetic frames if omitted)")
+    parser.add_argument("--count", type=int, default=32, help="Number of images to load")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads for both backends (0 = default)")
+    parser.add_argument("--workers", type=int, nargs="*", help="Also benchmark the process pool with these worker counts")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="onnx", help="Backend of the pool workers")
+    args = parser.parse_args()
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+        import torch
+        torch.set_num_threads(args.threads)
+
+    images = load_images(args.images, args.count)
+    detectors = {
+        "torch (cpu)": UltralyticsDetector(args.weights, device="cpu"),
+        "onnxruntime (cpu)": OnnxDetector(args.onnx, num_threads=args.threads)
+    }
+
+    print(f"{len(images)} images, {args.runs} runs, batch size {args.batch}\n")
+    print(f"{'backend':<20}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>10}")
+    for name, detector in detectors.items():
+        result = benchmark(detector, images, args.runs, args.batch)
+        print(f"{name:<20}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['throughput_img_s']:>10}")
+
+    agreement = class_agreement(detectors["torch (cpu)"], detectors["onnxruntime (cpu)"], images)
+    print(f"\nSame detected classes on {agreement:.1%} of the images")
+
+    if args.workers:
+        print(f"\nProcess pool ({args.backend}, batch size {args.batch})")
+        print(f"{'workers':<20}{'img/s':>10}")
+        for workers in args.workers:
+            print(f"{workers:<20}{pool_throughput(workers, args.backend, images, args.runs, args.batch):>10}")
@@ -0,0 +1,134 @@
+# benchmark_router.py - Fake-backend Benchmark of the Model Cascade
+# Replays a mix of chat turns from concurrent clients against simulated small and
+# large models (sleeping for prompt evaluation + per-token decoding time) and
+# compares "32B only" with the cascade: mean/p95 latency per turn and turns/s on
+# one GPU. As in the server, both models take turns in one LLMScheduler, so queueing
+# behind the other model is part of the latency. Routing uses the real
+# router.route / router.check_output, only the models are fake.
+#
+# Usage:
+#   python benchmark_router.py
+#   python benchmark_router.py --turns 400 --clients 8 --small-failure 0.2 --scale 0.05
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from router import SMALL_MODEL_COST_RATIO, ModelRouter
+from scheduler import LLMScheduler
+
+# (message, intent, output tokens of a typical answer)
+WORKLOAD = [
+    ("Bonjour", "greeting", 15),
+    ("salut, ça va ?", "greeting", 20),
+    ("Comment réserver un garage sur Kounhany ?", "kounhany", 90),
+    ("Quels sont les forfaits Kounhany ?", "kounhany", 110),
+    ("C'est quoi une vidange ?", "technical", 180),
+    ("Ok merci, et ça coûte cher ?", "general", 60),
+    ("Tu peux préciser ?", "general", 80),
+    ("Quelle huile pour une Dacia Logan 1.5 dCi ?", "technical", 220),
+    ("Pourquoi ma voiture vibre au freinage à haute vitesse et fait un bruit métallique ?", "technical", 320),
+    ("J'ai le code P0300 qui s'affiche, que faire ?", "obd_code", 260),
+    ("Quelle est la différence entre un moteur diesel et essence pour l'entretien ?", "general", 300),
+    ("Les voitures électriques c'est fiable ?", "general", 150),
+]
+
+class FakeModel:
+    """Sleeps like a llama.cpp model: prompt evaluation, then a fixed time per generated token."""
+
+    def __init__(self, prompt_ms: float, token_ms: float, max_tokens: int, scheduler: LLMScheduler,
+                 cost_ratio: float = 1.0, failure_rate: float = 0.0, scale: float = 1.0, seed: int = 0):
+        self.prompt_ms = prompt_ms
+        self.token_ms = token_ms
+        self.max_tokens = max_tokens
+        self.scheduler = scheduler
+        self.cost_ratio = cost_ratio
+        self.failure_rate = failure_rate
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def generate(self, output_tokens: int, user_id: str) -> Tuple[str, Optional[str]]:
+        tokens = min(output_tokens, self.max_tokens)
+        # The GPU is shared: wait for the scheduler like run_llm / run_small_llm
+        with self.scheduler.slot("interactive", tokens * self.cost_ratio, user_id):
+            time.sleep((self.prompt_ms + tokens * self.token_ms) * self.scale / 1000)
+        with self.rng_lock:
+            failed = self.rng.random() < self.failure_rate
+        if tokens < output_tokens or failed:
+            return "Réponse incomplète", "length"
+        return "Voici une réponse complète et utile pour votre question.", "stop"
+
+def run(turns: List[tuple], clients: int, router: ModelRouter, small: FakeModel, large: FakeModel) -> dict:
+    latencies = []
+    lock = threading.Lock()
+    pending = list(reversed(turns))
+
+    def client(user_id: str):
+        # Each client sends its next turn once the previous one is answered
+        while True:
+            with lock:
+                if not pending:
+                    return
+                text, intent, output_tokens = pending.pop()
+            turn_start = time.perf_counter()
+            router.generate(
+                text, intent, 0,
+                run_small=lambda: small.generate(output_tokens, user_id),
+                run_large=lambda: large.generate(output_tokens, user_id)[0]
+            )
+            with lock:
+                latencies.append((time.perf_counter() - turn_start) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(f"client-{i}",)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mean_ms": round(statistics.mean(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "turns_s": round(len(turns) / elapsed, 2)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the small/large model cascade with simulated models")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients sharing the GPU")
+    parser.add_argument("--large-token-ms", type=float, default=33.0, help="Decoding time per token of the 32B")
+    parser.add_argument("--large-prompt-ms", type=float, default=150.0)
+    parser.add_argument("--small-token-ms", type=float, default=6.0, help="Decoding time per token of the small model")
+    parser.add_argument("--small-prompt-ms", type=float, default=20.0)
+    parser.add_argument("--small-failure", type=float, default=0.1, help="Share of small answers failing the checks")
+    parser.add_argument("--scale", type=float, default=0.02, help="Multiply simulated times (keeps the run short)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    turns = [rng.choice(WORKLOAD) for _ in range(args.turns)]
+    results = {}
+    for name, enabled in [("32B only", False), ("cascade", True)]:
+        scheduler = LLMScheduler()
+        router = ModelRouter(enabled=enabled)
+        large = FakeModel(args.large_prompt_ms, args.large_token_ms, 400, scheduler, scale=args.scale)
+        small = FakeModel(args.small_prompt_ms, args.small_token_ms, 200, scheduler, SMALL_MODEL_COST_RATIO,
+                          args.small_failure, args.scale, seed=1)
+        results[name] = (run(turns, args.clients, router, small, large), router.get_stats())
+
+    print(f"{args.turns} turns from {args.clients} clients on one GPU, simulated times x{args.scale} "
+          f"(latencies below are rescaled to real time)\n")
+    print(f"{'':<12}{'mean ms':>10}{'p95 ms':>10}{'turns/s':>10}")
+    for name, (result, _) in results.items():
+        print(f"{name:<12}{result['mean_ms'] / args.scale:>10.0f}{result['p95_ms'] / args.scale:>10.0f}"
+              f"{result['turns_s'] * args.scale:>10.2f}")
+
+    stats = results["cascade"][1]
+    small_turns = sum(count for decision, count in stats["decisions"].items() if decision.startswith("small:"))
+    print(f"\nCascade: {small_turns}/{args.turns} turns routed to the small model, "
+          f"escalation rate {stats['escalation_rate']:.1%} {stats['escalations']}")
@@ -0,0 +1,120 @@
+# detection_cache.py - Detection Result Cache for Kounhany AI
+# Users often resend the same dashboard photo (or a near-identical shot) with a
+# follow-up question. Results are cached by exact content hash, with an optional
+# perceptual hash (dHash) lookup for near-duplicates. LRU + TTL eviction.
+
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+DETECTION_CACHE_SIZE = int(os.environ.get("DETECTION_CACHE_SIZE", "512"))
+DETECTION_CACHE_TTL = int(os.environ.get("DETECTION_CACHE_TTL", "3600"))  # seconds
+# Max Hamming distance between 256-bit dHashes to reuse a result (0 disables near-duplicate lookup)
+DETECTION_PHASH_DISTANCE = int(os.environ.get("DETECTION_PHASH_DISTANCE", "8"))
+
+PHASH_SIZE = 16  # 16x16 gradient bits = 256-bit hash
+
+def content_hash(image_bytes: bytes) -> str:
+    """Exact cache key of an encoded image."""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """
+    Difference hash (dHash) of a BGR image: robust to re-encoding, resizing and
+    small exposure changes, sensitive to structural changes.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (PHASH_SIZE + 1, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+class DetectionCache:
+    """LRU + TTL cache of detection results keyed by content hash, with dHash near-duplicate lookup."""
+
+    def __init__(
+        self,
+        max_entries: int = DETECTION_CACHE_SIZE,
+        ttl_seconds: int = DETECTION_CACHE_TTL,
+        phash_max_distance: int = DETECTION_PHASH_DISTANCE
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.phash_max_distance = phash_max_distance
+        # content hash -> (result, phash, expires_at, inference_ms)
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "time_saved_ms": 0.0}
+
+    def _hit(self, key: str, kind: str) -> Dict:
+        result, _, _, inference_ms = self.entries[key]
+        self.entries.move_to_end(key)
+        self.stats[kind] += 1
+        self.stats["time_saved_ms"] += inference_ms
+        return copy.deepcopy(result)
+
+    def get_exact(self, key: str) -> Optional[Dict]:
+        """Cached result for exactly the same image bytes."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self.entries[key]
+                return None
+            return self._hit(key, "exact_hits")
+
+    def get_similar(self, phash: Optional[int]) -> Optional[Dict]:
+        """
+        Cached result of a near-identical image (closest dHash within the distance limit).
+        Called after a get_exact() miss: a miss here counts as a cache miss.
+        """
+        with self.lock:
+            if phash is None or not self.phash_max_distance:
+                self.stats["misses"] += 1
+                return None
+
+            now = time.time()
+            best_key, best_distance = None, self.phash_max_distance + 1
+            for key, (_, other, expires_at, _) in list(self.entries.items()):
+                if expires_at < now:
+                    del self.entries[key]
+                    continue
+                if other is None:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+            return self._hit(best_key, "similar_hits")
+
+    def put(self, key: str, phash: Optional[int], result: Dict, inference_ms: float):
+        """Store a detection result, evicting the least recently used entries."""
+        with self.lock:
+            self.entries[key] = (copy.deepcopy(result), phash, time.time() + self.ttl_seconds, inference_ms)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Size, hit rate and inference time saved."""
+        with self.lock:
+            lookups = self.stats["exact_hits"] + self.stats["similar_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+            return {
+                "size": len(self.entries),
+                "exact_hits": self.stats["exact_hits"],
+                "similar_hits": self.stats["similar_hits"],
+                "misses": self.stats["misses"],
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "time_saved_ms": round(self.stats["time_saved_ms"], 1)
+            }
@@ -0,0 +1,230 @@
+# detectors.py - Dashboard Indicator Detector Backends for Kounhany AI
+# Two interchangeable backends with the same output:
+#   - "torch": ultralytics YOLOv8 (.pt), GPU when available
+#   - "onnx":  ONNX Runtime on CPU with vectorized NumPy pre/post-processing,
+#              no torch/ultralytics import, leaves the GPU to llama.cpp
+
+import argparse
+import ast
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+VISION_BACKEND = os.environ.get("VISION_BACKEND", "torch")  # "torch" or "onnx"
+YOLO_WEIGHTS_PATH = os.environ.get("YOLO_MODEL", "/workspace/ai/best.pt")
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "/workspace/ai/best.onnx")
+ONNX_NUM_THREADS = int(os.environ.get("ONNX_NUM_THREADS", "0"))  # 0 = ONNX Runtime default
+
+# Same defaults as ultralytics predict()
+DEFAULT_CONF_THRESHOLD = 0.25
+DEFAULT_IOU_THRESHOLD = 0.7
+DEFAULT_MAX_DETECTIONS = 300
+
+LETTERBOX_COLOR = 114
+
+class RawDetections(NamedTuple):
+    """Detections of one image, sorted by descending score. Boxes are xyxy in image pixels."""
+    boxes: np.ndarray      # (N, 4) float32
+    scores: np.ndarray     # (N,) float32
+    class_ids: np.ndarray  # (N,) int
+
+EMPTY_DETECTIONS = RawDetections(
+    np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int)
+)
+
+# ========== PRE/POST-PROCESSING (NumPy) ==========
+def letterbox(image: np.ndarray, size: int = 640):
+    """
+    Resize keeping the aspect ratio and pad to size x size.
+    Returns the padded image, the scale and the (left, top) padding.
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    left = (size - new_w) // 2
+    top = (size - new_h) // 2
+    padded = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    padded[top:top + new_h, left:left + new_w] = image
+    return padded, scale, (left, top)
+
+def preprocess_batch(images: List[np.ndarray], size: int = 640):
+    """Letterbox BGR images into one NCHW float32 RGB tensor in [0, 1]."""
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    transforms = []
+    for i, image in enumerate(images):
+        padded, scale, pad = letterbox(image, size)
+        # BGR -> RGB and HWC -> CHW in a single strided copy
+        batch[i] = padded[:, :, ::-1].transpose(2, 0, 1)
+        transforms.append((scale, pad, image.shape[:2]))
+    batch *= 1.0 / 255.0
+    return batch, transforms
+
+def box_iou_one_to_many(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one xyxy box against an (N, 4) array."""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / (area + areas - intersection + 1e-7)
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, max_det: int) -> np.ndarray:
+    """Greedy NMS, returns kept indices sorted by descending score."""
+    order = np.argsort(-scores)
+    keep = []
+    while order.size and len(keep) < max_det:
+        best = order[0]
+        keep.append(best)
+        if order.size == 1:
+            break
+        ious = box_iou_one_to_many(boxes[best], boxes[order[1:]])
+        order = order[1:][ious <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+def postprocess_yolov8(
+    output: np.ndarray,
+    transforms: list,
+    conf_threshold: float = DEFAULT_CONF_THRESHOLD,
+    iou_threshold: float = DEFAULT_IOU_THRESHOLD,
+    max_det: int = DEFAULT_MAX_DETECTIONS
+) -> List[RawDetections]:
+    """
+    Decode the raw YOLOv8 head output (N, 4 + num_classes, anchors) into per-image detections
+    in original image coordinates. Class-aware NMS as in ultralytics.
+    """
+    predictions = output.transpose(0, 2, 1)  # (N, anchors, 4 + nc)
+    results = []
+
+    for prediction, (scale, (left, top), (height, width)) in zip(predictions, transforms):
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        # Confidence filter before any box math
+        mask = scores > conf_threshold
+        if not mask.any():
+            results.append(EMPTY_DETECTIONS)
+            continue
+        boxes_cxcywh, scores, class_ids = prediction[mask, :4], scores[mask], class_ids[mask]
+
+        boxes = np.empty_like(boxes_cxcywh)
+        boxes[:, :2] = boxes_cxcywh[:, :2] - boxes_cxcywh[:, 2:] / 2
+        boxes[:, 2:] = boxes_cxcywh[:, :2] + boxes_cxcywh[:, 2:] / 2
+
+        # Offset boxes per class so a single NMS pass never suppresses across classes
+        offsets = class_ids[:, None].astype(np.float32) * 4096.0
+        keep = non_max_suppression(boxes + offsets, scores, iou_threshold, max_det)
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo the letterbox
+        boxes -= np.array([left, top, left, top], dtype=np.float32)
+        boxes /= scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        results.append(RawDetections(boxes.astype(np.float32), scores.astype(np.float32), class_ids.astype(int)))
+
+    return results
+
+# ========== BACKENDS ==========
+class UltralyticsDetector:
+    """YOLOv8 through ultralytics/torch (the original inference path)."""
+
+    backend = "torch"
+
+    def __init__(self, weights_path: str = YOLO_WEIGHTS_PATH, device: Optional[str] = None):
+        from ultralytics import YOLO
+        self.model = YOLO(weights_path)
+        self.names: Dict[int, str] = self.model.names
+        self.device = device  # None = ultralytics default (GPU when available)
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[RawDetections]:
+        results = []
+        for result in self.model(images, device=self.device, verbose=False):
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                results.append(EMPTY_DETECTIONS)
+                continue
+            # One device->host copy per result instead of one per box
+            results.append(RawDetections(
+                boxes.xyxy.cpu().numpy().astype(np.float32),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(int)
+            ))
+        return results
+
+class OnnxDetector:
+    """YOLOv8 exported to ONNX, run with ONNX Runtime on CPU."""
+
+    backend = "onnx"
+
+    def __init__(
+        self,
+        model_path: str = ONNX_MODEL_PATH,
+        conf_threshold: float = DEFAULT_CONF_THRESHOLD,
+        iou_threshold: float = DEFAULT_IOU_THRESHOLD,
+        num_threads: int = ONNX_NUM_THREADS
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        # Exported with dynamic=True the batch dimension is symbolic
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+        # ultralytics stores the class names in the ONNX metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = parse_names_metadata(metadata.get("names", "{}"))
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[RawDetections]:
+        batch, transforms = preprocess_batch(images, self.input_size)
+        if self.dynamic_batch:
+            output = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            output = np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(len(images))
+            ])
+        return postprocess_yolov8(output, transforms, self.conf_threshold, self.iou_threshold)
+
+def parse_names_metadata(raw: str) -> Dict[int, str]:
+    """Parse the ultralytics `names` metadata (a Python dict literal)."""
+    try:
+        return {int(k): v for k, v in ast.literal_eval(raw).items()}
+    except (ValueError, SyntaxError, AttributeError):
+        return {}
+
+def export_onnx(weights_path: str = YOLO_WEIGHTS_PATH, imgsz: int = 640) -> str:
+    """Export the YOLOv8 weights to ONNX (dynamic batch). Returns the path of the .onnx file."""
+    from ultralytics import YOLO
+    return YOLO(weights_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+
+def load_detector(backend: str = VISION_BACKEND):
+    """Instantiate the configured detector backend."""
+    if backend == "onnx":
+        return OnnxDetector()
+    if backend == "torch":
+        return UltralyticsDetector()
+    raise ValueError(f"Unknown vision backend: {backend}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the indicator detector to ONNX")
+    parser.add_argument("--weights", default=YOLO_WEIGHTS_PATH)
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args()
+    print(f"✅ Exported to {export_onnx(args.weights, args.imgsz)}")
@@ -0,0 +1,136 @@
+# export.py - Streaming Conversation Export for Kounhany AI
+# Streams conversations (hot DB + archive partitions) as NDJSON or CSV with
+# constant memory: rows are pulled from SQLite cursors in small batches
+
+import argparse
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, Dict
+
+from analytics import get_conversation_tiers
+
+EXPORT_COLUMNS = [
+    'id', 'user_id', 'timestamp', 'user_message', 'ai_response', 'response_time_ms',
+    'content_type', 'detected_intent', 'obd_code_detected', 'was_helpful', 'feedback', 'status'
+]
+EXPORT_FORMATS = ['ndjson', 'csv']
+FETCH_BATCH_SIZE = 500
+
+def _end_bound(end: str) -> str:
+    """Exclusive upper bound: a plain date includes the whole day."""
+    if len(end) == 10:
+        return (datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return end
+
+def iter_conversations(
+    start: str = None,
+    end: str = None,
+    intent: str = None,
+    user_id: str = None
+) -> Iterator[Dict]:
+    """
+    Yield conversations matching the filters, oldest first, across all storage tiers.
+    `start` / `end` are 'YYYY-MM-DD' dates (or full timestamps).
+    """
+    conditions, params = [], []
+    if start:
+        conditions.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        conditions.append('timestamp < ?')
+        params.append(_end_bound(end))
+    if intent:
+        conditions.append('detected_intent = ?')
+        params.append(intent)
+    if user_id:
+        conditions.append('user_id = ?')
+        params.append(user_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # Connections are used from whichever thread pulls the next chunk
+    for conn in get_conversation_tiers(start, end, oldest_first=True, check_same_thread=False):
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(EXPORT_COLUMNS)}
+            FROM conversation_messages
+            {where}
+            ORDER BY id
+        ''', params)
+
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+def iter_ndjson(rows: Iterator[Dict]) -> Iterator[bytes]:
+    """Encode rows as newline-delimited JSON, one chunk per batch of rows."""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, ensure_ascii=False, default=str))
+        if len(buffer) >= FETCH_BATCH_SIZE:
+            yield ('\n'.join(buffer) + '\n').encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode('utf-8')
+
+def iter_csv(rows: Iterator[Dict]) -> Iterator[bytes]:
+    """Encode rows as CSV with a header line, one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % FETCH_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def iter_gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream on the fly into gzip format."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_conversations(
+    export_format: str = 'ndjson',
+    compress: bool = False,
+    **filters
+) -> Iterator[bytes]:
+    """Stream an export of the conversations as bytes chunks."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    rows = iter_conversations(**filters)
+    chunks = iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
+    return iter_gzip(chunks) if compress else chunks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export conversations as NDJSON or CSV")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--start", help="First day included (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day included (YYYY-MM-DD)")
+    parser.add_argument("--intent", help="Only this detected intent")
+    parser.add_argument("--user-id", help="Only this user")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    args = parser.parse_args()
+
+    with open(args.output, 'wb') as output:
+        for chunk in export_conversations(
+            args.format, args.gzip,
+            start=args.start, end=args.end, intent=args.intent, user_id=args.user_id
+        ):
+            output.write(chunk)
+    print(f"✅ Export written to {args.output}")
@@ -0,0 +1,92 @@
+# health.py - Liveness and Readiness Probes for Kounhany AI
+# Orchestrator polls must never run inference themselves. A background self-test
+# exercises each model every HEALTH_CHECK_INTERVAL seconds through the same paths
+# as live traffic, and readiness answers from the cached results.
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "30"))  # seconds between self-tests
+# A self-test older than this many intervals no longer counts as a proof of readiness
+HEALTH_STALE_INTERVALS = 3
+
+class HealthMonitor:
+    """
+    Runs named self-test probes on a daemon thread and caches their outcome.
+    A probe is a callable that raises on failure; its duration is recorded.
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL):
+        self.interval = interval
+        self.probes: Dict[str, Callable[[], None]] = {}
+        self.results: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.thread: Optional[threading.Thread] = None
+
+    def add_probe(self, name: str, probe: Callable[[], None]):
+        """Register a self-test probe (e.g. a tiny inference on one model)."""
+        self.probes[name] = probe
+
+    def run_probes(self):
+        """Run every probe once and cache its result with a timestamp."""
+        for name, probe in self.probes.items():
+            started = time.time()
+            try:
+                probe()
+                result = {"ok": True, "error": None}
+            except Exception as e:
+                result = {"ok": False, "error": str(e) or type(e).__name__}
+            result["latency_ms"] = round((time.time() - started) * 1000, 1)
+            result["checked_at"] = time.time()
+            with self.lock:
+                self.results[name] = result
+
+    def start(self) -> threading.Thread:
+        """Start the background self-test loop."""
+        def run_forever():
+            while True:
+                self.run_probes()
+                time.sleep(self.interval)
+
+        self.thread = threading.Thread(target=run_forever, name="health-monitor", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def get_readiness(self) -> Dict:
+        """
+        Cached readiness: ready when every probe passed within the staleness window.
+        Never runs a probe itself.
+        """
+        now = time.time()
+        max_age = self.interval * HEALTH_STALE_INTERVALS
+        checks = {}
+        ready = bool(self.probes)
+
+        with self.lock:
+            results = dict(self.results)
+
+        for name in self.probes:
+            result = results.get(name)
+            if result is None:
+                checks[name] = {"ok": False, "error": "self-test pending", "latency_ms": None, "checked_at": None, "age_seconds": None}
+                ready = False
+                continue
+            age = now - result["checked_at"]
+            check = dict(result)
+            check["checked_at"] = datetime.utcfromtimestamp(result["checked_at"]).isoformat()
+            check["age_seconds"] = round(age, 1)
+            if age > max_age:
+                check["ok"] = False
+                check["error"] = check["error"] or "self-test stale"
+            checks[name] = check
+            ready = ready and check["ok"]
+
+        return {
+            "ready": ready,
+            "uptime_seconds": round(now - self.started_at, 1),
+            "checks": checks
+        }
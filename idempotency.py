@@ -0,0 +1,102 @@
+# idempotency.py - Request Deduplication for Kounhany AI
+# Mobile clients on flaky networks retry /chat with the same message. A retry
+# must neither start a second generation nor append the turn twice to the
+# conversation: while the original is running the retry waits for its result,
+# afterwards the stored response is replayed for a short while.
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "300"))  # seconds a completed response is replayed
+IDEMPOTENCY_MAX_ENTRIES = 10000
+
+def request_key(user_id: str, idempotency_key: Optional[str], timestamp: str, *contents: Optional[str]) -> str:
+    """
+    Deduplication key of a request: the client's Idempotency-Key header when sent,
+    otherwise the user, the client timestamp and a hash of the message content.
+    """
+    if idempotency_key:
+        return f"key:{user_id}:{idempotency_key}"
+    digest = hashlib.blake2b(digest_size=16)
+    for content in contents:
+        digest.update((content or "").encode("utf-8"))
+        digest.update(b"\0")
+    return f"auto:{user_id}:{timestamp}:{digest.hexdigest()}"
+
+def is_cacheable(response: Any) -> bool:
+    """Only successful answers are replayed; errors, 429s and cancelled turns are recomputed."""
+    return isinstance(response, dict) and response.get("status") == "success"
+
+class IdempotentRequest:
+    """One deduplicated computation and the clients waiting for it."""
+    __slots__ = ("future", "clients", "expires_at")
+
+    def __init__(self, client):
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Every request attached to this computation (used to tell whether anyone is still listening)
+        self.clients: List = [client]
+        self.expires_at = float("inf")
+
+class IdempotencyCache:
+    """
+    Per-process registry of in-flight and recently completed requests.
+    Only used from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, IdempotentRequest]" = OrderedDict()
+        self.stats = {"started": 0, "attached": 0, "replayed": 0}
+
+    def _expire(self, now: float):
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if entry.expires_at > now and len(self.entries) <= self.max_entries:
+                break
+            if not entry.future.done():
+                # Still running: keep it, it moves out of the way once completed
+                self.entries.move_to_end(key)
+                break
+            del self.entries[key]
+
+    def begin(self, key: str, client):
+        """
+        Returns (entry, None) when the caller must compute the response (then call
+        `complete`), or (None, awaitable) resolving to the original response.
+        """
+        now = time.time()
+        self._expire(now)
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            if entry.future.done():
+                self.stats["replayed"] += 1
+            else:
+                self.stats["attached"] += 1
+                entry.clients.append(client)
+            # Shielded: a retry going away must not cancel the original computation
+            return None, asyncio.shield(entry.future)
+
+        entry = self.entries[key] = IdempotentRequest(client)
+        self.stats["started"] += 1
+        return entry, None
+
+    def complete(self, key: str, entry: IdempotentRequest, response: Any = None, error: BaseException = None):
+        """Publish the outcome to attached retries; keep successful responses for replay."""
+        if error is not None:
+            entry.future.set_exception(error)
+            # Retrieved by attached retries if any, not an unhandled error otherwise
+            entry.future.exception()
+        else:
+            entry.future.set_result(response)
+        if error is None and is_cacheable(response):
+            entry.expires_at = time.time() + self.ttl
+        elif self.entries.get(key) is entry:
+            del self.entries[key]
+
+    def get_stats(self) -> Dict:
+        return {"size": len(self.entries), "ttl": self.ttl, **self.stats}
@@ -0,0 +1,548 @@
+# indicators.py - Dashboard Indicator Knowledge Base for Kounhany AI
+# French meaning, severity and recommended action of the dashboard lights
+# recognized by the YOLOv8 detector, keyed by detector class name.
+# Explanations of detected lights are answered from here, without the LLM.
+
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+INDICATORS = {
+    # ========== Red: stop as soon as possible ==========
+    "oil_pressure": {
+        "fr": "Pression d'huile moteur",
+        "meaning": "La pression d'huile est insuffisante : le moteur n'est plus correctement lubrifié.",
+        "severity": "high",
+        "action": "Arrêtez le moteur dès que possible, vérifiez le niveau d'huile. Ne roulez pas si le voyant reste allumé.",
+        "keywords": ["huile", "pression d'huile", "burette"]
+    },
+    "engine_temperature": {
+        "fr": "Température du liquide de refroidissement",
+        "meaning": "Le moteur surchauffe ou le liquide de refroidissement est trop chaud.",
+        "severity": "high",
+        "action": "Arrêtez-vous, laissez refroidir le moteur sans ouvrir le vase d'expansion à chaud, puis vérifiez le niveau de liquide.",
+        "keywords": ["temperature", "surchauffe", "refroidissement", "thermometre"]
+    },
+    "battery": {
+        "fr": "Charge de la batterie",
+        "meaning": "La batterie n'est plus rechargée : alternateur, courroie ou batterie défaillant.",
+        "severity": "high",
+        "action": "Coupez les consommateurs électriques et rejoignez un garage rapidement, le véhicule peut s'arrêter.",
+        "keywords": ["batterie", "charge", "alternateur"]
+    },
+    "brake_system": {
+        "fr": "Système de freinage",
+        "meaning": "Niveau de liquide de frein bas ou défaut du circuit de freinage (ou frein à main serré).",
+        "severity": "high",
+        "action": "Vérifiez que le frein à main est desserré. Sinon, arrêtez-vous et contrôlez le liquide de frein, ne roulez pas.",
+        "keywords": ["frein", "freinage", "liquide de frein"]
+    },
+    "airbag": {
+        "fr": "Airbag",
+        "meaning": "Défaut du système d'airbags ou des prétensionneurs : ils pourraient ne pas se déclencher.",
+        "severity": "high",
+        "action": "Faites diagnostiquer le système d'airbags rapidement.",
+        "keywords": ["airbag", "coussin gonflable"]
+    },
+    "power_steering": {
+        "fr": "Direction assistée",
+        "meaning": "Défaut de la direction assistée : le volant devient dur à tourner.",
+        "severity": "high",
+        "action": "Roulez prudemment jusqu'au garage le plus proche, la direction demande plus d'effort.",
+        "keywords": ["direction", "direction assistee", "volant"]
+    },
+    "seat_belt": {
+        "fr": "Ceinture de sécurité",
+        "meaning": "Une ceinture de sécurité n'est pas bouclée.",
+        "severity": "medium",
+        "action": "Bouclez la ceinture du conducteur et des passagers.",
+        "keywords": ["ceinture"]
+    },
+    "door_open": {
+        "fr": "Porte ouverte",
+        "meaning": "Une porte est mal fermée.",
+        "severity": "medium",
+        "action": "Arrêtez-vous et refermez correctement la porte indiquée.",
+        "keywords": ["porte", "portiere"]
+    },
+    "hood_open": {
+        "fr": "Capot ouvert",
+        "meaning": "Le capot moteur est mal verrouillé.",
+        "severity": "high",
+        "action": "Arrêtez-vous immédiatement et refermez le capot, il peut s'ouvrir en roulant.",
+        "keywords": ["capot"]
+    },
+    "trunk_open": {
+        "fr": "Coffre ouvert",
+        "meaning": "Le coffre ou le hayon est mal fermé.",
+        "severity": "medium",
+        "action": "Arrêtez-vous et refermez le coffre.",
+        "keywords": ["coffre", "hayon"]
+    },
+    "parking_brake": {
+        "fr": "Frein de stationnement",
+        "meaning": "Le frein à main (ou frein de parking électrique) est serré ou en défaut.",
+        "severity": "medium",
+        "action": "Desserrez le frein de stationnement. S'il reste allumé, faites contrôler le système.",
+        "keywords": ["frein a main", "frein de parking", "frein de stationnement"]
+    },
+    "key_not_detected": {
+        "fr": "Clé non détectée",
+        "meaning": "La clé mains libres n'est pas détectée (pile faible ou clé hors du véhicule).",
+        "severity": "medium",
+        "action": "Vérifiez que la clé est dans l'habitacle, remplacez sa pile si le message revient.",
+        "keywords": ["cle", "cle non detectee", "pile"]
+    },
+    "transmission_temperature": {
+        "fr": "Température de boîte de vitesses",
+        "meaning": "L'huile de la boîte automatique surchauffe.",
+        "severity": "high",
+        "action": "Arrêtez-vous et laissez refroidir. Faites contrôler la boîte si le voyant revient.",
+        "keywords": ["boite", "boite automatique", "temperature boite"]
+    },
+    "steering_lock": {
+        "fr": "Antivol de direction",
+        "meaning": "Défaut du verrouillage électrique de la colonne de direction.",
+        "severity": "high",
+        "action": "Ne roulez pas, faites intervenir un garage ou l'assistance.",
+        "keywords": ["antivol", "colonne de direction"]
+    },
+
+    # ========== Orange: have it checked soon ==========
+    "check_engine": {
+        "fr": "Voyant moteur (anomalie moteur / antipollution)",
+        "meaning": "Le calculateur a détecté un défaut moteur ou antipollution (un code OBD est enregistré).",
+        "severity": "medium",
+        "action": "Faites lire le code défaut OBD rapidement. Si le voyant clignote, réduisez la vitesse et rejoignez un garage (risque pour le catalyseur).",
+        "keywords": ["voyant moteur", "check engine", "antipollution", "anomalie moteur"]
+    },
+    "abs": {
+        "fr": "ABS",
+        "meaning": "L'antiblocage des roues est désactivé ; le freinage classique fonctionne toujours.",
+        "severity": "medium",
+        "action": "Roulez prudemment (distances de freinage plus longues sur sol glissant) et faites diagnostiquer l'ABS.",
+        "keywords": ["abs", "antiblocage"]
+    },
+    "esp": {
+        "fr": "Contrôle de stabilité (ESP)",
+        "meaning": "Fixe : défaut de l'ESP. Clignotant : l'ESP est en train d'agir sur une perte d'adhérence.",
+        "severity": "medium",
+        "action": "S'il clignote, levez le pied. S'il reste fixe, faites contrôler le système.",
+        "keywords": ["esp", "stabilite", "derapage"]
+    },
+    "esp_off": {
+        "fr": "ESP désactivé",
+        "meaning": "Le contrôle de stabilité a été désactivé manuellement.",
+        "severity": "low",
+        "action": "Réactivez l'ESP avec le bouton dédié, sauf besoin particulier (neige, sable).",
+        "keywords": ["esp off", "esp desactive"]
+    },
+    "traction_control": {
+        "fr": "Antipatinage",
+        "meaning": "L'antipatinage agit (clignotant) ou est en défaut (fixe).",
+        "severity": "medium",
+        "action": "Adaptez votre conduite ; faites contrôler s'il reste allumé.",
+        "keywords": ["antipatinage", "patinage", "asr", "traction"]
+    },
+    "tire_pressure": {
+        "fr": "Pression des pneus",
+        "meaning": "Un ou plusieurs pneus sont sous-gonflés ou crevés.",
+        "severity": "medium",
+        "action": "Contrôlez et ajustez la pression à froid, vérifiez l'absence de crevaison, puis réinitialisez le système.",
+        "keywords": ["pneu", "pneus", "pression des pneus", "gonflage", "crevaison"]
+    },
+    "low_fuel": {
+        "fr": "Réserve de carburant",
+        "meaning": "Le réservoir est presque vide (quelques dizaines de kilomètres d'autonomie).",
+        "severity": "low",
+        "action": "Faites le plein rapidement.",
+        "keywords": ["carburant", "essence", "reserve", "plein"]
+    },
+    "glow_plug": {
+        "fr": "Préchauffage (bougies de préchauffage)",
+        "meaning": "Fixe au démarrage : préchauffage en cours. Clignotant en roulant : défaut moteur diesel.",
+        "severity": "low",
+        "action": "Attendez qu'il s'éteigne avant de démarrer. S'il clignote en roulant, faites diagnostiquer le moteur.",
+        "keywords": ["prechauffage", "bougie", "bougies", "resistance"]
+    },
+    "dpf": {
+        "fr": "Filtre à particules (FAP)",
+        "meaning": "Le filtre à particules est saturé et doit se régénérer.",
+        "severity": "medium",
+        "action": "Roulez 15 à 20 minutes à vitesse soutenue (voie rapide) pour lancer la régénération. S'il persiste, garage.",
+        "keywords": ["fap", "filtre a particules", "particules"]
+    },
+    "adblue": {
+        "fr": "AdBlue",
+        "meaning": "Niveau d'AdBlue bas ou défaut du système de dépollution SCR.",
+        "severity": "medium",
+        "action": "Complétez l'AdBlue rapidement : à zéro, le moteur ne redémarre plus.",
+        "keywords": ["adblue", "uree"]
+    },
+    "water_in_fuel": {
+        "fr": "Eau dans le gazole",
+        "meaning": "De l'eau s'est accumulée dans le filtre à gazole.",
+        "severity": "medium",
+        "action": "Faites purger ou remplacer le filtre à gazole rapidement.",
+        "keywords": ["eau dans le gazole", "filtre a gazole", "eau"]
+    },
+    "brake_pad_wear": {
+        "fr": "Usure des plaquettes de frein",
+        "meaning": "Les plaquettes de frein arrivent en fin de vie.",
+        "severity": "medium",
+        "action": "Faites remplacer les plaquettes (et contrôler les disques) dans les prochains jours.",
+        "keywords": ["plaquette", "plaquettes", "usure"]
+    },
+    "coolant_level": {
+        "fr": "Niveau de liquide de refroidissement",
+        "meaning": "Le niveau de liquide de refroidissement est bas.",
+        "severity": "medium",
+        "action": "Moteur froid, complétez le niveau et recherchez une éventuelle fuite.",
+        "keywords": ["liquide de refroidissement", "vase d'expansion", "niveau liquide"]
+    },
+    "oil_level": {
+        "fr": "Niveau d'huile",
+        "meaning": "Le niveau d'huile moteur est bas.",
+        "severity": "medium",
+        "action": "Complétez le niveau avec l'huile préconisée, moteur à l'arrêt sur sol plat.",
+        "keywords": ["niveau d'huile", "niveau huile"]
+    },
+    "lamp_failure": {
+        "fr": "Défaut d'ampoule",
+        "meaning": "Une ampoule extérieure est grillée.",
+        "severity": "low",
+        "action": "Identifiez et remplacez l'ampoule défectueuse.",
+        "keywords": ["ampoule", "feu grille"]
+    },
+    "washer_fluid": {
+        "fr": "Liquide lave-glace",
+        "meaning": "Le réservoir de lave-glace est presque vide.",
+        "severity": "low",
+        "action": "Complétez le réservoir de lave-glace.",
+        "keywords": ["lave-glace", "lave glace", "essuie-glace"]
+    },
+    "service_due": {
+        "fr": "Entretien à prévoir",
+        "meaning": "La prochaine révision arrive (échéance kilométrique ou temporelle).",
+        "severity": "low",
+        "action": "Planifiez la révision ; réservez un forfait entretien sur KOUNHANY.",
+        "keywords": ["entretien", "revision", "vidange", "cle a molette"]
+    },
+    "frost_warning": {
+        "fr": "Risque de verglas",
+        "meaning": "La température extérieure est proche de 0 °C.",
+        "severity": "low",
+        "action": "Adaptez votre vitesse, la route peut être glissante.",
+        "keywords": ["verglas", "flocon", "gel"]
+    },
+    "immobilizer": {
+        "fr": "Antidémarrage",
+        "meaning": "La clé n'est pas reconnue par l'antidémarrage ou le système est en défaut.",
+        "severity": "medium",
+        "action": "Essayez le double de la clé. Si le moteur ne démarre pas, contactez l'assistance.",
+        "keywords": ["antidemarrage", "antidemarreur", "immobiliseur"]
+    },
+    "gearbox_fault": {
+        "fr": "Défaut de boîte de vitesses",
+        "meaning": "La boîte de vitesses a détecté une anomalie (mode dégradé possible).",
+        "severity": "medium",
+        "action": "Roulez calmement jusqu'au garage pour un diagnostic.",
+        "keywords": ["boite de vitesses", "embrayage"]
+    },
+    "suspension_fault": {
+        "fr": "Défaut de suspension",
+        "meaning": "Anomalie de la suspension pilotée ou pneumatique.",
+        "severity": "medium",
+        "action": "Réduisez la vitesse et faites contrôler la suspension.",
+        "keywords": ["suspension", "amortisseur"]
+    },
+    "catalytic_converter": {
+        "fr": "Catalyseur",
+        "meaning": "Le catalyseur surchauffe ou est défaillant.",
+        "severity": "medium",
+        "action": "Évitez les régimes élevés et faites diagnostiquer le moteur rapidement.",
+        "keywords": ["catalyseur", "pot catalytique"]
+    },
+    "lane_departure": {
+        "fr": "Alerte de franchissement de ligne",
+        "meaning": "L'aide au maintien dans la voie est active, désactivée ou en défaut (caméra masquée).",
+        "severity": "low",
+        "action": "Nettoyez le pare-brise devant la caméra ; faites contrôler si le défaut persiste.",
+        "keywords": ["ligne", "franchissement", "maintien de voie"]
+    },
+    "forward_collision": {
+        "fr": "Alerte de collision",
+        "meaning": "Le freinage d'urgence automatique est désactivé ou son capteur est masqué.",
+        "severity": "medium",
+        "action": "Nettoyez le radar/la caméra avant ; faites contrôler si le voyant persiste.",
+        "keywords": ["collision", "freinage d'urgence", "radar"]
+    },
+    "blind_spot": {
+        "fr": "Surveillance d'angle mort",
+        "meaning": "La surveillance d'angle mort signale un véhicule ou est indisponible.",
+        "severity": "low",
+        "action": "Vérifiez vos rétroviseurs ; nettoyez les capteurs du pare-chocs arrière si le système est indisponible.",
+        "keywords": ["angle mort"]
+    },
+
+    # ========== Green / blue: information ==========
+    "high_beam": {
+        "fr": "Feux de route",
+        "meaning": "Les feux de route (pleins phares) sont allumés.",
+        "severity": "low",
+        "action": "Passez en feux de croisement si vous croisez ou suivez un véhicule.",
+        "keywords": ["feux de route", "pleins phares", "phare"]
+    },
+    "low_beam": {
+        "fr": "Feux de croisement",
+        "meaning": "Les feux de croisement sont allumés.",
+        "severity": "low",
+        "action": "Aucune action nécessaire.",
+        "keywords": ["feux de croisement", "codes"]
+    },
+    "position_lights": {
+        "fr": "Feux de position",
+        "meaning": "Les feux de position (veilleuses) sont allumés.",
+        "severity": "low",
+        "action": "Aucune action nécessaire.",
+        "keywords": ["veilleuses", "feux de position"]
+    },
+    "fog_light_front": {
+        "fr": "Feux antibrouillard avant",
+        "meaning": "Les antibrouillards avant sont allumés.",
+        "severity": "low",
+        "action": "Éteignez-les lorsque la visibilité redevient normale.",
+        "keywords": ["antibrouillard", "brouillard"]
+    },
+    "fog_light_rear": {
+        "fr": "Feu antibrouillard arrière",
+        "meaning": "Le feu antibrouillard arrière est allumé.",
+        "severity": "low",
+        "action": "Éteignez-le hors brouillard épais : il éblouit les véhicules qui suivent.",
+        "keywords": ["antibrouillard arriere"]
+    },
+    "turn_signal": {
+        "fr": "Clignotants",
+        "meaning": "Un clignotant est actif. Un clignotement rapide indique une ampoule grillée.",
+        "severity": "low",
+        "action": "Si le rythme est anormalement rapide, remplacez l'ampoule du clignotant.",
+        "keywords": ["clignotant", "clignotants"]
+    },
+    "hazard_lights": {
+        "fr": "Feux de détresse",
+        "meaning": "Les feux de détresse (warning) sont allumés.",
+        "severity": "low",
+        "action": "Éteignez-les une fois le danger écarté.",
+        "keywords": ["warning", "feux de detresse", "detresse"]
+    },
+    "cruise_control": {
+        "fr": "Régulateur / limiteur de vitesse",
+        "meaning": "Le régulateur ou le limiteur de vitesse est actif.",
+        "severity": "low",
+        "action": "Aucune action nécessaire.",
+        "keywords": ["regulateur", "limiteur"]
+    },
+    "start_stop": {
+        "fr": "Stop & Start",
+        "meaning": "Vert : le moteur est coupé par le Stop & Start. Orange/barré : système désactivé ou indisponible.",
+        "severity": "low",
+        "action": "Aucune action nécessaire ; faites contrôler la batterie si le système reste indisponible.",
+        "keywords": ["stop and start", "stop & start", "start stop"]
+    },
+    "eco_mode": {
+        "fr": "Mode ECO",
+        "meaning": "Le mode de conduite économique est activé.",
+        "severity": "low",
+        "action": "Aucune action nécessaire.",
+        "keywords": ["eco", "mode eco"]
+    },
+    "four_wheel_drive": {
+        "fr": "Transmission intégrale (4x4)",
+        "meaning": "La transmission 4 roues motrices est engagée (ou en défaut si orange).",
+        "severity": "low",
+        "action": "Si le voyant est orange, faites contrôler la transmission.",
+        "keywords": ["4x4", "quatre roues motrices", "transmission integrale"]
+    },
+    "hill_descent": {
+        "fr": "Aide à la descente",
+        "meaning": "L'aide au contrôle en descente est active.",
+        "severity": "low",
+        "action": "Aucune action nécessaire.",
+        "keywords": ["descente", "aide a la descente"]
+    },
+}
+
+# Detector class names that differ from the knowledge base keys
+INDICATOR_ALIASES = {
+    "engine": "check_engine",
+    "engine_check": "check_engine",
+    "mil": "check_engine",
+    "malfunction": "check_engine",
+    "oil": "oil_pressure",
+    "low_oil_pressure": "oil_pressure",
+    "coolant_temperature": "engine_temperature",
+    "temperature": "engine_temperature",
+    "battery_charge": "battery",
+    "charging_system": "battery",
+    "brake": "brake_system",
+    "brakes": "brake_system",
+    "brake_fluid": "brake_system",
+    "handbrake": "parking_brake",
+    "epb": "parking_brake",
+    "seatbelt": "seat_belt",
+    "belt": "seat_belt",
+    "tpms": "tire_pressure",
+    "tyre_pressure": "tire_pressure",
+    "fuel": "low_fuel",
+    "fuel_level": "low_fuel",
+    "preheating": "glow_plug",
+    "diesel_particulate_filter": "dpf",
+    "fap": "dpf",
+    "stability_control": "esp",
+    "esc": "esp",
+    "esc_off": "esp_off",
+    "traction_control_off": "esp_off",
+    "eps": "power_steering",
+    "steering": "power_steering",
+    "bonnet_open": "hood_open",
+    "boot_open": "trunk_open",
+    "tailgate_open": "trunk_open",
+    "doors_open": "door_open",
+    "key": "key_not_detected",
+    "key_fob_battery": "key_not_detected",
+    "main_beam": "high_beam",
+    "dipped_beam": "low_beam",
+    "side_lights": "position_lights",
+    "front_fog": "fog_light_front",
+    "rear_fog": "fog_light_rear",
+    "turn_signals": "turn_signal",
+    "indicator": "turn_signal",
+    "hazard": "hazard_lights",
+    "wrench": "service_due",
+    "service": "service_due",
+    "maintenance": "service_due",
+    "frost": "frost_warning",
+    "ice_warning": "frost_warning",
+    "washer": "washer_fluid",
+    "bulb_failure": "lamp_failure",
+    "exterior_light_fault": "lamp_failure",
+    "transmission": "gearbox_fault",
+    "automatic_transmission_temperature": "transmission_temperature",
+    "awd": "four_wheel_drive",
+    "4wd": "four_wheel_drive",
+}
+
+SEVERITY_ICONS = {"high": "🔴", "medium": "🟡", "low": "🟢"}
+SEVERITY_TEXT = {
+    "high": "ÉLEVÉE - Arrêtez-vous dès que possible",
+    "medium": "MOYENNE - À faire contrôler rapidement",
+    "low": "FAIBLE - Information / non urgent"
+}
+SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# Follow-up wording that points at the lights of the last photo without naming them
+# (deictic: "le voyant" alone may be any light, "ce voyant" is the one on the photo)
+GENERIC_REFERENCES = [
+    "ce voyant", "ces voyants", "cet indicateur", "ces indicateurs", "ce temoin", "ces temoins",
+    "c'est grave", "est-ce grave", "est ce grave", "la photo", "l'image", "sur la photo"
+]
+
+# Wording about a warning light: a named keyword ("huile", "frein", "charge") only
+# refers to a detected indicator when the message also talks about a light
+LIGHT_WORDS = ["voyant", "temoin", "indicateur", "allum", "clignot", "lumiere", "symbole", "pictogramme", "logo"]
+
+_NAME_SUFFIXES = ("_warning_light", "_warning", "_light", "_indicator", "_lamp", "_symbol")
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def normalize_indicator_name(class_name: str) -> str:
+    """Detector class name -> knowledge base key ('Check Engine Light' -> 'check_engine')."""
+    key = re.sub(r"[^a-z0-9]+", "_", _fold(class_name)).strip("_")
+    for suffix in _NAME_SUFFIXES:
+        if key.endswith(suffix) and key[:-len(suffix)]:
+            key = key[:-len(suffix)]
+            break
+    return INDICATOR_ALIASES.get(key, key)
+
+def get_indicator_info(class_name: str) -> Optional[dict]:
+    """Knowledge base entry of a detector class, None if unknown."""
+    return INDICATORS.get(normalize_indicator_name(class_name))
+
+def build_class_index(names: Dict[int, str]) -> Dict[str, dict]:
+    """Resolve every detector class name once (class name -> entry). Unknown classes are left out."""
+    index = {}
+    for class_name in names.values():
+        info = get_indicator_info(class_name)
+        if info:
+            index[class_name] = info
+    return index
+
+# Accent-folded keyword -> knowledge base key, longest keywords first so that
+# "niveau d'huile" wins over "huile"
+_KEYWORD_INDEX = sorted(
+    ((_fold(keyword), key) for key, info in INDICATORS.items() for keyword in info["keywords"]),
+    key=lambda item: len(item[0]),
+    reverse=True
+)
+
+def find_referenced_indicators(text: str, detected_classes: List[str]) -> List[str]:
+    """
+    Detected classes a follow-up message about the lights is about: those it names
+    ("le voyant d'huile est allumé"), or all of them when it refers to "ce voyant",
+    "c'est grave ?", etc. Only call it when the photo is the latest exchange.
+    """
+    folded = _fold(text)
+    by_key = {}
+    for class_name in detected_classes:
+        by_key.setdefault(normalize_indicator_name(class_name), class_name)
+
+    referenced = []
+    names_other_light = False
+    if any(word in folded for word in LIGHT_WORDS):
+        remaining = folded
+        for keyword, key in _KEYWORD_INDEX:
+            if re.search(rf"\b{re.escape(keyword)}\b", remaining):
+                if key not in by_key:
+                    names_other_light = True
+                elif by_key[key] not in referenced:
+                    referenced.append(by_key[key])
+                remaining = re.sub(rf"\b{re.escape(keyword)}\b", " ", remaining)
+    if referenced:
+        return referenced
+    # "et ce voyant ABS ?" about a light that was not detected: not a follow-up of the photo
+    if names_other_light:
+        return []
+
+    if any(reference in folded for reference in GENERIC_REFERENCES):
+        return [class_name for class_name in detected_classes if get_indicator_info(class_name)]
+    return []
+
+def format_indicator_line(class_name: str, info: dict) -> str:
+    """One-line summary of a detected indicator for the image response."""
+    icon = SEVERITY_ICONS.get(info["severity"], "⚪")
+    return f"{icon} **{info['fr']}** : {info['action']}"
+
+def format_indicator_response(class_names: List[str]) -> str:
+    """Detailed French explanation of detected indicators, most severe first."""
+    entries = [(class_name, get_indicator_info(class_name)) for class_name in class_names]
+    entries = sorted(
+        [(class_name, info) for class_name, info in entries if info],
+        key=lambda entry: SEVERITY_ORDER.get(entry[1]["severity"], 3)
+    )
+
+    parts = []
+    for class_name, info in entries:
+        icon = SEVERITY_ICONS.get(info["severity"], "⚪")
+        parts.append(f"""🚨 **VOYANT: {info["fr"].upper()}**
+
+📋 **Signification:** {info["meaning"]}
+
+{icon} **Gravité:** {SEVERITY_TEXT.get(info["severity"], "Inconnue")}
+
+🔨 **Que faire:** {info["action"]}""")
+
+    parts.append("💡 *Pour un diagnostic ou une réparation, KOUNHANY vous met en relation avec un garage audité près de chez vous.*")
+    return "\n\n".join(parts)
@@ -0,0 +1,109 @@
+# question_clusters.py - Near-duplicate Question Clustering for Kounhany AI
+# MinHash signatures + LSH banding to group rephrasings of the same question
+# ("voyant moteur allumé", "le voyant du moteur s'allume", ...) for analytics.
+# Clusters aggregate counts only: two questions differing by one meaningful word
+# ("abs" / "esp", "clio" / "golf") may share a cluster, so answers must never be
+# replayed per cluster.
+
+import hashlib
+import random
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# 64 hash functions split in 16 bands of 4 rows: pairs with a Jaccard similarity
+# of 0.75 or more share at least one band with high probability
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+
+# Minimum estimated similarity (over the meaningful words) to join an existing cluster:
+# "voyant abs allumé" / "voyant esp allumé" share 2 of 4 words and stay apart
+CLUSTER_THRESHOLD = 0.75
+
+# Bumped whenever shingles or hashing change: stored signatures of another version are recomputed
+SIGNATURE_VERSION = 2
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures are persisted and must be stable across restarts
+_rng = random.Random(1337)
+_PERMUTATIONS = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+# Filler words that carry no meaning for clustering (accents already removed)
+CLUSTER_STOPWORDS = {
+    'le', 'la', 'les', 'un', 'une', 'des', 'de', 'du', 'et', 'est', 'je', 'tu', 'il', 'elle',
+    'nous', 'vous', 'ils', 'elles', 'mon', 'ma', 'mes', 'ton', 'ta', 'tes', 'son', 'sa', 'ses',
+    'au', 'aux', 'a', 'en', 'sur', 'pour', 'que', 'qui', 'ce', 'se', 'ca', 'me', 'y'
+}
+
+def cluster_tokens(question: str) -> List[str]:
+    """Lowercase, strip accents and elisions, and drop filler words."""
+    text = unicodedata.normalize('NFKD', question.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    # "s'allume" -> "s allume", "l'huile" -> "l huile"
+    text = re.sub(r"[^\w\s]", ' ', text)
+    return [w for w in text.split() if (len(w) > 1 or w.isdigit()) and w not in CLUSTER_STOPWORDS]
+
+def shingles(question: str) -> set:
+    """Word shingles over the cleaned question (one changed word is a different question)."""
+    return set(cluster_tokens(question))
+
+def _hash_shingle(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+
+def minhash_signature(question: str) -> Optional[List[int]]:
+    """Compute the MinHash signature of a question. Returns None for empty questions."""
+    hashed = [_hash_shingle(s) for s in shingles(question)]
+    if not hashed:
+        return None
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity between two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERMUTATIONS
+
+class QuestionClusterIndex:
+    """
+    In-memory LSH index of cluster representatives.
+    Lookups only compare against the clusters sharing a band, so assignment
+    stays near-constant time as the number of clusters grows.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, tuple], List[int]] = {}
+        self.signatures: Dict[int, List[int]] = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _bands(self, signature: List[int]):
+        for band in range(NUM_BANDS):
+            start = band * ROWS_PER_BAND
+            yield (band, tuple(signature[start:start + ROWS_PER_BAND]))
+
+    def add(self, cluster_id: int, signature: List[int]):
+        """Register a cluster representative."""
+        self.signatures[cluster_id] = signature
+        for key in self._bands(signature):
+            self.buckets.setdefault(key, []).append(cluster_id)
+
+    def find(self, signature: List[int], threshold: float = CLUSTER_THRESHOLD) -> Optional[int]:
+        """Return the most similar cluster above the threshold, or None."""
+        candidates = set()
+        for key in self._bands(signature):
+            candidates.update(self.buckets.get(key, ()))
+
+        best_id, best_score = None, threshold
+        for cluster_id in candidates:
+            score = estimate_similarity(signature, self.signatures[cluster_id])
+            if score >= best_score:
+                best_id, best_score = cluster_id, score
+        return best_id
@@ -0,0 +1,195 @@
+# ratelimit.py - Admission Control for Kounhany AI
+# Per-user and global token buckets in front of the GPU. Requests are charged by
+# cost: answers from the OBD table, the knowledge base or a cache are cheap, an
+# LLM generation is expensive. In-flight generations are capped per user, so a
+# few heavy users cannot take every slot, and globally, only as a safety bound
+# on the threads blocked waiting for the model. Ordering among the admitted
+# generations is left to the scheduler, whose per-user queue limit
+# (SCHEDULER_MAX_QUEUED_PER_USER) sheds the excess of a single user.
+# Shed requests get a Retry-After delay.
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_USER_RATE = float(os.environ.get("RATE_LIMIT_USER_RATE", "0.5"))       # cost units per second per user
+RATE_LIMIT_USER_BURST = float(os.environ.get("RATE_LIMIT_USER_BURST", "60"))
+RATE_LIMIT_GLOBAL_RATE = float(os.environ.get("RATE_LIMIT_GLOBAL_RATE", "10"))    # cost units per second, all users
+RATE_LIMIT_GLOBAL_BURST = float(os.environ.get("RATE_LIMIT_GLOBAL_BURST", "200"))
+# Generations running or queued, per user (one running + two waiting) and in total
+# (each holds a threadpool thread, of which Starlette has 40)
+LLM_MAX_CONCURRENT_PER_USER = int(os.environ.get("LLM_MAX_CONCURRENT_PER_USER", "3"))
+LLM_MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENT", "32"))
+
+# Cost units charged per kind of work
+REQUEST_COSTS = {
+    "request": 1,     # every chat request (OBD, knowledge base, cached answers stop here)
+    "llm": 8,         # extra charge before an LLM generation
+    "image": 3,       # per photo
+    "video": 10       # per clip or photo burst
+}
+
+# User buckets kept in memory (least recently used dropped first; a dropped bucket restarts full)
+MAX_TRACKED_USERS = 10000
+# Retry-After hint when the user's (or every) generation slot is busy
+CONCURRENCY_RETRY_AFTER = 2.0
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` tokens."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now). Call refill first."""
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0 or cost > self.burst:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+class RateLimiter:
+    """Thread-safe per-user + global token buckets and a limit on concurrent LLM generations."""
+
+    def __init__(
+        self,
+        user_rate: float = RATE_LIMIT_USER_RATE,
+        user_burst: float = RATE_LIMIT_USER_BURST,
+        global_rate: float = RATE_LIMIT_GLOBAL_RATE,
+        global_burst: float = RATE_LIMIT_GLOBAL_BURST,
+        max_concurrent: int = LLM_MAX_CONCURRENT,
+        max_concurrent_per_user: int = LLM_MAX_CONCURRENT_PER_USER,
+        enabled: bool = RATE_LIMIT_ENABLED
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.enabled = enabled
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.time())
+        self.user_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.in_flight_by_user: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.stats = {"admitted": 0, "rejected_user": 0, "rejected_global": 0, "rejected_concurrency": 0,
+                      "rejected_user_concurrency": 0, "refunded": 0}
+
+    def _user_bucket(self, user_id: str, now: float) -> TokenBucket:
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self.user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+            if len(self.user_buckets) > MAX_TRACKED_USERS:
+                self.user_buckets.popitem(last=False)
+        else:
+            self.user_buckets.move_to_end(user_id)
+        return bucket
+
+    def acquire(self, user_id: str, kind: str = "request", count: int = 1) -> Optional[float]:
+        """
+        Charge `count` units of work of a kind to the user and the global bucket.
+        Returns None when admitted, otherwise the seconds to wait before retrying
+        (nothing is charged on rejection).
+        """
+        if not self.enabled:
+            return None
+        cost = REQUEST_COSTS[kind] * count
+        now = time.time()
+        with self.lock:
+            user_bucket = self._user_bucket(user_id or "anonymous", now)
+            user_bucket.refill(now)
+            self.global_bucket.refill(now)
+
+            user_wait = user_bucket.wait_time(cost)
+            if user_wait:
+                self.stats["rejected_user"] += 1
+                return user_wait
+            global_wait = self.global_bucket.wait_time(cost)
+            if global_wait:
+                self.stats["rejected_global"] += 1
+                return global_wait
+
+            user_bucket.tokens -= cost
+            self.global_bucket.tokens -= cost
+            self.stats["admitted"] += 1
+            return None
+
+    def acquire_generation(self, user_id: str) -> Optional[float]:
+        """
+        Charge an LLM generation and take one of the user's generation slots.
+        Returns None when admitted (call release_generation when done), otherwise seconds to wait.
+        """
+        if not self.enabled:
+            return None
+        user_id = user_id or "anonymous"
+        with self.lock:
+            user_in_flight = self.in_flight_by_user.get(user_id, 0)
+            if user_in_flight >= self.max_concurrent_per_user:
+                self.stats["rejected_user_concurrency"] += 1
+                return CONCURRENCY_RETRY_AFTER
+            if self.in_flight >= self.max_concurrent:
+                self.stats["rejected_concurrency"] += 1
+                return CONCURRENCY_RETRY_AFTER
+            self.in_flight += 1
+            self.in_flight_by_user[user_id] = user_in_flight + 1
+        retry_after = self.acquire(user_id, "llm")
+        if retry_after is not None:
+            self.release_generation(user_id)
+        return retry_after
+
+    def refund(self, user_id: str, kind: str = "request", count: int = 1):
+        """Give back units charged for work that was refused further down (e.g. by the scheduler)."""
+        if not self.enabled:
+            return
+        cost = REQUEST_COSTS[kind] * count
+        now = time.time()
+        with self.lock:
+            for bucket in (self._user_bucket(user_id or "anonymous", now), self.global_bucket):
+                bucket.refill(now)
+                bucket.tokens = min(bucket.burst, bucket.tokens + cost)
+            self.stats["refunded"] += 1
+
+    def refund_generation(self, user_id: str):
+        """Refund the LLM charge of a generation that never got to run."""
+        self.refund(user_id, "llm")
+
+    def release_generation(self, user_id: str):
+        if not self.enabled:
+            return
+        user_id = user_id or "anonymous"
+        with self.lock:
+            self.in_flight -= 1
+            remaining = self.in_flight_by_user.pop(user_id, 1) - 1
+            if remaining:
+                self.in_flight_by_user[user_id] = remaining
+
+    def get_stats(self) -> Dict:
+        """Limits, current state and admission counts."""
+        now = time.time()
+        with self.lock:
+            self.global_bucket.refill(now)
+            return {
+                "enabled": self.enabled,
+                "user_rate": self.user_rate,
+                "user_burst": self.user_burst,
+                "global_rate": self.global_bucket.rate,
+                "global_burst": self.global_bucket.burst,
+                "global_tokens": round(self.global_bucket.tokens, 1),
+                "tracked_users": len(self.user_buckets),
+                "llm_in_flight": self.in_flight,
+                "llm_max_concurrent": self.max_concurrent,
+                "llm_users_in_flight": len(self.in_flight_by_user),
+                "llm_max_concurrent_per_user": self.max_concurrent_per_user,
+                **self.stats
+            }
@@ -0,0 +1,162 @@
+# retention.py - Conversation Retention Tiering for Kounhany AI
+# Moves old conversations out of the hot analytics DB into compressed monthly
+# partition files. Analytics queries span both tiers (see get_conversation_tiers)
+
+import argparse
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from analytics import (
+    ARCHIVE_DIR, add_column_if_missing, get_db_connection, get_partition_connection, partition_path,
+    prune_response_bodies
+)
+
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "90"))  # 0 disables the daily job
+RETENTION_HOUR = int(os.environ.get("RETENTION_HOUR", "3"))  # Local hour of the daily run
+ARCHIVE_BATCH_SIZE = 5000
+
+CONVERSATION_COLUMNS = [
+    'id', 'user_id', 'timestamp', 'user_message', 'ai_response', 'response_time_ms',
+    'content_type', 'detected_intent', 'obd_code_detected', 'was_helpful', 'feedback', 'status'
+]
+
+def init_partition(conn):
+    """Create the archive table and its read view in a partition file."""
+    cursor = conn.cursor()
+
+    # Same columns as the hot table, the response text is zlib-compressed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversations_archive (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            timestamp DATETIME,
+            user_message TEXT NOT NULL,
+            ai_response_z BLOB NOT NULL,
+            response_time_ms INTEGER,
+            content_type TEXT,
+            detected_intent TEXT,
+            obd_code_detected TEXT,
+            was_helpful INTEGER,
+            feedback TEXT,
+            status TEXT DEFAULT 'completed'
+        )
+    ''')
+    # Partitions archived before the status column: their turns were all completed
+    add_column_if_missing(cursor, 'conversations_archive', 'status', "TEXT DEFAULT 'completed'")
+
+    # Read view with the hot table schema
+    cursor.execute('DROP VIEW IF EXISTS conversations')
+    cursor.execute('''
+        CREATE VIEW conversations AS
+        SELECT id, user_id, timestamp, user_message, decompress_text(ai_response_z) AS ai_response,
+               response_time_ms, content_type, detected_intent, obd_code_detected, was_helpful, feedback,
+               status
+        FROM conversations_archive
+    ''')
+    conn.commit()
+
+def _write_partition(month: str, rows: list):
+    """Append rows to a monthly partition. Re-running after a crash is a no-op (same ids)."""
+    conn = get_partition_connection(partition_path(month))
+    init_partition(conn)
+    conn.executemany('''
+        INSERT OR IGNORE INTO conversations_archive
+        (id, user_id, timestamp, user_message, ai_response_z, response_time_ms,
+         content_type, detected_intent, obd_code_detected, was_helpful, feedback, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (row['id'], row['user_id'], row['timestamp'], row['user_message'],
+         zlib.compress(row['ai_response'].encode('utf-8'), 9), row['response_time_ms'],
+         row['content_type'], row['detected_intent'], row['obd_code_detected'],
+         row['was_helpful'], row['feedback'], row['status'])
+        for row in rows
+    ])
+    conn.commit()
+    conn.close()
+
+def archive_old_conversations(retention_days: int = RETENTION_DAYS, vacuum: bool = False) -> Dict:
+    """
+    Move conversations older than `retention_days` to monthly partition files.
+    Rows are copied to the partition first and only then deleted from the hot DB,
+    batch by batch, so an interrupted run loses nothing.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # Conversation timestamps are stored by SQLite's CURRENT_TIMESTAMP (UTC)
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    archived = 0
+    months = set()
+
+    while True:
+        cursor.execute(f'''
+            SELECT {', '.join(CONVERSATION_COLUMNS)}
+            FROM conversation_messages
+            WHERE timestamp < ?
+            ORDER BY id
+            LIMIT ?
+        ''', (cutoff, ARCHIVE_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[str(row['timestamp'])[:7]].append(row)
+
+        for month, month_rows in by_month.items():
+            _write_partition(month, month_rows)
+            months.add(month)
+
+        cursor.executemany('DELETE FROM conversations WHERE id = ?', [(row['id'],) for row in rows])
+        conn.commit()
+        archived += len(rows)
+
+    conn.close()
+
+    # Response bodies only referenced by archived rows are now dead weight
+    if archived:
+        prune_response_bodies()
+
+    if vacuum and archived:
+        # Return the freed pages to the filesystem (exclusive lock, run off-peak)
+        conn = get_db_connection()
+        conn.execute('VACUUM')
+        conn.close()
+
+    print(f"✅ Retention: {archived} conversations archived into {len(months)} partition(s)")
+    return {'archived': archived, 'months': sorted(months), 'cutoff': cutoff}
+
+def start_retention_scheduler(hour: int = RETENTION_HOUR) -> Optional[threading.Thread]:
+    """Start a daemon thread that archives old conversations every day at the given hour."""
+    if RETENTION_DAYS <= 0:
+        return None
+
+    def run_forever():
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            time.sleep((next_run - now).total_seconds())
+            try:
+                archive_old_conversations()
+            except Exception as e:
+                print(f"Retention error: {e}")
+
+    thread = threading.Thread(target=run_forever, name="conversation-retention", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old conversations into monthly partition files")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Keep this many days in the hot DB")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the hot DB after archiving")
+    args = parser.parse_args()
+    archive_old_conversations(args.days, vacuum=args.vacuum)
@@ -0,0 +1,158 @@
+# router.py - Small/Large Model Cascade for Kounhany AI
+# Greetings, Kounhany FAQ questions and short clarifications do not need
+# Qwen2.5-32B. The router sends simple turns to a small fast model and keeps the
+# 32B for the rest; a small-model answer that fails the quality checks
+# (truncated, leaked prompt tokens, wrong language, hedging) is escalated to
+# the 32B. Both models take turns in the same LLM scheduler. Disabled unless
+# SMALL_MODEL_PATH points to a GGUF model.
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional, Tuple
+
+SMALL_MODEL_PATH = os.environ.get("SMALL_MODEL_PATH", "")  # e.g. Qwen2.5-3B-Instruct-Q4_K_M.gguf
+SMALL_MODEL_MAX_COMPLEXITY = float(os.environ.get("SMALL_MODEL_MAX_COMPLEXITY", "0.35"))
+# The 32B already fills the 24GB card: the small model stays on the CPU unless layers are offloaded
+SMALL_MODEL_GPU_LAYERS = int(os.environ.get("SMALL_MODEL_GPU_LAYERS", "0"))
+SMALL_MODEL_N_CTX = int(os.environ.get("SMALL_MODEL_N_CTX", "4096"))
+# Scheduler cost of a small-model token relative to a 32B token
+SMALL_MODEL_COST_RATIO = float(os.environ.get("SMALL_MODEL_COST_RATIO", "0.25"))
+
+# Intents the small model may answer; technical diagnostics always go to the 32B
+SMALL_MODEL_INTENTS = {"greeting", "thanks", "farewell", "kounhany", "general"}
+
+# Signals of a question that needs reasoning rather than a short answer
+REASONING_KEYWORDS = [
+    'pourquoi', 'comment', 'diagnostic', 'cause', 'différence', 'difference', 'comparer', 'compare',
+    'expliquer', 'explique', 'calcul', 'combien', 'bruit', 'fuite', 'vibration', 'surchauffe',
+    'injecteur', 'turbo', 'embrayage', 'boîte', 'boite', 'distribution', 'courroie'
+]
+COMPLEXITY_MAX_WORDS = 40
+
+# Quality checks on small-model answers
+LEAK_MARKERS = ["<|im_start|>", "<|im_end|>", "<|endoftext|>", "Utilisateur:", "Assistant:", "RÈGLES", "(Note:"]
+HEDGING_PHRASES = ["je ne sais pas", "je ne suis pas sûr", "je ne suis pas certain", "i don't know", "as an ai"]
+NON_LATIN_PATTERN = re.compile(r'[Ѐ-ӿ؀-ۿ぀-ヿ一-鿿]')
+MIN_ANSWER_CHARS = 20
+
+def load_small_model(path: str = SMALL_MODEL_PATH, n_gpu_layers: int = SMALL_MODEL_GPU_LAYERS,
+                     n_ctx: int = SMALL_MODEL_N_CTX):
+    """The small model of the cascade, or None when no SMALL_MODEL_PATH is configured."""
+    if not path:
+        return None
+    from llama_cpp import Llama
+    model = Llama(model_path=path, n_gpu_layers=n_gpu_layers, n_ctx=n_ctx, n_batch=256, verbose=False)
+    print(f"✅ Small model loaded for the cascade: {os.path.basename(path)}")
+    return model
+
+def complexity_score(text: str, history_len: int = 0) -> float:
+    """0 (trivial) to 1 (needs the large model) from length, reasoning keywords and context."""
+    text_lower = text.lower()
+    words = len(text.split())
+    score = min(words / COMPLEXITY_MAX_WORDS, 1.0) * 0.5
+    score += min(sum(1 for keyword in REASONING_KEYWORDS if keyword in text_lower), 2) * 0.2
+    score += 0.1 * min(text.count('?'), 2) / 2
+    # Follow-ups lean on the conversation context, which the small model handles worse
+    if history_len:
+        score += 0.1
+    return min(score, 1.0)
+
+def route(text: str, intent: str, history_len: int = 0, max_complexity: float = SMALL_MODEL_MAX_COMPLEXITY) -> Tuple[str, str]:
+    """Choose "small" or "large" for a turn. Returns (model, reason)."""
+    if intent not in SMALL_MODEL_INTENTS:
+        return "large", f"intent_{intent}"
+    if re.search(r'[pPbBcCuU][0-9]{4}', text):
+        return "large", "obd_code"
+    if complexity_score(text, history_len) > max_complexity:
+        return "large", "complex"
+    return "small", f"intent_{intent}"
+
+def check_output(text: str, finish_reason: Optional[str]) -> Optional[str]:
+    """Why a small-model answer must be escalated, or None if it is acceptable."""
+    if finish_reason == "length":
+        return "truncated"
+    if any(marker in text for marker in LEAK_MARKERS):
+        return "leaked_tokens"
+    if len(text.strip()) < MIN_ANSWER_CHARS:
+        return "too_short"
+    if NON_LATIN_PATTERN.search(text):
+        return "wrong_language"
+    text_lower = text.lower()
+    if any(phrase in text_lower for phrase in HEDGING_PHRASES):
+        return "uncertain"
+    return None
+
+class ModelRouter:
+    """
+    Runs a turn on the small model when the route allows it, escalating to the
+    large model on a failed quality check. Without a small model every turn goes large.
+    """
+
+    def __init__(self, enabled: bool, max_complexity: float = SMALL_MODEL_MAX_COMPLEXITY):
+        self.enabled = enabled
+        self.max_complexity = max_complexity
+        self.lock = threading.Lock()
+        self.decisions: Counter = Counter()
+        self.escalations: Counter = Counter()
+        # path -> [count, total ms]
+        self.latencies: Dict[str, list] = {"small": [0, 0.0], "escalated": [0, 0.0], "large": [0, 0.0]}
+
+    def _record(self, path: str, started: float):
+        with self.lock:
+            entry = self.latencies[path]
+            entry[0] += 1
+            entry[1] += (time.time() - started) * 1000
+
+    def generate(
+        self,
+        text: str,
+        intent: str,
+        history_len: int,
+        run_small: Callable[[], Tuple[str, Optional[str]]],
+        run_large: Callable[[], str],
+        allow_small: bool = True
+    ) -> str:
+        """
+        Answer a turn. `run_small()` returns (text, finish_reason) from the small
+        model, `run_large()` the text of the 32B.
+        """
+        started = time.time()
+        model, reason = route(text, intent, history_len, self.max_complexity) if self.enabled and allow_small \
+            else ("large", "cascade_off")
+        with self.lock:
+            self.decisions[f"{model}:{reason}"] += 1
+
+        if model == "small":
+            answer, finish_reason = run_small()
+            failure = check_output(answer, finish_reason)
+            if failure is None:
+                self._record("small", started)
+                return answer
+            with self.lock:
+                self.escalations[failure] += 1
+            answer = run_large()
+            self._record("escalated", started)
+            return answer
+
+        answer = run_large()
+        self._record("large", started)
+        return answer
+
+    def get_stats(self) -> Dict:
+        """Routing decisions, escalation reasons and mean latency per path."""
+        with self.lock:
+            small_routed = sum(count for decision, count in self.decisions.items() if decision.startswith("small:"))
+            escalated = sum(self.escalations.values())
+            return {
+                "enabled": self.enabled,
+                "decisions": dict(self.decisions),
+                "escalations": dict(self.escalations),
+                "escalation_rate": round(escalated / small_routed, 3) if small_routed else 0.0,
+                "mean_latency_ms": {
+                    path: round(total / count, 1) if count else None
+                    for path, (count, total) in self.latencies.items()
+                }
+            }
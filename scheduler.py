@@ -0,0 +1,372 @@
+# scheduler.py - LLM Request Scheduling for Kounhany AI
+# The single Llama instance serves one generation at a time. Instead of letting
+# whichever thread gets the lock first go next, waiting generations are ordered
+# by priority lane, then by weighted fair queueing across users: each job gets a
+# virtual finish time (user's previous finish + expected length), so short jobs
+# go first and a user with many queued jobs only gets their fair share of the
+# model. Waiting time ages a job ahead within its lane so long answers are not starved.
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Priority lanes, most urgent first: a follow-up runs when no new conversation is
+# waiting, background jobs (warming, summaries) only when no live generation is
+# waiting. Aging orders jobs within a lane, and a live job waiting longer than
+# SCHEDULER_LANE_PROMOTION_SECONDS is promoted one lane up, so a steady stream of
+# new conversations cannot starve follow-ups.
+LANES = ["interactive", "follow_up", "background"]
+LANE_PRIORITY = {lane: priority for priority, lane in enumerate(LANES)}
+SCHEDULER_LANE_PROMOTION_SECONDS = float(os.environ.get("SCHEDULER_LANE_PROMOTION_SECONDS", "10"))
+
+# Expected tokens a job gains per second of waiting
+SCHEDULER_AGING_RATE = float(os.environ.get("SCHEDULER_AGING_RATE", "20"))
+# Generations a user may have waiting at once (more are refused)
+SCHEDULER_MAX_QUEUED_PER_USER = int(os.environ.get("SCHEDULER_MAX_QUEUED_PER_USER", "2"))
+# Users above this many expected tokens over the last USAGE_HALF_LIFE seconds are "heavy"
+SCHEDULER_HEAVY_USER_TOKENS = float(os.environ.get("SCHEDULER_HEAVY_USER_TOKENS", "3000"))
+USAGE_HALF_LIFE = 600.0
+USER_CLASSES = ["light", "heavy"]
+MAX_TRACKED_USERS = 10000
+
+# Output length priors per intent (tokens), refined with the observed lengths
+DEFAULT_OUTPUT_TOKENS = {
+    "greeting": 60,
+    "kounhany": 150,
+    "general": 180,
+    "obd_code": 250,
+    "technical": 300,
+    "summary": 120,
+}
+OUTPUT_EMA_WEIGHT = 0.2
+# Prompt tokens are evaluated in batches, much cheaper than generated ones
+PREFILL_WEIGHT = 0.05
+CHARS_PER_TOKEN = 4
+
+WAIT_SAMPLES = 500  # recent waits kept per lane for percentiles
+# How often a waiting cancellable job checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+class OutputLengthPredictor:
+    """Expected generation length per intent: a prior, then a moving average of the observed lengths."""
+
+    def __init__(self):
+        self.averages: Dict[str, float] = dict(DEFAULT_OUTPUT_TOKENS)
+        self.lock = threading.Lock()
+
+    def expected_cost(self, intent: str, prompt: str, max_tokens: int) -> float:
+        """Expected job size in generated-token units (prompt evaluation included)."""
+        with self.lock:
+            output_tokens = self.averages.get(intent, DEFAULT_OUTPUT_TOKENS["general"])
+        return min(output_tokens, max_tokens) + PREFILL_WEIGHT * len(prompt) / CHARS_PER_TOKEN
+
+    def observe(self, intent: str, output_tokens: int):
+        with self.lock:
+            average = self.averages.get(intent, DEFAULT_OUTPUT_TOKENS["general"])
+            self.averages[intent] = average + OUTPUT_EMA_WEIGHT * (output_tokens - average)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {intent: round(tokens, 1) for intent, tokens in self.averages.items()}
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+class QueueFull(Exception):
+    """A user already has SCHEDULER_MAX_QUEUED_PER_USER generations waiting."""
+
+class GenerationCancelled(Exception):
+    """A job was cancelled before it got the model."""
+
+class CancelToken:
+    """Cancellation flag of one generation, also usable as a llama.cpp stopping criterion."""
+    __slots__ = ("reason",)
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    def __call__(self, input_ids, logits) -> bool:
+        return self.reason is not None
+
+class ActiveGenerations:
+    """Latest live generation of each user, so that a new message supersedes the previous one."""
+
+    def __init__(self):
+        self.tokens: Dict[str, CancelToken] = {}
+        self.lock = threading.Lock()
+
+    def supersede(self, user_id: str) -> bool:
+        """Cancel the user's running generation, if any. Returns whether there was one."""
+        with self.lock:
+            token = self.tokens.pop(user_id, None)
+        if token is None:
+            return False
+        token.cancel("superseded")
+        return True
+
+    def start(self, user_id: str) -> CancelToken:
+        """Register a new generation of the user (superseding the previous one)."""
+        token = CancelToken()
+        with self.lock:
+            previous = self.tokens.get(user_id)
+            self.tokens[user_id] = token
+        if previous is not None:
+            previous.cancel("superseded")
+        return token
+
+    def finish(self, user_id: str, token: CancelToken):
+        with self.lock:
+            if self.tokens.get(user_id) is token:
+                del self.tokens[user_id]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+class _Waiter:
+    __slots__ = ("lane", "expected", "user_id", "user_class", "start", "finish", "enqueued", "seq", "event",
+                 "cancelled", "withdrawn")
+
+    def __init__(self, lane: str, expected: float, user_id: str, user_class: str, seq: int):
+        self.lane = lane
+        self.expected = expected
+        self.user_id = user_id
+        self.user_class = user_class
+        # Virtual start and finish times (weighted fair queueing tags)
+        self.start = 0.0
+        self.finish = 0.0
+        self.enqueued = time.time()
+        self.seq = seq
+        self.event = threading.Event()
+        self.cancelled: Optional[Callable[[], bool]] = None
+        # Woken without the model: cancelled while waiting
+        self.withdrawn = False
+
+class _UserState:
+    __slots__ = ("last_finish", "queued", "usage", "usage_updated")
+
+    def __init__(self, now: float):
+        self.last_finish = 0.0
+        self.queued = 0
+        self.usage = 0.0
+        self.usage_updated = now
+
+    def decayed_usage(self, now: float) -> float:
+        return self.usage * math.pow(0.5, (now - self.usage_updated) / USAGE_HALF_LIFE)
+
+class LLMScheduler:
+    """
+    Replacement for a plain lock around the model: `with scheduler.slot(lane, expected, user_id):`
+    blocks until the job is chosen. On release the slot is handed directly to the
+    waiting job with the lowest score, so no thread can barge in.
+    """
+
+    def __init__(
+        self,
+        aging_rate: float = SCHEDULER_AGING_RATE,
+        max_queued_per_user: int = SCHEDULER_MAX_QUEUED_PER_USER,
+        heavy_user_tokens: float = SCHEDULER_HEAVY_USER_TOKENS,
+        lane_promotion_seconds: float = SCHEDULER_LANE_PROMOTION_SECONDS
+    ):
+        self.aging_rate = aging_rate
+        self.lane_promotion_seconds = lane_promotion_seconds
+        self.max_queued_per_user = max_queued_per_user
+        self.heavy_user_tokens = heavy_user_tokens
+        self.busy = False
+        self.waiting: List[_Waiter] = []
+        self.seq = 0
+        self.virtual_time = 0.0
+        self.users: "OrderedDict[str, _UserState]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.waits = {lane: deque(maxlen=WAIT_SAMPLES) for lane in LANES}
+        self.served = {lane: 0 for lane in LANES}
+        self.class_waits = {user_class: deque(maxlen=WAIT_SAMPLES) for user_class in USER_CLASSES}
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _user(self, user_id: str, now: float) -> _UserState:
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = _UserState(now)
+            if len(self.users) > MAX_TRACKED_USERS:
+                oldest = next(iter(self.users))
+                if self.users[oldest].queued == 0:
+                    del self.users[oldest]
+        else:
+            self.users.move_to_end(user_id)
+        return state
+
+    def _score(self, waiter: _Waiter, now: float) -> tuple:
+        if waiter.lane == "background":
+            return (LANE_PRIORITY["background"], 0.0, waiter.seq)
+        waited = now - waiter.enqueued
+        priority = max(LANE_PRIORITY[waiter.lane] - int(waited // self.lane_promotion_seconds), 0)
+        aged = waiter.finish - self.aging_rate * waited
+        return (priority, aged, waiter.seq)
+
+    def _enqueue(self, lane: str, expected: float, user_id: str) -> _Waiter:
+        """Create the job and its fair queueing tags. Caller holds the lock."""
+        now = time.time()
+        self.seq += 1
+        if lane == "background" or not user_id:
+            waiter = _Waiter(lane, expected, None, None, self.seq)
+            waiter.start = self.virtual_time
+            waiter.finish = self.virtual_time + expected
+            return waiter
+
+        state = self._user(user_id, now)
+        if state.queued >= self.max_queued_per_user:
+            self.rejected += 1
+            raise QueueFull(f"{state.queued} generations already waiting for this user")
+        usage = state.decayed_usage(now)
+        user_class = "heavy" if usage > self.heavy_user_tokens else "light"
+        state.usage, state.usage_updated = usage + expected, now
+        state.queued += 1
+
+        waiter = _Waiter(lane, expected, user_id, user_class, self.seq)
+        waiter.start = max(self.virtual_time, state.last_finish)
+        waiter.finish = state.last_finish = waiter.start + expected
+        return waiter
+
+    def _remove(self, waiter: _Waiter):
+        """Take a cancelled job out of the queue and give back its fair share. Caller holds the lock."""
+        self.waiting.remove(waiter)
+        if waiter.user_id:
+            state = self.users[waiter.user_id]
+            state.queued -= 1
+            if state.last_finish == waiter.finish:
+                state.last_finish = waiter.start
+        waiter.withdrawn = True
+        self.cancelled += 1
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Remove a cancelled job from the queue. False if it was dispatched meanwhile."""
+        with self.lock:
+            if waiter.withdrawn:
+                return True
+            if waiter not in self.waiting:
+                return False
+            self._remove(waiter)
+            return True
+
+    def _acquire(self, lane: str, expected: float, user_id: str, cancelled: Optional[Callable[[], bool]]) -> _Waiter:
+        if lane not in LANES:
+            raise ValueError(f"Unknown scheduling lane: {lane}")
+        with self.lock:
+            waiter = self._enqueue(lane, expected, user_id)
+            waiter.cancelled = cancelled
+            if not self.busy and not self.waiting:
+                self._dispatch(waiter)
+            else:
+                self.waiting.append(waiter)
+        if cancelled is None:
+            waiter.event.wait()
+        else:
+            while not waiter.event.wait(CANCEL_POLL_SECONDS):
+                if cancelled() and self._withdraw(waiter):
+                    raise GenerationCancelled("Cancelled while waiting for the model")
+            if waiter.withdrawn:
+                # Skipped by _release: it was cancelled when its turn came
+                raise GenerationCancelled("Cancelled while waiting for the model")
+        wait = time.time() - waiter.enqueued
+        with self.lock:
+            self.waits[lane].append(wait)
+            self.served[lane] += 1
+            if waiter.user_class:
+                self.class_waits[waiter.user_class].append(wait)
+        return waiter
+
+    def _dispatch(self, waiter: _Waiter):
+        """Give the model to a job. Caller holds the lock."""
+        self.busy = True
+        if waiter.user_id:
+            self.users[waiter.user_id].queued -= 1
+        # Virtual time follows the start tag of the job in service
+        self.virtual_time = max(self.virtual_time, waiter.start)
+        waiter.event.set()
+
+    def _release(self):
+        with self.lock:
+            # Jobs cancelled since their last poll must not take the model: wake them empty-handed
+            for waiter in [waiter for waiter in self.waiting if waiter.cancelled and waiter.cancelled()]:
+                self._remove(waiter)
+                waiter.event.set()
+            if not self.waiting:
+                self.busy = False
+                return
+            now = time.time()
+            chosen = min(self.waiting, key=lambda waiter: self._score(waiter, now))
+            self.waiting.remove(chosen)
+            self._dispatch(chosen)  # the slot stays busy: handed over
+
+    @contextmanager
+    def slot(
+        self,
+        lane: str = "interactive",
+        expected: float = DEFAULT_OUTPUT_TOKENS["general"],
+        user_id: str = None,
+        cancelled: Optional[Callable[[], bool]] = None
+    ):
+        """
+        Hold the model for one generation. Raises QueueFull if the user has too many
+        waiting, GenerationCancelled if `cancelled()` turns true before the job starts
+        (it is also checked, under the scheduler lock, when the model is handed over).
+        """
+        self._acquire(lane, expected, user_id, cancelled)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def live_waiting(self) -> int:
+        """Live (non-background) generations waiting for the model."""
+        with self.lock:
+            return sum(1 for waiter in self.waiting if waiter.lane != "background")
+
+    def is_idle(self) -> bool:
+        with self.lock:
+            return not self.busy and not self.waiting
+
+    def get_stats(self) -> Dict:
+        """Queue depth per lane, wait-time percentiles (ms) per lane and per user class."""
+        with self.lock:
+            lanes = {}
+            for lane in LANES:
+                waits = list(self.waits[lane])
+                lanes[lane] = {
+                    "queued": sum(1 for waiter in self.waiting if waiter.lane == lane),
+                    "served": self.served[lane],
+                    "mean_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else None,
+                    "p95_wait_ms": round(percentile(waits, 0.95) * 1000, 1) if waits else None
+                }
+            user_classes = {}
+            for user_class in USER_CLASSES:
+                waits = list(self.class_waits[user_class])
+                user_classes[user_class] = {
+                    "queued": sum(1 for waiter in self.waiting if waiter.user_class == user_class),
+                    "p50_wait_ms": round(percentile(waits, 0.5) * 1000, 1) if waits else None,
+                    "p95_wait_ms": round(percentile(waits, 0.95) * 1000, 1) if waits else None,
+                    "p99_wait_ms": round(percentile(waits, 0.99) * 1000, 1) if waits else None
+                }
+            return {
+                "busy": self.busy,
+                "aging_rate": self.aging_rate,
+                "lane_promotion_seconds": self.lane_promotion_seconds,
+                "active_users": len({waiter.user_id for waiter in self.waiting if waiter.user_id}),
+                "rejected_queue_full": self.rejected,
+                "cancelled_while_waiting": self.cancelled,
+                "lanes": lanes,
+                "user_classes": user_classes
+            }
@@ -0,0 +1,451 @@
+# sessions.py - Conversation Session Store for Kounhany AI
+# Bounded replacement for the per-user conversation memory: compact message
+# records in a fixed-length deque per user, idle sessions expire after a TTL and
+# the least recently used sessions are evicted under a global memory cap.
+# Backends (SESSION_BACKEND):
+#   - "memory": in-process store, snapshotted to disk on shutdown and restored on start
+#   - "sqlite": shared SQLite database in WAL mode, for several uvicorn workers
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Tuple
+
+SESSION_MAX_MESSAGES = int(os.environ.get("SESSION_MAX_MESSAGES", "10"))    # messages kept per user
+SESSION_IDLE_TTL = int(os.environ.get("SESSION_IDLE_TTL", "7200"))          # seconds without activity
+SESSION_MAX_MB = float(os.environ.get("SESSION_MAX_MB", "64"))              # memory cap of all sessions
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")               # "memory" or "sqlite"
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "/workspace/ai/kounhany_sessions.db")
+# Where the in-process store is saved on shutdown ("" disables)
+SESSION_SNAPSHOT_PATH = os.environ.get("SESSION_SNAPSHOT_PATH", "/workspace/ai/sessions_snapshot.db")
+
+# Rough per-record overhead on top of the text (tuple, floats, deque slot)
+MESSAGE_OVERHEAD_BYTES = 120
+
+class Message(NamedTuple):
+    """One conversation message. `indicators` lists the dashboard lights detected on a photo."""
+    role: str
+    content: str
+    timestamp: float
+    indicators: Tuple[str, ...] = ()
+
+def message_size(message: Message) -> int:
+    """Approximate memory footprint of a message."""
+    return sys.getsizeof(message.content) + MESSAGE_OVERHEAD_BYTES + 60 * len(message.indicators)
+
+def summary_size(summary: str) -> int:
+    return sys.getsizeof(summary) if summary else 0
+
+class Session:
+    """Recent messages of a user, plus a running summary of the older ones."""
+    __slots__ = ("messages", "last_access", "size", "summary", "summary_until")
+
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.last_access = time.time()
+        self.size = 0
+        self.summary = ""
+        # Timestamp of the last message folded into the summary
+        self.summary_until = 0.0
+
+class SessionStore:
+    """
+    Thread-safe in-process session store.
+    Sessions are kept in LRU order (least recently used first) so that expiry
+    and eviction only ever look at the head of the dict.
+    """
+
+    def __init__(
+        self,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        idle_ttl: int = SESSION_IDLE_TTL,
+        max_bytes: int = int(SESSION_MAX_MB * 1024 * 1024)
+    ):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {"expired": 0, "evicted": 0}
+
+    def _drop(self, user_id: str) -> Session:
+        session = self.sessions.pop(user_id)
+        self.total_bytes -= session.size
+        return session
+
+    def _expire(self, now: float):
+        """Drop idle sessions, oldest first."""
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if now - session.last_access <= self.idle_ttl:
+                break
+            self._drop(user_id)
+            self.stats["expired"] += 1
+
+    def _evict(self, keep: str):
+        """Drop least recently used sessions until under the memory cap."""
+        while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+            user_id = next(iter(self.sessions))
+            if user_id == keep:
+                break
+            self._drop(user_id)
+            self.stats["evicted"] += 1
+
+    def _get(self, user_id: str, now: float):
+        session = self.sessions.get(user_id)
+        if session is not None and now - session.last_access > self.idle_ttl:
+            self._drop(user_id)
+            self.stats["expired"] += 1
+            return None
+        return session
+
+    def get_history(self, user_id: str) -> List[Message]:
+        """Messages of a user, oldest first (empty if none or expired)."""
+        now = time.time()
+        with self.lock:
+            session = self._get(user_id, now)
+            if session is None:
+                return []
+            session.last_access = now
+            self.sessions.move_to_end(user_id)
+            return list(session.messages)
+
+    def has_history(self, user_id: str) -> bool:
+        """Whether the user has an active conversation."""
+        with self.lock:
+            session = self._get(user_id, time.time())
+            return bool(session and session.messages)
+
+    def append(self, user_id: str, messages: List[Message]):
+        """Append the messages of a turn in one locked operation."""
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            session = self.sessions.get(user_id)
+            if session is None:
+                session = self.sessions[user_id] = Session(self.max_messages)
+            for message in messages:
+                if len(session.messages) == session.messages.maxlen:
+                    dropped = message_size(session.messages[0])
+                    session.size -= dropped
+                    self.total_bytes -= dropped
+                session.messages.append(message)
+                session.size += message_size(message)
+                self.total_bytes += message_size(message)
+            session.last_access = now
+            self.sessions.move_to_end(user_id)
+            self._evict(keep=user_id)
+
+    def add_turn(self, user_id: str, user_content: str, assistant_content: str, indicators: List[str] = ()):
+        """Store a user message and the assistant answer."""
+        now = time.time()
+        self.append(user_id, [
+            Message("user", user_content, now, tuple(indicators)),
+            Message("assistant", assistant_content, now)
+        ])
+
+    def get_summary(self, user_id: str) -> Tuple[str, float]:
+        """Running summary of a user's older messages and the timestamp it covers up to."""
+        with self.lock:
+            session = self._get(user_id, time.time())
+            if session is None:
+                return "", 0.0
+            return session.summary, session.summary_until
+
+    def set_summary(self, user_id: str, summary: str, until: float) -> bool:
+        """Replace the running summary (ignored if a newer one is already stored). Returns whether it was stored."""
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None or until <= session.summary_until:
+                return False
+            delta = summary_size(summary) - summary_size(session.summary)
+            session.summary, session.summary_until = summary, until
+            session.size += delta
+            self.total_bytes += delta
+            return True
+
+    def clear(self, user_id: str) -> bool:
+        """Forget a user's conversation. Returns whether there was one."""
+        with self.lock:
+            if user_id not in self.sessions:
+                return False
+            self._drop(user_id)
+            return True
+
+    def snapshot(self, path: str = SESSION_SNAPSHOT_PATH) -> int:
+        """Save every live session to a SQLite file (same schema as the sqlite backend)."""
+        with self.lock:
+            self._expire(time.time())
+            sessions = [
+                (user_id, session.last_access, session.summary, session.summary_until, list(session.messages))
+                for user_id, session in self.sessions.items()
+            ]
+
+        conn = _connect(path)
+        try:
+            with conn:
+                conn.execute('DELETE FROM session_messages')
+                conn.execute('DELETE FROM sessions')
+                conn.executemany('INSERT INTO sessions (user_id, last_access, summary, summary_until) VALUES (?, ?, ?, ?)',
+                                 [session[:4] for session in sessions])
+                conn.executemany(
+                    'INSERT INTO session_messages (user_id, role, content, timestamp, indicators) VALUES (?, ?, ?, ?, ?)',
+                    [_message_row(user_id, message) for user_id, *_, messages in sessions for message in messages]
+                )
+        finally:
+            conn.close()
+        return len(sessions)
+
+    def restore(self, path: str = SESSION_SNAPSHOT_PATH) -> int:
+        """Load the sessions of a snapshot that have not expired since. Returns how many."""
+        if not os.path.exists(path):
+            return 0
+        conn = _connect(path)
+        try:
+            cutoff = time.time() - self.idle_ttl
+            sessions = conn.execute(
+                'SELECT user_id, last_access, summary, summary_until FROM sessions WHERE last_access > ? ORDER BY last_access',
+                (cutoff,)
+            ).fetchall()
+            rows = conn.execute('''
+                SELECT m.user_id, m.role, m.content, m.timestamp, m.indicators
+                FROM session_messages m JOIN sessions s ON s.user_id = m.user_id
+                WHERE s.last_access > ?
+                ORDER BY m.id
+            ''', (cutoff,)).fetchall()
+        finally:
+            conn.close()
+
+        messages: Dict[str, List[Message]] = {}
+        for row in rows:
+            messages.setdefault(row[0], []).append(_row_message(row[1:]))
+        for user_id, last_access, summary, summary_until in sessions:
+            self.append(user_id, messages.get(user_id, []))
+            if summary:
+                self.set_summary(user_id, summary, summary_until)
+            with self.lock:
+                self.sessions[user_id].last_access = last_access
+        return len(sessions)
+
+    def get_stats(self) -> Dict:
+        """Number of sessions, memory used and expiry/eviction counts."""
+        with self.lock:
+            self._expire(time.time())
+            return {
+                "backend": "memory",
+                "sessions": len(self.sessions),
+                "messages": sum(len(session.messages) for session in self.sessions.values()),
+                "memory_mb": round(self.total_bytes / (1024 * 1024), 3),
+                "max_memory_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "expired": self.stats["expired"],
+                "evicted": self.stats["evicted"]
+            }
+
+# ========== SQLITE BACKEND ==========
+def _connect(path: str) -> sqlite3.Connection:
+    """Open a session database in WAL mode (concurrent readers, one writer at a time)."""
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id TEXT PRIMARY KEY,
+            last_access REAL NOT NULL,
+            summary TEXT,
+            summary_until REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    # Databases created before running summaries existed
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+    if "summary" not in columns:
+        conn.execute('ALTER TABLE sessions ADD COLUMN summary TEXT')
+        conn.execute('ALTER TABLE sessions ADD COLUMN summary_until REAL NOT NULL DEFAULT 0')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            indicators TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_session_messages_user ON session_messages(user_id, id)')
+    return conn
+
+def _message_row(user_id: str, message: Message) -> tuple:
+    return (user_id, message.role, message.content, message.timestamp, ",".join(message.indicators) or None)
+
+def _row_message(row) -> Message:
+    role, content, timestamp, indicators = row
+    return Message(role, content, timestamp, tuple(indicators.split(",")) if indicators else ())
+
+class SqliteSessionStore:
+    """
+    Session store shared by every worker process through one SQLite database in WAL mode.
+    Same interface as SessionStore; a turn is one read and one write transaction.
+    """
+
+    # Idle sessions are purged at most this often (seconds)
+    PURGE_INTERVAL = 60
+    # Reads refresh last_access at most this often per session (seconds), instead of writing on every read
+    TOUCH_INTERVAL = 30
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        max_messages: int = SESSION_MAX_MESSAGES,
+        idle_ttl: int = SESSION_IDLE_TTL
+    ):
+        self.path = path
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.local = threading.local()
+        self.last_purge = 0.0
+        _connect(path).close()  # create the schema once
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread, reused across requests."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = _connect(self.path)
+        return conn
+
+    def get_history(self, user_id: str) -> List[Message]:
+        """Messages of a user, oldest first (empty if none or expired)."""
+        conn = self._conn()
+        now = time.time()
+        rows = conn.execute('''
+            SELECT m.role, m.content, m.timestamp, m.indicators, s.last_access
+            FROM session_messages m JOIN sessions s ON s.user_id = m.user_id
+            WHERE m.user_id = ? AND s.last_access > ?
+            ORDER BY m.id
+        ''', (user_id, now - self.idle_ttl)).fetchall()
+        if rows and now - rows[0][4] > self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute('UPDATE sessions SET last_access = ? WHERE user_id = ?', (now, user_id))
+        return [_row_message(row[:4]) for row in rows]
+
+    def has_history(self, user_id: str) -> bool:
+        """Whether the user has an active conversation."""
+        row = self._conn().execute(
+            'SELECT 1 FROM sessions WHERE user_id = ? AND last_access > ?', (user_id, time.time() - self.idle_ttl)
+        ).fetchone()
+        return row is not None
+
+    def append(self, user_id: str, messages: List[Message]):
+        """Append the messages of a turn and trim the session, in one transaction."""
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            # An expired session is not revived: start over if the periodic purge has not run yet
+            cutoff = now - self.idle_ttl
+            conn.execute(
+                'DELETE FROM session_messages WHERE user_id = ? AND user_id IN '
+                '(SELECT user_id FROM sessions WHERE user_id = ? AND last_access <= ?)',
+                (user_id, user_id, cutoff)
+            )
+            conn.execute('DELETE FROM sessions WHERE user_id = ? AND last_access <= ?', (user_id, cutoff))
+            conn.execute(
+                'INSERT INTO sessions (user_id, last_access) VALUES (?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET last_access = excluded.last_access',
+                (user_id, now)
+            )
+            conn.executemany(
+                'INSERT INTO session_messages (user_id, role, content, timestamp, indicators) VALUES (?, ?, ?, ?, ?)',
+                [_message_row(user_id, message) for message in messages]
+            )
+            conn.execute('''
+                DELETE FROM session_messages
+                WHERE user_id = ? AND id NOT IN (
+                    SELECT id FROM session_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                )
+            ''', (user_id, user_id, self.max_messages))
+        if now - self.last_purge > self.PURGE_INTERVAL:
+            self.purge_expired()
+
+    def add_turn(self, user_id: str, user_content: str, assistant_content: str, indicators: List[str] = ()):
+        """Store a user message and the assistant answer."""
+        now = time.time()
+        self.append(user_id, [
+            Message("user", user_content, now, tuple(indicators)),
+            Message("assistant", assistant_content, now)
+        ])
+
+    def get_summary(self, user_id: str) -> Tuple[str, float]:
+        """Running summary of a user's older messages and the timestamp it covers up to."""
+        row = self._conn().execute(
+            'SELECT summary, summary_until FROM sessions WHERE user_id = ? AND last_access > ?',
+            (user_id, time.time() - self.idle_ttl)
+        ).fetchone()
+        return (row[0] or "", row[1]) if row else ("", 0.0)
+
+    def set_summary(self, user_id: str, summary: str, until: float) -> bool:
+        """Replace the running summary (ignored if a newer one is already stored). Returns whether it was stored."""
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                'UPDATE sessions SET summary = ?, summary_until = ? WHERE user_id = ? AND summary_until < ?',
+                (summary, until, user_id, until)
+            ).rowcount > 0
+
+    def purge_expired(self) -> int:
+        """Delete sessions idle for longer than the TTL. Returns how many."""
+        conn = self._conn()
+        self.last_purge = time.time()
+        cutoff = self.last_purge - self.idle_ttl
+        with conn:
+            conn.execute(
+                'DELETE FROM session_messages WHERE user_id IN (SELECT user_id FROM sessions WHERE last_access <= ?)',
+                (cutoff,)
+            )
+            return conn.execute('DELETE FROM sessions WHERE last_access <= ?', (cutoff,)).rowcount
+
+    def clear(self, user_id: str) -> bool:
+        """Forget a user's conversation. Returns whether there was one."""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM session_messages WHERE user_id = ?', (user_id,))
+            return conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount > 0
+
+    def snapshot(self, path: str = None) -> int:
+        """Nothing to do: every turn is already on disk."""
+        return 0
+
+    def restore(self, path: str = None) -> int:
+        """Nothing to do: sessions survive restarts in the database."""
+        return 0
+
+    def get_stats(self) -> Dict:
+        """Number of live sessions and stored messages, database size."""
+        conn = self._conn()
+        cutoff = time.time() - self.idle_ttl
+        sessions = conn.execute('SELECT COUNT(*) FROM sessions WHERE last_access > ?', (cutoff,)).fetchone()[0]
+        messages = conn.execute('SELECT COUNT(*) FROM session_messages').fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "messages": messages,
+            "db_size_mb": round(os.path.getsize(self.path) / (1024 * 1024), 3) if os.path.exists(self.path) else 0.0
+        }
+
+def load_session_store(backend: str = SESSION_BACKEND):
+    """Instantiate the configured session backend (restoring the in-process snapshot if any)."""
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend == "memory":
+        store = SessionStore()
+        if SESSION_SNAPSHOT_PATH:
+            try:
+                restored = store.restore()
+                if restored:
+                    print(f"✅ Restored {restored} conversation sessions from snapshot")
+            except sqlite3.Error as e:
+                print(f"Session snapshot restore error: {e}")
+        return store
+    raise ValueError(f"Unknown session backend: {backend}")
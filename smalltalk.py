@@ -0,0 +1,82 @@
+# smalltalk.py - Template Answers for Greetings, Thanks and Farewells
+# A plain "salut" or "merci" does not need a 32B generation: messages made only
+# of small-talk words are answered instantly from localized templates, with a
+# little variation (random choice, time of day, "ça va ?").
+
+import random
+import re
+from datetime import datetime
+from typing import Optional
+
+SMALL_TALK_INTENTS = ("greeting", "thanks", "farewell")
+SMALL_TALK_MAX_WORDS = 8
+EVENING_HOUR = 18
+
+# Words a pure small-talk message may contain; anything else needs a real answer
+SMALL_TALK_WORDS = {
+    # greetings
+    "bonjour", "bonsoir", "salut", "coucou", "hello", "hi", "hey", "yo", "wesh", "salam", "hola",
+    # thanks
+    "merci", "thanks", "thank", "you", "thx", "remercie", "je", "vous", "te", "beaucoup", "bien",
+    "infiniment", "mille", "fois", "encore",
+    # farewells
+    "au", "revoir", "bye", "goodbye", "ciao", "adieu", "à", "a", "bientôt", "bientot", "plus", "demain",
+    "bonne", "journée", "journee", "soirée", "soiree", "nuit", "route",
+    # fillers
+    "ça", "ca", "va", "et", "toi", "tout", "le", "monde", "ok", "d'accord", "super", "top", "parfait",
+    "cool", "kounhany", "l'équipe", "équipe", "mon", "ami", "cher", "chère",
+}
+
+TEMPLATES = {
+    "greeting": [
+        "Bonjour ! Comment puis-je vous aider ?",
+        "Bonjour ! Que puis-je faire pour votre véhicule aujourd'hui ?",
+        "Bonjour ! Une question sur votre voiture ou sur Kounhany ?",
+    ],
+    "greeting_evening": [
+        "Bonsoir ! Comment puis-je vous aider ?",
+        "Bonsoir ! Que puis-je faire pour votre véhicule ?",
+    ],
+    "thanks": [
+        "Avec plaisir ! N'hésitez pas si vous avez d'autres questions.",
+        "Je vous en prie ! Je reste disponible pour votre véhicule.",
+        "De rien ! Bonne route 🚗",
+    ],
+    "farewell": [
+        "Au revoir et bonne route ! 🚗",
+        "À bientôt ! N'hésitez pas à revenir si besoin.",
+        "Bonne journée et prudence sur la route !",
+    ],
+    "farewell_evening": [
+        "Au revoir et bonne soirée ! 🚗",
+        "À bientôt ! Bonne soirée et prudence sur la route.",
+    ],
+}
+
+def message_words(text: str):
+    return re.findall(r"[\w'’-]+", text.lower().replace("’", "'"))
+
+def is_small_talk(text: str, intent: str) -> bool:
+    """Whether a message is only a greeting, thanks or farewell (nothing else to answer)."""
+    if intent not in SMALL_TALK_INTENTS:
+        return False
+    words = message_words(text)
+    return 0 < len(words) <= SMALL_TALK_MAX_WORDS and all(word in SMALL_TALK_WORDS for word in words)
+
+def template_response(text: str, intent: str, now: Optional[datetime] = None, rng=random) -> Optional[str]:
+    """Instant answer to a pure greeting/thanks/farewell, None when the message needs the normal path."""
+    if not is_small_talk(text, intent):
+        return None
+    now = now or datetime.now()
+    words = message_words(text)
+    evening = "bonsoir" in words or now.hour >= EVENING_HOUR
+
+    key = intent
+    if intent in ("greeting", "farewell") and evening and f"{intent}_evening" in TEMPLATES:
+        key = f"{intent}_evening"
+    answer = rng.choice(TEMPLATES[key])
+
+    # "salut, ça va ?" deserves an answer to the question too
+    if intent == "greeting" and "va" in words:
+        answer = "Très bien, merci ! " + answer.split("! ", 1)[-1]
+    return answer
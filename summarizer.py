@@ -0,0 +1,155 @@
+# summarizer.py - Rolling Conversation Summaries for Kounhany AI
+# Prompts carry only the most recent messages of a session verbatim; older turns
+# are folded incrementally into a short running summary per session, so prompt
+# size stays flat however long the diagnostic goes on. Summaries are generated
+# on a background thread after the answer was sent, only while the LLM is idle,
+# and give the model back at the next token as soon as a live request waits.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from sessions import Message
+
+SUMMARY_ENABLED = os.environ.get("SUMMARY_ENABLED", "1") == "1"
+SUMMARY_RECENT_MESSAGES = int(os.environ.get("SUMMARY_RECENT_MESSAGES", "4"))  # kept verbatim in prompts
+SUMMARY_MAX_TOKENS = int(os.environ.get("SUMMARY_MAX_TOKENS", "160"))
+SUMMARY_MAX_CHARS = 900
+IDLE_POLL_SECONDS = 0.5
+
+SUMMARY_SYSTEM_PROMPT = """Tu résumes une conversation entre un client et Kounhany AI, assistant automobile.
+Mets à jour le résumé existant avec les nouveaux échanges, en français, 5 phrases maximum.
+Garde uniquement les faits utiles pour la suite: véhicule (marque, modèle, année, kilométrage), symptômes, voyants et codes OBD, diagnostics et conseils déjà donnés, questions encore ouvertes.
+Réponds uniquement avec le résumé."""
+
+def messages_to_fold(history: List[Message], summary_until: float, recent: int = SUMMARY_RECENT_MESSAGES) -> List[Message]:
+    """Messages older than the recent window that the summary does not cover yet."""
+    older = history[:len(history) - recent] if recent > 0 else history
+    return [message for message in older if message.timestamp > summary_until]
+
+def build_summary_prompt(summary: str, messages: List[Message]) -> str:
+    """Qwen2.5 chat prompt asking for the updated summary."""
+    exchanges = "\n".join(
+        f"{'Client' if message.role == 'user' else 'Assistant'}: {message.content}" for message in messages
+    )
+    return (
+        f"<|im_start|>system\n{SUMMARY_SYSTEM_PROMPT}<|im_end|>\n"
+        f"<|im_start|>user\nRésumé actuel:\n{summary or '(aucun)'}\n\n"
+        f"Nouveaux échanges:\n{exchanges}<|im_end|>\n"
+        f"<|im_start|>assistant\n"
+    )
+
+def clean_summary(text: str, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Trim a generated summary to full sentences within max_chars."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    text = text[:max_chars]
+    last_period = text.rfind(".")
+    return text[:last_period + 1] if last_period > max_chars // 2 else text
+
+class SessionSummarizer:
+    """
+    Background summarizer for a session store.
+
+    `generate(prompt, stopping_criteria)` runs the LLM and returns the raw text,
+    `is_idle()` tells whether the model is free and `should_yield()` whether a
+    live request is waiting for it (checked after every generated token).
+    """
+
+    def __init__(
+        self,
+        store,
+        generate: Callable[[str, List], str],
+        is_idle: Callable[[], bool],
+        should_yield: Callable[[], bool],
+        recent: int = SUMMARY_RECENT_MESSAGES
+    ):
+        self.store = store
+        self.generate = generate
+        self.is_idle = is_idle
+        self.should_yield = should_yield
+        self.recent = recent
+        # Users with turns to fold, oldest request first (a user is queued once)
+        self.pending: "OrderedDict[str, None]" = OrderedDict()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"generated": 0, "aborted": 0, "failed": 0, "last_generation_ms": None}
+
+    def schedule(self, user_id: str):
+        """Queue a session for summarization once the model is idle."""
+        if self.thread is None:
+            return
+        with self.condition:
+            self.pending[user_id] = None
+            self.condition.notify()
+
+    def summarize(self, user_id: str) -> bool:
+        """
+        Fold the session's older unsummarized messages into its summary.
+        Returns False when generation was interrupted by live traffic (retry later).
+        """
+        summary, summary_until = self.store.get_summary(user_id)
+        messages = messages_to_fold(self.store.get_history(user_id), summary_until, self.recent)
+        if not messages:
+            return True
+
+        interrupted = []
+
+        def yield_to_live(input_ids, logits):
+            if self.should_yield():
+                interrupted.append(True)
+                return True
+            return False
+
+        started = time.time()
+        text = self.generate(build_summary_prompt(summary, messages), [yield_to_live])
+        if interrupted:
+            # The partial summary is discarded
+            self.stats["aborted"] += 1
+            return False
+
+        self.stats["generated"] += 1
+        self.stats["last_generation_ms"] = round((time.time() - started) * 1000, 1)
+        text = clean_summary(text)
+        if text:
+            self.store.set_summary(user_id, text, messages[-1].timestamp)
+        return True
+
+    def _wait_for_idle(self):
+        while not self.is_idle():
+            time.sleep(IDLE_POLL_SECONDS)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                user_id, _ = self.pending.popitem(last=False)
+
+            self._wait_for_idle()
+            try:
+                done = self.summarize(user_id)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Session summary error: {e}")
+                continue
+            if not done:
+                with self.condition:
+                    self.pending.setdefault(user_id, None)
+
+    def start(self) -> Optional[threading.Thread]:
+        """Start the summarizer daemon thread (no-op when SUMMARY_ENABLED=0)."""
+        if not SUMMARY_ENABLED or self.thread is not None:
+            return self.thread
+        self.thread = threading.Thread(target=self._run, name="session-summarizer", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def get_stats(self) -> Dict:
+        """Queue length and generated/aborted/failed counts."""
+        with self.condition:
+            pending = len(self.pending)
+        return {"enabled": self.thread is not None, "pending": pending, **self.stats}
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from scheduler import LLMScheduler
+
+def test_follow_up_not_starved_by_interactive_stream():
+    """A follow-up waiting behind a continuous stream of new conversations gets the model once promoted."""
+    scheduler = LLMScheduler(lane_promotion_seconds=0.2, max_queued_per_user=100)
+    started = {}
+    stop = threading.Event()
+
+    interactive_waiting = []
+
+    def job(name, lane, user_id, hold=0.02):
+        with scheduler.slot(lane, 50, user_id):
+            started.setdefault(name, time.time())
+            if lane == "follow_up":
+                interactive_waiting.append(scheduler.get_stats()["lanes"]["interactive"]["queued"])
+            time.sleep(hold)
+
+    def interactive_stream():
+        # New conversations arrive faster than they are served, so the interactive lane is never empty
+        index = 0
+        while not stop.is_set():
+            threading.Thread(target=job, args=(f"new-{index}", "interactive", f"user-{index}")).start()
+            index += 1
+            time.sleep(0.01)
+
+    stream = threading.Thread(target=interactive_stream)
+    stream.start()
+    time.sleep(0.1)
+    queued_at = time.time()
+    follow_up = threading.Thread(target=job, args=("follow-up", "follow_up", "returning-user"))
+    follow_up.start()
+    follow_up.join(timeout=2.0)
+    stop.set()
+    stream.join()
+
+    assert "follow-up" in started
+    assert started["follow-up"] - queued_at < 0.6
+    # New conversations were still waiting when the follow-up ran: it was promoted, not served on an empty lane
+    assert interactive_waiting[0] > 0
+
+def test_live_lanes_ordered_before_promotion():
+    """Without a long wait, a new conversation goes before a shorter follow-up."""
+    scheduler = LLMScheduler(lane_promotion_seconds=60)
+    order = []
+
+    def job(name, lane, expected, user_id, hold=0.0):
+        with scheduler.slot(lane, expected, user_id):
+            order.append(name)
+            time.sleep(hold)
+
+    first = threading.Thread(target=job, args=("first", "interactive", 10, "a", 0.2))
+    first.start()
+    time.sleep(0.05)
+    waiters = [
+        threading.Thread(target=job, args=("follow-up", "follow_up", 5, "b")),
+        threading.Thread(target=job, args=("background", "background", 5, None)),
+        threading.Thread(target=job, args=("new", "interactive", 500, "c")),
+    ]
+    for thread in waiters:
+        thread.start()
+        time.sleep(0.01)
+    for thread in [first, *waiters]:
+        thread.join()
+    assert order == ["first", "new", "follow-up", "background"]
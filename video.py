@@ -0,0 +1,218 @@
+# video.py - Multi-frame Dashboard Analysis for Kounhany AI
+# At ignition every warning light comes on for a bulb check, then the healthy
+# ones go out: a short clip tells which lights really stay on. The frame budget
+# is spread over the whole clip, the last frame is always analyzed (it tells
+# which lights stayed on), and near-identical frames are skipped with a cheap
+# thumbnail difference, so detector cost grows with visual change, not with clip length.
+
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from vision import decode_image, resize_for_detector
+
+SUPPORTED_VIDEO_FORMATS = ["mp4", "mov", "webm", "avi", "mkv", "3gp"]
+
+VIDEO_SAMPLE_INTERVAL = float(os.environ.get("VIDEO_SAMPLE_INTERVAL", "0.25"))  # seconds, fastest sampling
+VIDEO_MAX_SAMPLE_INTERVAL = float(os.environ.get("VIDEO_MAX_SAMPLE_INTERVAL", "2.0"))  # seconds, static scenes
+VIDEO_MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", "24"))  # frames sent to the detector per clip
+VIDEO_MAX_SECONDS = float(os.environ.get("VIDEO_MAX_SECONDS", "60"))  # longer clips are refused
+VIDEO_MAX_UPLOAD_MB = float(os.environ.get("VIDEO_MAX_UPLOAD_MB", "50"))  # clip or whole photo burst
+# Share of thumbnail pixels that must change for a frame to count as new. A warning
+# light going out only changes a few pixels, so a mean difference would miss it.
+VIDEO_CHANGE_RATIO = float(os.environ.get("VIDEO_CHANGE_RATIO", "0.002"))
+PIXEL_CHANGE_THRESHOLD = 24  # gray levels
+
+THUMBNAIL_SIZE = (128, 96)
+
+def frame_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Small grayscale version of a frame used for change detection."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+class FrameSampler:
+    """
+    Keeps frames that differ from the last kept one. The sampling interval doubles
+    while the scene is static (up to max_interval) and resets on change.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = VIDEO_SAMPLE_INTERVAL,
+        max_interval: float = VIDEO_MAX_SAMPLE_INTERVAL,
+        change_ratio: float = VIDEO_CHANGE_RATIO,
+        max_frames: int = VIDEO_MAX_FRAMES
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_ratio = change_ratio
+        self.max_frames = max_frames
+        self.interval = min_interval
+        self.last_thumbnail: Optional[np.ndarray] = None
+        self.frames: List[Tuple[float, np.ndarray]] = []
+        self.examined = 0
+        self.skipped = 0
+
+    @property
+    def full(self) -> bool:
+        # One frame of the budget is kept for the end of the clip (see finish)
+        return len(self.frames) >= self.max_frames - 1
+
+    def offer(self, timestamp: float, frame: np.ndarray) -> bool:
+        """Examine a frame; keep it if the scene changed. Returns True when kept."""
+        self.examined += 1
+        thumbnail = frame_thumbnail(frame)
+        if self.last_thumbnail is not None:
+            changed = np.count_nonzero(np.abs(thumbnail - self.last_thumbnail) > PIXEL_CHANGE_THRESHOLD)
+            if changed < self.change_ratio * thumbnail.size:
+                self.skipped += 1
+                self.interval = min(self.interval * 2, self.max_interval)
+                return False
+        self.interval = self.min_interval
+        self.last_thumbnail = thumbnail
+        self.frames.append((timestamp, resize_for_detector(frame)))
+        return True
+
+    def finish(self, timestamp: float, frame: np.ndarray):
+        """Keep the final frame (the lights still on at the end), changed or not."""
+        if self.frames and self.frames[-1][0] >= timestamp:
+            return
+        self.examined += 1
+        self.frames.append((timestamp, resize_for_detector(frame)))
+
+def spread_sampler(duration: float, max_frames: int = VIDEO_MAX_FRAMES) -> FrameSampler:
+    """A sampler whose fastest interval spreads the frame budget over the whole clip."""
+    min_interval = max(VIDEO_SAMPLE_INTERVAL, duration / max(max_frames - 2, 1))
+    return FrameSampler(min_interval, max(VIDEO_MAX_SAMPLE_INTERVAL, min_interval), max_frames=max_frames)
+
+def sample_video(path: str, sampler: Optional[FrameSampler] = None) -> Tuple[List[Tuple[float, np.ndarray]], Dict]:
+    """
+    Sample the frames of a video file worth running the detector on, always including the last one.
+    Frames between samples are only grabbed (demuxed/decoded), never converted or compared.
+    Raises ValueError for unreadable clips and clips longer than VIDEO_MAX_SECONDS.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Unsupported or corrupted video file")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    too_long = f"Video too long: send a clip of at most {VIDEO_MAX_SECONDS:.0f} seconds"
+    if frame_count > 0 and (frame_count - 1) / fps > VIDEO_MAX_SECONDS:
+        capture.release()
+        raise ValueError(too_long)
+    # Without a frame count (some webm files) the budget is spread over the longest accepted clip
+    sampler = sampler or spread_sampler((frame_count - 1) / fps if frame_count > 0 else VIDEO_MAX_SECONDS)
+    last_index = frame_count - 1 if frame_count > 0 else None
+
+    frame_index, next_sample, timestamp = 0, 0.0, 0.0
+    last_frame: Optional[Tuple[float, np.ndarray]] = None
+    try:
+        while capture.grab():
+            timestamp = frame_index / fps
+            is_last = frame_index == last_index
+            frame_index += 1
+            if timestamp > VIDEO_MAX_SECONDS:
+                raise ValueError(too_long)
+            sample = timestamp >= next_sample and not sampler.full
+            # With an unknown frame count, any frame may turn out to be the last one
+            if not (sample or is_last or last_index is None):
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            last_frame = (timestamp, frame)
+            if sample:
+                sampler.offer(timestamp, frame)
+                next_sample = timestamp + sampler.interval
+        if frame_index and (last_frame is None or last_frame[0] < timestamp):
+            # The container announced more frames than it had: seek back to the real last one
+            capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index - 1)
+            ok, frame = capture.read()
+            if ok:
+                last_frame = (timestamp, frame)
+    finally:
+        capture.release()
+
+    if last_frame is not None:
+        sampler.finish(*last_frame)
+    return sampler.frames, {
+        "duration_seconds": round(last_frame[0], 2) if last_frame else 0.0,
+        "frames_examined": sampler.examined,
+        "frames_skipped": sampler.skipped,
+        "frames_analyzed": len(sampler.frames)
+    }
+
+def sample_video_bytes(video_bytes: bytes, extension: str = "mp4") -> Tuple[List[Tuple[float, np.ndarray]], Dict]:
+    """sample_video for an uploaded clip (OpenCV needs a file to read from)."""
+    with tempfile.NamedTemporaryFile(suffix=f".{extension}") as video_file:
+        video_file.write(video_bytes)
+        video_file.flush()
+        return sample_video(video_file.name)
+
+def sample_image_sequence(images: List[bytes], sampler: Optional[FrameSampler] = None) -> Tuple[List[Tuple[float, np.ndarray]], Dict]:
+    """Same as sample_video for a burst of photos (timestamps are the photo positions)."""
+    sampler = sampler or FrameSampler()
+    if not images:
+        return [], {"duration_seconds": 0.0, "frames_examined": 0, "frames_skipped": 0, "frames_analyzed": 0}
+    # Spread the budget over the whole burst: evenly spaced photos, the last one always included
+    last = len(images) - 1
+    indices = sorted({round(position) for position in np.linspace(0, last, min(len(images), sampler.max_frames))})
+    for index in indices[:-1]:
+        sampler.offer(float(index), decode_image(images[index]))
+    sampler.finish(float(last), decode_image(images[last]))
+
+    return sampler.frames, {
+        "duration_seconds": float(last),
+        "frames_examined": sampler.examined,
+        "frames_skipped": sampler.skipped,
+        "frames_analyzed": len(sampler.frames)
+    }
+
+def aggregate_timeline(timeline: List[Tuple[float, List[dict]]], end_time: float) -> List[dict]:
+    """
+    Aggregate per-frame detections into indicator presence over time.
+    Each kept frame stands for the time until the next kept frame (skipped frames were identical).
+    Returns one entry per indicator, lights still on at the end first.
+    """
+    if not timeline:
+        return []
+
+    timestamps = [timestamp for timestamp, _ in timeline]
+    span = max(end_time - timestamps[0], 1e-6)
+    last_index = len(timeline) - 1
+
+    indicators: Dict[str, dict] = {}
+    for index, (timestamp, detections) in enumerate(timeline):
+        frame_end = timestamps[index + 1] if index + 1 < len(timeline) else end_time
+        frame_duration = max(frame_end - timestamp, 0.0)
+        for detection in detections:
+            entry = indicators.setdefault(detection["class"], {
+                "class": detection["class"],
+                "first_seen": timestamp,
+                "last_seen": timestamp,
+                "frames": 0,
+                "seconds_on": 0.0,
+                "max_confidence": 0.0,
+                "still_on": False
+            })
+            entry["last_seen"] = timestamp
+            entry["frames"] += 1
+            entry["seconds_on"] += frame_duration
+            entry["max_confidence"] = max(entry["max_confidence"], detection["confidence"])
+            # Seen on the last kept frame = still on at the end of the clip
+            if index == last_index:
+                entry["still_on"] = True
+
+    results = []
+    for entry in indicators.values():
+        entry["presence"] = round(min(entry["seconds_on"] / span, 1.0), 3) if len(timeline) > 1 else 1.0
+        entry["seconds_on"] = round(entry["seconds_on"], 2)
+        entry["first_seen"] = round(entry["first_seen"], 2)
+        entry["last_seen"] = round(entry["last_seen"], 2)
+        results.append(entry)
+
+    return sorted(results, key=lambda entry: (not entry["still_on"], -entry["presence"], -entry["max_confidence"]))
@@ -0,0 +1,230 @@
+# vision.py - Image Decoding and Inference Batching for the Dashboard Indicator Detector (Kounhany AI)
+# Goes straight from encoded bytes to the BGR array the detector expects,
+# decoding large JPEGs at reduced resolution (the model only sees 640px anyway),
+# rejects unusable photos with a cheap quality check before any detector pass,
+# and groups concurrent detections into batched forward passes
+
+import asyncio
+import base64
+import binascii
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Longest side of the detector input (YOLOv8 letterboxes to 640x640)
+YOLO_INPUT_SIZE = 640
+
+SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg", "gif", "bmp", "webp"]
+
+# Dynamic batching: wait at most this long for more images before running a batch
+VISION_MAX_BATCH_SIZE = int(os.environ.get("VISION_MAX_BATCH_SIZE", "8"))
+VISION_MAX_WAIT_MS = float(os.environ.get("VISION_MAX_WAIT_MS", "5"))
+
+# Image quality pre-filter (computed on a QUALITY_CHECK_SIZE downscale, so thresholds don't depend on resolution)
+QUALITY_CHECK_SIZE = 256
+IMAGE_MIN_SIDE = int(os.environ.get("IMAGE_MIN_SIDE", "160"))
+IMAGE_BLUR_THRESHOLD = float(os.environ.get("IMAGE_BLUR_THRESHOLD", "20"))  # Laplacian variance
+IMAGE_DARK_THRESHOLD = 40        # pixels below this level count as dark
+IMAGE_MIN_LIT_PIXELS = 4         # fewer non-dark pixels (at 256px) than this: nothing visible, not even lit indicators
+IMAGE_MOSTLY_DARK_RATIO = 0.5    # above this share of dark pixels, sharpness is measured around the lit areas only
+IMAGE_OVEREXPOSED_RATIO = 0.6    # share of saturated pixels (>= 250)
+
+# libjpeg DCT scaling: decoding at 1/2, 1/4 or 1/8 resolution is much cheaper than full decode + resize
+_REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+def decode_base64_image(data: str) -> bytes:
+    """Decode a base64 image payload (plain or data URL)."""
+    if data.startswith("data:") and "," in data:
+        data = data.split(",", 1)[1]
+    try:
+        return base64.b64decode(data)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+
+def get_image_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the image header without decoding the pixels."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return image.size
+    except Exception:
+        return None
+
+def decode_image(image_bytes: bytes, target_size: int = YOLO_INPUT_SIZE) -> np.ndarray:
+    """
+    Decode image bytes directly into a BGR uint8 array.
+    The longest side is kept >= target_size: phone photos (4000px) are decoded at 1/4 or 1/8 scale.
+    Pass target_size=None to always decode at full resolution.
+    """
+    # Zero-copy view over the request bytes
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+
+    flag = cv2.IMREAD_COLOR
+    size = get_image_size(image_bytes) if target_size else None
+    if size:
+        longest_side = max(size)
+        for factor, reduced_flag in _REDUCED_DECODE_FLAGS:
+            if longest_side // factor >= target_size:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(buffer, flag)
+    if image is not None:
+        return image
+
+    # Formats OpenCV cannot decode (e.g. GIF): fall back to PIL
+    with Image.open(io.BytesIO(image_bytes)) as pil_image:
+        return cv2.cvtColor(np.asarray(pil_image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+def check_image_quality(image: np.ndarray) -> Dict:
+    """
+    Cheap usability check of a decoded BGR image: dimensions, sharpness (variance of
+    the Laplacian) and exposure, all on a small grayscale downscale.
+    Returns the metrics and `issue` ("too_small", "too_dark", "overexposed", "blurry" or None).
+    """
+    height, width = image.shape[:2]
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = QUALITY_CHECK_SIZE / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    laplacian = cv2.Laplacian(gray, cv2.CV_64F)
+    lit = gray >= IMAGE_DARK_THRESHOLD
+    lit_pixels = int(np.count_nonzero(lit))
+    dark_ratio = 1.0 - lit_pixels / gray.size
+    saturated = float(np.count_nonzero(gray >= 250)) / gray.size
+
+    # Night dashboards are mostly black with a few small lit indicators: a black
+    # background would dilute the Laplacian variance, so only the lit areas (and
+    # their edges) are measured
+    if dark_ratio > IMAGE_MOSTLY_DARK_RATIO and lit_pixels:
+        around_lit = cv2.dilate(lit.astype(np.uint8), np.ones((5, 5), np.uint8)).astype(bool)
+        sharpness = float(laplacian[around_lit].var())
+    else:
+        sharpness = float(laplacian.var())
+
+    # Darkness is judged on the count of lit pixels, not the mean or a percentile,
+    # so that indicators covering well under 1% of the frame are enough
+    if min(height, width) < IMAGE_MIN_SIDE:
+        issue = "too_small"
+    elif lit_pixels < IMAGE_MIN_LIT_PIXELS:
+        issue = "too_dark"
+    elif saturated > IMAGE_OVEREXPOSED_RATIO:
+        issue = "overexposed"
+    elif sharpness < IMAGE_BLUR_THRESHOLD:
+        issue = "blurry"
+    else:
+        issue = None
+
+    return {
+        "issue": issue,
+        "width": width,
+        "height": height,
+        "sharpness": round(sharpness, 1),
+        "brightness": round(float(gray.mean()), 1),
+        "dark_ratio": round(dark_ratio, 3),
+        "saturated_ratio": round(saturated, 3)
+    }
+
+def resize_for_detector(image: np.ndarray, target_size: int = YOLO_INPUT_SIZE) -> np.ndarray:
+    """Downscale so the longest side is target_size (area interpolation), smaller images untouched."""
+    height, width = image.shape[:2]
+    scale = target_size / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests for up to `max_wait_ms` or `max_batch_size`
+    images, runs them as one batched forward pass on a worker thread and scatters
+    the per-image results back to the callers. With `num_threads` > 1, several
+    batches can be in flight at once (e.g. one per detector process).
+    """
+
+    def __init__(
+        self,
+        infer_batch: Callable[[List[np.ndarray]], List[Any]],
+        max_batch_size: int = VISION_MAX_BATCH_SIZE,
+        max_wait_ms: float = VISION_MAX_WAIT_MS,
+        name: str = "vision-batcher",
+        num_threads: int = 1
+    ):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.stats = {"batches": 0, "images": 0, "largest_batch": 0, "last_batch_ms": 0.0}
+        self.stats_lock = threading.Lock()
+        # Batches are collected one at a time so concurrent threads don't split them
+        self.collect_lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(max(1, num_threads))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Queue an image for detection. The returned future resolves to its result."""
+        future = Future()
+        self.queue.put((image, future))
+        return future
+
+    async def detect(self, image: np.ndarray) -> Any:
+        """Detect on one image from async code without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(image))
+
+    def _collect_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Drop requests whose caller went away
+        return [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            with self.collect_lock:
+                batch = self._collect_batch()
+            if not batch:
+                continue
+
+            started = time.time()
+            try:
+                results = self.infer_batch([image for image, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+            with self.stats_lock:
+                self.stats["batches"] += 1
+                self.stats["images"] += len(batch)
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+                self.stats["last_batch_ms"] = round((time.time() - started) * 1000, 1)
+
+    def get_stats(self) -> Dict:
+        """Batching statistics and current queue depth."""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue.qsize()
+        stats["avg_batch_size"] = round(stats["images"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,106 @@
+# vision_pool.py - Process Pool Vision Executor for Kounhany AI
+# Runs the indicator detector in worker processes, each holding its own model,
+# so preprocessing, inference and post-processing never hold the server's GIL.
+# Pixel buffers go through shared memory instead of being pickled.
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from detectors import VISION_BACKEND, RawDetections, load_detector
+
+VISION_WORKERS = int(os.environ.get("VISION_WORKERS", "0"))  # 0 = detector in the server process
+VISION_WORKER_THREADS = int(os.environ.get("VISION_WORKER_THREADS", "1"))  # CPU threads per worker
+
+# ========== WORKER SIDE ==========
+_worker_detector = None
+
+def _init_worker(backend: str, num_threads: int):
+    """Load one detector per worker process."""
+    global _worker_detector
+    if num_threads:
+        cv2.setNumThreads(num_threads)
+        os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+        if backend == "torch":
+            import torch
+            torch.set_num_threads(num_threads)
+    _worker_detector = load_detector(backend)
+
+def _worker_info() -> dict:
+    return {"backend": _worker_detector.backend, "names": dict(_worker_detector.names)}
+
+def _detect_shared(shm_name: str, layout: List[tuple]) -> List[RawDetections]:
+    """Detect on images laid out in a shared memory block: [(offset, shape), ...]."""
+    # Spawned workers share the server's resource tracker: the block stays owned (and unlinked) by the server
+    shm = SharedMemory(name=shm_name)
+    try:
+        images = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset) for offset, shape in layout]
+        # ultralytics keeps references to its inputs (predictor dataset, batch, results), which
+        # would keep the block exported and make close() fail: it gets private copies
+        if _worker_detector.backend != "onnx":
+            images = [image.copy() for image in images]
+        results = _worker_detector.detect_batch(images)
+        # Views must be released before the block is closed
+        del images
+        return results
+    finally:
+        shm.close()
+
+# ========== SERVER SIDE ==========
+class VisionProcessPool:
+    """
+    Drop-in replacement for a detector (`backend`, `names`, `detect_batch`) that runs
+    each batch in a worker process. Several batches can be in flight at once, one per worker.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = VISION_WORKERS,
+        backend: str = VISION_BACKEND,
+        threads_per_worker: int = VISION_WORKER_THREADS
+    ):
+        self.num_workers = num_workers
+        # spawn: CUDA and ONNX Runtime do not survive fork
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, threads_per_worker)
+        )
+        # One task per worker: every process is spawned and loads its model now, not on the first requests
+        infos = [future.result() for future in [self.executor.submit(_worker_info) for _ in range(num_workers)]]
+        info = infos[0]
+        self.backend = f"{info['backend']} (x{num_workers} processes)"
+        self.names: Dict[int, str] = info["names"]
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[RawDetections]:
+        """Copy the batch into one shared memory block and run it in a worker."""
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        layout, offset = [], 0
+        for image in images:
+            layout.append((offset, image.shape))
+            offset += image.nbytes
+
+        shm = SharedMemory(create=True, size=max(offset, 1))
+        try:
+            for image, (start, shape) in zip(images, layout):
+                np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=start)[...] = image
+            return self.executor.submit(_detect_shared, shm.name, layout).result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def load_vision_executor(num_workers: int = VISION_WORKERS, backend: Optional[str] = None):
+    """The detector in-process (num_workers=0) or a pool of detector processes."""
+    backend = backend or VISION_BACKEND
+    if num_workers > 0:
+        return VisionProcessPool(num_workers, backend)
+    return load_detector(backend)
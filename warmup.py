@@ -0,0 +1,181 @@
+# warmup.py - Off-peak Answer Warming for Kounhany AI
+# Pre-generates answers for the most frequent questions so that the first users
+# of the day get an instant answer instead of paying for a full LLM generation
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Dict
+
+from analytics import get_top_questions, learn_from_conversation, normalize_question
+
+# Warming schedule and budget (configurable through the environment)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_HOUR = int(os.environ.get("WARMUP_HOUR", "4"))                  # Local hour of the daily run
+WARMUP_TOP_N = int(os.environ.get("WARMUP_TOP_N", "30"))               # Questions warmed per run
+WARMUP_MAX_GPU_SECONDS = float(os.environ.get("WARMUP_MAX_GPU_SECONDS", "300"))  # Generation budget per run
+WARMUP_IDLE_SECONDS = float(os.environ.get("WARMUP_IDLE_SECONDS", "10"))  # Required quiet time before each generation
+WARM_ANSWER_TTL_HOURS = int(os.environ.get("WARM_ANSWER_TTL_HOURS", "24"))
+
+# Categories that never reach the LLM, no need to warm them
+SKIPPED_CATEGORIES = ['obd_code']
+
+# Warm answer cache: normalized question -> (answer, expires_at)
+_warm_answers: Dict[str, tuple] = {}
+_warm_lock = threading.Lock()
+
+# Last time a live request arrived (used to keep warming off the GPU during traffic)
+_last_live_activity = 0.0
+
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "last_run": None,
+    "last_run_warmed": 0,
+    "last_run_gpu_seconds": 0.0,
+    "last_run_aborted": 0
+}
+
+def mark_live_activity():
+    """Record that a live request is being served. Any running warm generation yields."""
+    global _last_live_activity
+    _last_live_activity = time.time()
+
+def _warm_key(question: str) -> str:
+    """
+    Cache key of a question: its normalized form. Not the question cluster, which
+    may group questions with different answers ("vidange clio" / "vidange golf").
+    """
+    return normalize_question(question)
+
+def get_warm_answer(question: str) -> Optional[str]:
+    """Return the pre-generated answer for a question if it is still fresh."""
+    key = _warm_key(question)
+    with _warm_lock:
+        entry = _warm_answers.get(key)
+        if entry and entry[1] > datetime.now():
+            _stats["hits"] += 1
+            return entry[0]
+        if entry:
+            del _warm_answers[key]
+        _stats["misses"] += 1
+    return None
+
+def store_warm_answer(question: str, answer: str, ttl_hours: int = WARM_ANSWER_TTL_HOURS):
+    """Store a pre-generated answer in the warm cache."""
+    key = _warm_key(question)
+    with _warm_lock:
+        _warm_answers[key] = (answer, datetime.now() + timedelta(hours=ttl_hours))
+
+def get_warm_cache_stats() -> Dict:
+    """Get warm cache size, hit rate and details of the last warming run."""
+    with _warm_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "size": len(_warm_answers),
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0.0,
+            "last_run": _stats["last_run"],
+            "last_run_warmed": _stats["last_run_warmed"],
+            "last_run_gpu_seconds": round(_stats["last_run_gpu_seconds"], 1),
+            "last_run_aborted": _stats["last_run_aborted"]
+        }
+
+def _wait_for_idle(deadline: float) -> bool:
+    """Wait until no live request arrived for WARMUP_IDLE_SECONDS. Returns False past the deadline."""
+    while time.time() < deadline:
+        idle_for = time.time() - _last_live_activity
+        if idle_for >= WARMUP_IDLE_SECONDS:
+            return True
+        time.sleep(WARMUP_IDLE_SECONDS - idle_for)
+    return False
+
+def warm_top_questions(
+    generate: Callable,
+    limit: int = WARMUP_TOP_N,
+    max_gpu_seconds: float = WARMUP_MAX_GPU_SECONDS,
+    max_wall_seconds: float = 3600
+) -> int:
+    """
+    Generate answers for the top questions through the normal LLM pipeline.
+
+    `generate(question, stopping_criteria)` must return the cleaned answer text.
+    Generation is aborted at the next token as soon as a live request arrives,
+    and the run stops once `max_gpu_seconds` of generation time has been spent.
+    Returns the number of answers warmed.
+    """
+    started_at = time.time()
+    deadline = started_at + max_wall_seconds
+    gpu_seconds = 0.0
+    warmed = 0
+    aborted = 0
+
+    for row in get_top_questions(limit):
+        question = row.get('question') or row['question_normalized']
+        category = row.get('category')
+        if not question or category in SKIPPED_CATEGORIES:
+            continue
+        if gpu_seconds >= max_gpu_seconds:
+            break
+        if not _wait_for_idle(deadline):
+            break
+
+        generation_start = time.time()
+
+        # Yield the GPU to live traffic: stop at the next token if a request arrived
+        def yield_to_live(input_ids, logits, _start=generation_start):
+            return _last_live_activity > _start
+
+        try:
+            answer = generate(question, [yield_to_live])
+        except Exception as e:
+            print(f"Warmup generation error: {e}")
+            continue
+        finally:
+            gpu_seconds += time.time() - generation_start
+
+        if _last_live_activity > generation_start:
+            # Interrupted by live traffic, the partial answer is discarded
+            aborted += 1
+            continue
+
+        if answer and len(answer) > 50:
+            store_warm_answer(question, answer)
+            learn_from_conversation(question, answer, category)
+            warmed += 1
+
+    with _warm_lock:
+        _stats["last_run"] = datetime.now().isoformat()
+        _stats["last_run_warmed"] = warmed
+        _stats["last_run_gpu_seconds"] = gpu_seconds
+        _stats["last_run_aborted"] = aborted
+
+    print(f"✅ Warmup finished: {warmed} answers warmed in {gpu_seconds:.1f}s of generation ({aborted} aborted)")
+    return warmed
+
+def _seconds_until(hour: int) -> float:
+    """Seconds until the next occurrence of the given local hour."""
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def start_warming_scheduler(generate: Callable, hour: int = WARMUP_HOUR) -> Optional[threading.Thread]:
+    """Start a daemon thread that runs the warming job every day at the given off-peak hour."""
+    if not WARMUP_ENABLED:
+        return None
+
+    def run_forever():
+        while True:
+            time.sleep(_seconds_until(hour))
+            try:
+                warm_top_questions(generate)
+            except Exception as e:
+                print(f"Warmup error: {e}")
+
+    thread = threading.Thread(target=run_forever, name="answer-warmup", daemon=True)
+    thread.start()
+    return thread